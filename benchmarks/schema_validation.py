@@ -0,0 +1,99 @@
+"""
+Compares jsonschema (interpreted) and fastjsonschema (compiled) validation of workflow trigger bodies.
+Also checks that both backends agree on validity and raise the same error messages.
+Invalid bodies are validated by both backends (for the error message), expect a speedup a bit below 1x for them.
+
+Usage (from repository root):
+    pip install fastjsonschema
+    python benchmarks/schema_validation.py [iterations]
+"""
+import importlib.metadata
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fastjsonschema  # noqa: E402
+import jsonschema  # noqa: E402
+
+from suprsend.request_schema import _CompiledSchemaValidator  # noqa: E402
+
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "suprsend", "request_json")
+
+
+def load_schema(name):
+    with open(os.path.join(SCHEMA_DIR, "{}.json".format(name))) as f:
+        return json.load(f)
+
+
+def sample_bodies():
+    recipient = {
+        "distinct_id": "0gxxx9f14-xxxx-23c5-1902-xxxcb6912ab09",
+        "$email": ["user@example.com"],
+        "$sms": ["+15555555555"],
+        "$androidpush": [{"token": "__android_push_token__", "provider": "fcm", "device_id": ""}],
+        "$iospush": [{"token": "__ios_push_token__", "provider": "apns", "device_id": ""}],
+        "$slack": {"email": "user@example.com", "access_token": "xoxb-XXXXXX"},
+        "$preferred_language": "en",
+        "$timezone": "America/New_York",
+        "name": "Jane Doe",
+    }
+    data = {
+        "first_name": "User",
+        "spend_amount": "$10",
+        "nested_key_example": {"nested_key1": "some_value_1", "nested_key2": {"nested_key3": "some_value_3"}},
+        "items": [{"sku": "sku-{}".format(i), "qty": i, "price": i * 10.5} for i in range(20)],
+    }
+    small = {"workflow": "purchase-made", "recipients": ["distinct_id"], "data": {"amount": 10}}
+    realistic = {
+        "workflow": "purchase-made",
+        "actor": {"distinct_id": "actor-1", "name": "Actor"},
+        "recipients": [recipient, "distinct_id_2", {**recipient, "distinct_id": "distinct_id_3"}],
+        "data": data,
+        "$idempotency_key": "some-idempotency-key",
+        "tenant_id": "tenant-1",
+    }
+    invalid = [
+        {"workflow": "", "recipients": ["d1"], "data": {}},
+        {"workflow": "w", "recipients": [], "data": {}},
+        {"workflow": "w", "recipients": "d1", "data": {}},
+        {"workflow": "w", "recipients": ["d1"], "data": {}, "unknown": 1},
+        {"workflow": "w", "recipients": [{**recipient, "$androidpush": [{"token": "t"}]}], "data": {}},
+        {"workflow": "w", "recipients": ["d1"], "data": [], "tenant_id": 1},
+    ]
+    return small, realistic, invalid
+
+
+def error_message(validator, body):
+    try:
+        validator.validate(body)
+    except jsonschema.exceptions.ValidationError as ve:
+        return ve.message
+    return None
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    schema = load_schema("workflow_trigger")
+    interpreted = jsonschema.Draft7Validator(schema)
+    compiled = _CompiledSchemaValidator(schema, interpreted)
+    small, realistic, invalid = sample_bodies()
+    # --- both backends must behave the same
+    for body in [small, realistic] + invalid:
+        expected, actual = error_message(interpreted, body), error_message(compiled, body)
+        assert expected == actual, (body, expected, actual)
+    print("error messages: identical for {} bodies ({} invalid)".format(len(invalid) + 2, len(invalid)))
+    # ---
+    print("fastjsonschema {}, jsonschema {}, {} iterations".format(
+        fastjsonschema.VERSION, importlib.metadata.version("jsonschema"), iterations))
+    for name, body in [("small", small), ("realistic", realistic), ("invalid", invalid[4])]:
+        t_interpreted = timeit.timeit(lambda: error_message(interpreted, body), number=iterations)
+        t_compiled = timeit.timeit(lambda: error_message(compiled, body), number=iterations)
+        print("{:<10} jsonschema: {:8.1f} us/op   compiled: {:8.1f} us/op   speedup: {:5.1f}x".format(
+            name, t_interpreted / iterations * 1e6, t_compiled / iterations * 1e6, t_interpreted / t_compiled))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ __author__ = 'SuprSend Developers'
 __credits__ = 'SuprSend'
 
 from .sdkinstance import Suprsend, AppInfo  # noqa
+from .async_sdkinstance import AsyncSuprsend  # noqa
 from .bulk_response import BulkResponse     # noqa
 from .event import Event                    # noqa
 from .workflow import Workflow              # noqa
@@ -20,9 +21,16 @@ from .object_edit import ObjectEdit
 from .user_edit import UserEdit
 from .users_edit_bulk import BulkUsersEdit
 
+from .retry import RetryPolicy, RetryBudget  # noqa
+from .rate_limiter import RateLimiter       # noqa
+from .circuit_breaker import CircuitBreaker  # noqa
+from .compression import BodyCompression    # noqa
+from .background_events import BackgroundEventCollector  # noqa
+from .spool import Spool                    # noqa
+
 from .exception import (
     SuprsendError, SuprsendConfigError, SuprsendAPIException, SuprsendValidationError,
-    InputValueError,
+    InputValueError, SuprsendCircuitOpenError,
 )
 
 # preventing leaks to rootLogger, so that the library user can decide what should happen.
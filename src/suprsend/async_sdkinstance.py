@@ -0,0 +1,131 @@
+from typing import Dict, Union
+
+from .constants import DEFAULT_POOL_MAXSIZE, DEFAULT_POOL_IDLE_TIMEOUT_SECS
+from .exception import InputValueError, SuprsendConfigError
+from .sdkinstance import _SuprsendConfig, AppInfo
+from .signature import get_request_signature
+from .transport import AsyncHttpTransport
+from .bulk_response import BulkResponse
+from .utils import async_trigger_chunks
+from .retry import RetryPolicy, has_idempotency_keys
+from .circuit_breaker import CircuitBreaker
+from .compression import BodyCompression
+from .spool import Spool
+from .json_codec import JsonCodec
+from .event import Event, AsyncEventCollector
+from .events_bulk import AsyncBulkEventsFactory
+from .workflow_api import AsyncWorkflowsApi
+from .subscriber_list import AsyncSubscriberListsApi
+from .tenant import AsyncTenantsApi
+from .brand import AsyncBrandsApi
+from .objects_api import AsyncObjectsApi
+from .users_api import AsyncUsersApi
+from .messages_api import AsyncMessagesApi
+
+
+class AsyncSuprsend(_SuprsendConfig):
+    """
+    asyncio counterpart of Suprsend. All api methods are coroutines and use non-blocking http (requires httpx).
+    - Basic instance
+     supr_client = AsyncSuprsend("__workspace_key__", "__workspace_secret__")
+     response = await supr_client.workflows.trigger(WorkflowTriggerRequest(body))
+     ...
+     await supr_client.aclose()
+    - As async context manager
+     async with AsyncSuprsend("__workspace_key__", "__workspace_secret__") as supr_client:
+        response = await supr_client.track_event(Event(...))
+    """
+    def __init__(self, workspace_key: str, workspace_secret: str, base_url: str = None, debug: bool = False, app_info: AppInfo = None,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE, pool_idle_timeout: float = DEFAULT_POOL_IDLE_TIMEOUT_SECS,
+                 max_connections: int = None, json_codec: Union[str, JsonCodec] = None,
+                 retry_policy: RetryPolicy = None, rate_limits: Dict = None,
+                 circuit_breaker: CircuitBreaker = None, timeout=None, bulk_timeout=None,
+                 bulk_compression: BodyCompression = None, spool: Spool = None, **kwargs):
+        super().__init__(workspace_key, workspace_secret, base_url=base_url, debug=debug, app_info=app_info,
+                         json_codec=json_codec, bulk_compression=bulk_compression, spool=spool)
+        # --- non-blocking keep-alive connection pool shared by all api calls made using this instance
+        self.transport = AsyncHttpTransport(pool_maxsize=pool_maxsize, pool_idle_timeout=pool_idle_timeout,
+                                            max_connections=max_connections, retry_policy=retry_policy,
+                                            signer=self._resign_request,
+                                            rate_limiter=self._rate_limiter(rate_limits),
+                                            circuit_breaker=self._bind_circuit_breaker(circuit_breaker),
+                                            timeout=timeout, bulk_timeout=bulk_timeout)
+        #
+        self._eventcollector = AsyncEventCollector(self)
+        self._bulk_events = AsyncBulkEventsFactory(self)
+        # --
+        self.tenants = AsyncTenantsApi(self)
+        self.brands = AsyncBrandsApi(self)
+        self.workflows = AsyncWorkflowsApi(self)
+        self.objects = AsyncObjectsApi(self)
+        self.users = AsyncUsersApi(self)
+        self.messages = AsyncMessagesApi(self)
+        # --
+        self.subscriber_lists = AsyncSubscriberListsApi(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """
+        Close all pooled http connections. The instance remains usable, a new pool is created on next api call.
+        """
+        await self.transport.aclose()
+
+    @property
+    def bulk_events(self):
+        return self._bulk_events
+
+    async def replay_spool(self, max_concurrency: int = 1) -> BulkResponse:
+        """
+        asyncio counterpart of Suprsend.replay_spool
+        """
+        if self.spool is None:
+            raise SuprsendConfigError("spool is not configured")
+        response = BulkResponse()
+        for chunks, spooled in self._spool_replay_rounds():
+            await async_trigger_chunks(chunks, max_concurrency)
+            round_failed = []
+            for ch in chunks:
+                response.merge_chunk_response(ch.response)
+                round_failed.extend(ch.response["failed_records"])
+            spooled.settle(round_failed)
+        if response.status is None:
+            response.merge_chunk_response(BulkResponse.empty_chunk_success_response())
+        return response
+
+    async def signed_request(self, http_verb: str, url: str, content=None):
+        """
+        Signs and sends a request to SuprSend, returns the http response as it is.
+        :param http_verb: GET/POST/PATCH/DELETE
+        :param url: absolute url
+        :param content: json-serializable body. None for GET, "" for a DELETE without body.
+        """
+        headers = self.default_headers()
+        # Signature and Authorization-header
+        content_txt, sig = get_request_signature(url, http_verb, content, headers, self.workspace_secret, self.json_codec)
+        headers["Authorization"] = "{}:{}".format(self.workspace_key, sig)
+        # -----
+        data = content_txt.encode('utf-8') if http_verb != "GET" else None
+        idempotent = True if has_idempotency_keys(content) else None
+        return await self.transport.request(http_verb, url, data=data, headers=headers, idempotent=idempotent)
+
+    async def track_event(self, event: Event) -> Dict:
+        """
+        :param event: suprsend.Event
+        :return: {
+            "success": True,
+            "status": "success",
+            "status_code": resp.status_code,
+            "message": resp.text,
+        }
+        :except:
+            - SuprsendValidationError (if post-data is invalid.)
+            - ValueError
+        """
+        if not isinstance(event, Event):
+            raise InputValueError("argument must be an instance of suprsend.Event")
+        return await self._eventcollector.collect(event)
@@ -1,7 +1,18 @@
 import os
-import base64
+import binascii
+import collections
+import functools
 import mimetypes
-from typing import Dict
+import mmap
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, BinaryIO, Optional, Tuple
+from .constants import (
+    BODY_MAX_APPARENT_SIZE_IN_BYTES, BODY_MAX_APPARENT_SIZE_IN_BYTES_READABLE,
+    ATTACHMENT_UPLOAD_ENABLED, ATTACHMENT_READ_BLOCK_SIZE_IN_BYTES, ATTACHMENT_MMAP_MIN_SIZE_IN_BYTES,
+    ATTACHMENT_CACHE_MAX_SIZE_IN_BYTES,
+)
+from .exception import InputValueError
 from .logger import ss_logger
 
 try:
@@ -25,29 +36,378 @@ def check_is_web_url(file_path: str):
     return False
 
 
-def get_attachment_json_for_file(file_path: str, file_name: str, ignore_if_error: bool) -> Dict:
+class AttachmentCache:
+    """
+    LRU cache of (mime_type, base64 encoded content) of attached files, bounded by total size of encoded content.
+    Key is (absolute path, mtime, size) of file, so a file modified in place is read again.
+    Thread-safe: a single instance (attachment_cache) is shared by all clients of the process.
+    Disabled (max size 0) unless enabled with attachment_cache.resize(). Entries are kept till they are evicted
+    by newer ones or clear() is called, i.e. content of a file can stay in memory long after it was sent.
+    """
+    def __init__(self, max_size_in_bytes: int):
+        self.__lock = threading.Lock()
+        self.__entries = collections.OrderedDict()
+        self.__size = 0
+        self.__max_size = max_size_in_bytes
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    @staticmethod
+    def cache_key(abs_path: str, st: os.stat_result) -> Tuple:
+        return abs_path, st.st_mtime_ns, st.st_size
+
+    def get(self, key: Tuple) -> Optional[Tuple[str, str]]:
+        with self.__lock:
+            value = self.__entries.get(key)
+            if value is None:
+                self.__misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return value
+
+    def put(self, key: Tuple, mime_type: str, b64data: str):
+        entry_size = len(b64data)
+        with self.__lock:
+            # content bigger than whole cache is not cached (it would only evict everything else)
+            if entry_size > self.__max_size or self.__max_size <= 0:
+                return
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.__size -= len(old[1])
+            self.__entries[key] = (mime_type, b64data)
+            self.__size += entry_size
+            self.__evict()
+
+    def __evict(self):
+        while self.__size > self.__max_size:
+            _, (_, b64data) = self.__entries.popitem(last=False)
+            self.__size -= len(b64data)
+            self.__evictions += 1
+
+    def resize(self, max_size_in_bytes: int):
+        """
+        :param max_size_in_bytes: 0 disables the cache (and clears it)
+        """
+        with self.__lock:
+            self.__max_size = max_size_in_bytes
+            self.__evict()
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__size = 0
+
+    def stats(self) -> Dict:
+        with self.__lock:
+            return {
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "evictions": self.__evictions,
+                "entries": len(self.__entries),
+                "size_in_bytes": self.__size,
+                "max_size_in_bytes": self.__max_size,
+            }
+
+
+attachment_cache = AttachmentCache(ATTACHMENT_CACHE_MAX_SIZE_IN_BYTES)
+
+
+def get_base64_encoded_size(file_size: int) -> int:
+    return 4 * ((file_size + 2) // 3)
+
+
+def _b64encode_blocks(f: BinaryIO, use_mmap: bool):
+    """
+    yields base64 encoded (ascii str) blocks of file content. Only one raw block is held in memory at a time.
+    """
+    block_size = ATTACHMENT_READ_BLOCK_SIZE_IN_BYTES
+    if use_mmap:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as mv:
+                for offset in range(0, len(mm), block_size):
+                    yield binascii.b2a_base64(mv[offset:offset + block_size], newline=False).decode('ascii')
+        return
+    # ---
+    buf = bytearray(block_size)
+    with memoryview(buf) as mv:
+        while True:
+            n = f.readinto(mv)
+            if not n:
+                break
+            # a short read (other than at the end) would break base64 block alignment, so top-up the block
+            while n < block_size:
+                more = f.readinto(mv[n:])
+                if not more:
+                    break
+                n += more
+            yield binascii.b2a_base64(mv[:n], newline=False).decode('ascii')
+
+
+def get_base64_encoded_file(f: BinaryIO, file_size: int, use_mmap: bool = None) -> str:
+    """
+    base64 encodes file in blocks. Unlike base64.b64encode(f.read()), complete raw content of file and its
+    encoded bytes are never held in memory along with the final str.
+    :param use_mmap: memory-map the file instead of reading it in a buffer.
+        None: mmap files of size >= ATTACHMENT_MMAP_MIN_SIZE_IN_BYTES
+    """
+    if file_size == 0:
+        return ""
+    if use_mmap is None:
+        use_mmap = file_size >= ATTACHMENT_MMAP_MIN_SIZE_IN_BYTES
+    return "".join(_b64encode_blocks(f, use_mmap))
+
+
+def __check_file_size(abs_path: str, file_size: int):
+    # fail fast: don't read a file whose encoded content can't fit in a request anyway
+    encoded_size = get_base64_encoded_size(file_size)
+    if not ATTACHMENT_UPLOAD_ENABLED and encoded_size > BODY_MAX_APPARENT_SIZE_IN_BYTES:
+        raise InputValueError(f"attachment file too big - {file_size} Bytes ({encoded_size} Bytes when "
+                              f"base64 encoded), must not cross {BODY_MAX_APPARENT_SIZE_IN_BYTES_READABLE}"
+                              f": {abs_path}")
+
+
+def _encode_file(abs_path: str, use_mmap: bool = None) -> Tuple[Tuple, str, str]:
+    """
+    reads and encodes file. Module-level (picklable) so that it can run in a process pool.
+    :return: (cache key, mime_type, base64 encoded content)
+    :raises: OSError, InputValueError
+    """
+    with open(abs_path, "rb") as f:
+        # file could have been replaced after stat, so key the content by what is actually read
+        st = os.fstat(f.fileno())
+        __check_file_size(abs_path, st.st_size)
+        mime_type = _detect_mime_type(abs_path)
+        # base64 encoded string
+        b64data = get_base64_encoded_file(f, st.st_size, use_mmap)
+    return AttachmentCache.cache_key(abs_path, st), mime_type, b64data
+
+
+def __get_encoded_file_content(abs_path: str, use_mmap: bool = None) -> Tuple[str, str]:
+    """
+    returns (mime_type, base64 encoded content) of file, from attachment_cache if file hasn't changed.
+    :raises: OSError, InputValueError
+    """
+    st = os.stat(abs_path)
+    __check_file_size(abs_path, st.st_size)
+    cache_key = attachment_cache.cache_key(abs_path, st)
+    cached = attachment_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    # ---
+    cache_key, mime_type, b64data = _encode_file(abs_path, use_mmap)
+    attachment_cache.put(cache_key, mime_type, b64data)
+    return mime_type, b64data
+
+
+def get_attachment_json_for_file(file_path: str, file_name: str, ignore_if_error: bool,
+                                 use_mmap: bool = None) -> Dict:
     # Ensure that path is expanded and absolute
     abs_path = os.path.abspath(os.path.expanduser(file_path))
+    final_file_name = os.path.basename(abs_path)
+    if file_name and file_name.strip():
+        final_file_name = file_name.strip()
     # Get attachment json
     try:
-        with open(abs_path, "rb") as f:
-            final_file_name = os.path.basename(abs_path)
-            if file_name and file_name.strip():
-                final_file_name = file_name.strip()
-            # --
-            mime_type = _detect_mime_type(abs_path)
-            # base64 encoded string
-            b64encoded = base64.b64encode(f.read())
-            b64data = b64encoded.decode()
-            attach_data = {
-                "filename": final_file_name,
-                "contentType": mime_type,
-                "data": b64data,
-                "url": None,
-                "ignore_if_error": ignore_if_error,
-            }
-            return attach_data
-    except OSError as ex:
+        mime_type, b64data = __get_encoded_file_content(abs_path, use_mmap)
+        attach_data = {
+            "filename": final_file_name,
+            "contentType": mime_type,
+            "data": b64data,
+            "url": None,
+            "ignore_if_error": ignore_if_error,
+        }
+        return attach_data
+    except (OSError, InputValueError) as ex:
+        if ignore_if_error:
+            ss_logger.warning("Ignoring error while processing attachment file. "
+                                "%s: %s", type(ex).__name__, ex)
+            return None
+        else:
+            raise ex
+
+
+class LazyAttachment:
+    """
+    Reference to a local file attachment whose content is read and base64 encoded only when the body containing it
+    is sent (or written to spool). Until then body carries only path and metadata, so copying, validating and
+    size calculation of body don't drag file content along. Apparent size is calculated from file size.
+    Instances are immutable and shared between copies of body.
+    """
+    def __init__(self, abs_path: str, file_name: str, mime_type: str, file_size: int, ignore_if_error: bool,
+                 use_mmap: bool = None):
+        self.abs_path = abs_path
+        self.file_name = file_name
+        self.mime_type = mime_type
+        self.file_size = file_size
+        self.ignore_if_error = ignore_if_error
+        self.use_mmap = use_mmap
+        # set by AttachmentEncoder: future of (cache key, mime_type, base64 encoded content), and callable
+        # telling the encoder that this attachment doesn't need the future anymore
+        self._encoding = None
+        self._release_encoding = None
+
+    @property
+    def encoded_data_size(self) -> int:
+        # length of base64 encoded content of file
+        return get_base64_encoded_size(self.file_size)
+
+    def __attachment_json(self, data, mime_type: str = None) -> Dict:
+        return {
+            "filename": self.file_name,
+            "contentType": mime_type or self.mime_type,
+            "data": data,
+            "url": None,
+            "ignore_if_error": self.ignore_if_error,
+        }
+
+    def placeholder_json(self) -> Dict:
+        """
+        attachment json with empty data. Its json-encoded size + encoded_data_size is size of materialized attachment
+        """
+        return self.__attachment_json("")
+
+    def materialize(self) -> Dict:
+        """
+        reads and encodes the file (or waits for AttachmentEncoder to do it).
+        If reading fails and ignore_if_error is set, data is sent as null
+        :raises: OSError, InputValueError
+        """
+        if self._encoding is not None:
+            # encoded content is held only till the attachment is rendered once, later renders (e.g. retry)
+            # read the file again
+            encoding, release_encoding = self._encoding, self._release_encoding
+            self._encoding = self._release_encoding = None
+            try:
+                _, mime_type, b64data = encoding.result()
+            except (OSError, InputValueError) as ex:
+                if not self.ignore_if_error:
+                    raise ex
+                ss_logger.warning("Ignoring error while processing attachment file. "
+                                  "%s: %s", type(ex).__name__, ex)
+                return self.__attachment_json(None)
+            finally:
+                release_encoding()
+            return self.__attachment_json(b64data, mime_type)
+        # ---
+        attach_data = get_attachment_json_for_file(self.abs_path, self.file_name, self.ignore_if_error,
+                                                   self.use_mmap)
+        if attach_data is None:
+            return self.__attachment_json(None)
+        return attach_data
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return "LazyAttachment<{}, {} Bytes>".format(self.abs_path, self.file_size)
+
+
+class AttachmentEncoder:
+    """
+    Reads and base64 encodes LazyAttachment files on a worker pool, so that files of a bulk batch are encoded in
+    parallel (and while other records are still being validated) instead of one after another while chunk bodies
+    are built.
+    - threads (default): overlaps file I/O, suitable for most attachments.
+    - processes (use_processes=True): for large files, base64 encoding also runs in parallel. Encoded content is
+      sent back to the calling process.
+    A file attached to many records (same path, mtime and size) is encoded only once, as long as some of those
+    records are still waiting to be rendered. Encoded content is held only till the records attaching the file
+    are rendered (chunk body is built), so memory stays bounded by the records pending at a time (e.g. with
+    trigger_stream). It is also put in attachment_cache, if that is enabled.
+    """
+    def __init__(self, max_workers: int = None, use_processes: bool = False):
+        self.__max_workers = max_workers
+        self.__use_processes = use_processes
+        self.__executor = None
+        self.__lock = threading.Lock()
+        # cache key -> [future, number of attachments not yet rendered], for files of pending records only
+        self.__futures = {}
+
+    def __get_executor(self) -> Executor:
+        if self.__executor is None:
+            if self.__use_processes:
+                self.__executor = ProcessPoolExecutor(max_workers=self.__max_workers)
+            else:
+                self.__executor = ThreadPoolExecutor(max_workers=self.__max_workers,
+                                                     thread_name_prefix="suprsend-attachment")
+        return self.__executor
+
+    @staticmethod
+    def __cache_result(future: Future):
+        if not future.cancelled() and future.exception() is None:
+            cache_key, mime_type, b64data = future.result()
+            attachment_cache.put(cache_key, mime_type, b64data)
+
+    def submit(self, attachment: LazyAttachment):
+        if attachment._encoding is not None:
+            return
+        try:
+            st = os.stat(attachment.abs_path)
+        except OSError:
+            # error is reported (or ignored) when the attachment is materialized
+            return
+        cache_key = attachment_cache.cache_key(attachment.abs_path, st)
+        with self.__lock:
+            entry = self.__futures.get(cache_key)
+            if entry is None:
+                cached = attachment_cache.get(cache_key)
+                future = Future()
+                if cached is not None:
+                    future.set_result((cache_key, cached[0], cached[1]))
+                else:
+                    future = self.__get_executor().submit(_encode_file, attachment.abs_path, attachment.use_mmap)
+                    future.add_done_callback(self.__cache_result)
+                entry = self.__futures[cache_key] = [future, 0]
+            entry[1] += 1
+        attachment._encoding = entry[0]
+        attachment._release_encoding = functools.partial(self.__release, cache_key)
+
+    def __release(self, cache_key: Tuple):
+        # an attachment of the file has been rendered, drop the future once no pending attachment needs it
+        with self.__lock:
+            entry = self.__futures.get(cache_key)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self.__futures[cache_key]
+
+    def submit_all(self, attachments):
+        for attachment in attachments or []:
+            if isinstance(attachment, LazyAttachment):
+                self.submit(attachment)
+
+    def pending_count(self) -> int:
+        """
+        number of files whose encoded content is held for attachments not yet rendered
+        """
+        with self.__lock:
+            return len(self.__futures)
+
+    def shutdown(self, wait: bool = True):
+        with self.__lock:
+            self.__futures = {}
+            if self.__executor is not None:
+                self.__executor.shutdown(wait=wait)
+                self.__executor = None
+
+
+def get_lazy_attachment_for_file(file_path: str, file_name: str, ignore_if_error: bool,
+                                 use_mmap: bool = None) -> LazyAttachment:
+    abs_path = os.path.abspath(os.path.expanduser(file_path))
+    final_file_name = os.path.basename(abs_path)
+    if file_name and file_name.strip():
+        final_file_name = file_name.strip()
+    # file must exist and fit in a request at the time it is added
+    try:
+        if not os.path.isfile(abs_path):
+            raise FileNotFoundError(f"No such file: '{abs_path}'")
+        file_size = os.stat(abs_path).st_size
+        __check_file_size(abs_path, file_size)
+        mime_type = _detect_mime_type(abs_path)
+        return LazyAttachment(abs_path, final_file_name, mime_type, file_size, ignore_if_error, use_mmap)
+    except (OSError, InputValueError) as ex:
         if ignore_if_error:
             ss_logger.warning("Ignoring error while processing attachment file. "
                                 "%s: %s", type(ex).__name__, ex)
@@ -66,8 +426,14 @@ def get_attachment_json_for_url(file_url: str, file_name: str, ignore_if_error:
     }
 
 
-def get_attachment_json(file_path: str, file_name: str = None, ignore_if_error: bool = False) -> Dict:
+def get_attachment_json(file_path: str, file_name: str = None, ignore_if_error: bool = False,
+                        use_mmap: bool = None, lazy: bool = False):
+    """
+    :param lazy: for local files, returns LazyAttachment which reads the file only when body is sent.
+    """
     if check_is_web_url(file_path):
         return get_attachment_json_for_url(file_path, file_name, ignore_if_error)
+    elif lazy:
+        return get_lazy_attachment_for_file(file_path, file_name, ignore_if_error, use_mmap)
     else:
-        return get_attachment_json_for_file(file_path, file_name, ignore_if_error)
+        return get_attachment_json_for_file(file_path, file_name, ignore_if_error, use_mmap)
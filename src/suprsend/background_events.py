@@ -0,0 +1,399 @@
+import atexit
+import os
+import queue
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+from .constants import (
+    MAX_EVENTS_IN_BULK_API, BODY_MAX_APPARENT_SIZE_IN_BYTES,
+    DEFAULT_BACKGROUND_FLUSH_INTERVAL_SECS, DEFAULT_BACKGROUND_MAX_QUEUE_SIZE,
+)
+from .exception import SuprsendConfigError, SuprsendError
+from .event import Event
+from .events_bulk import _BulkEventsChunk
+from .bulk_response import BulkResponse
+from .logger import ss_logger
+from .spool import SPOOL_KIND_EVENT
+from .utils import iter_chunks, record_content
+
+QUEUE_FULL_BLOCK = "block"
+QUEUE_FULL_DROP = "drop"
+QUEUE_FULL_SPILL = "spill"
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+# flush() checks this often whether worker is still alive
+_WORKER_CHECK_INTERVAL_SECS = 0.5
+
+
+class BackgroundEventCollector:
+    """
+    Sends events in batches from a background thread. collect() validates & encodes the event on caller's thread,
+    puts it in a bounded queue and returns, api call (v2/bulk/event/) is made by the worker thread.
+    A batch is sent when it has flush_at events, or flush_size_in_bytes bytes, or when its oldest event
+    has waited for flush_interval seconds.
+    - on_queue_full: what collect() does when max_queue_size events are already waiting
+        - "block": waits for room (upto block_timeout seconds, None: indefinitely), then drops the event
+        - "drop": drops the event
+        - "spill": appends the event to spill_path file, spilled events are sent once queue is drained
+    - spill_path: default is a file (in temp dir) named after process id, so events spilled by a process which
+      died before sending them are not picked by the next one. To replay them on start, pass spill_path,
+      a path used by one process at a time (e.g. one per worker process).
+    - on_batch_done: called (on worker thread) with response dict of each api call. A batch whose api call
+      raised (e.g. unexpected response body) is reported as failed, worker goes on with next one.
+    Events still in queue are sent on shutdown(), which is also called when interpreter exits.
+    With spool configured on client, events are written to spool before being queued, so they survive a crash.
+    An event which can't be queued stays in spool instead of being dropped/spilled, and is sent by
+    replay, which the worker runs on start and on each flush().
+    If worker is not running (i.e. it died), collect() doesn't queue the event: it returns a "fail" response
+    (event stays in spool, if configured), and flush() returns False.
+    """
+    def __init__(self, config, flush_at: int = MAX_EVENTS_IN_BULK_API,
+                 flush_interval: float = DEFAULT_BACKGROUND_FLUSH_INTERVAL_SECS,
+                 flush_size_in_bytes: int = BODY_MAX_APPARENT_SIZE_IN_BYTES,
+                 max_queue_size: int = DEFAULT_BACKGROUND_MAX_QUEUE_SIZE, on_queue_full: str = QUEUE_FULL_BLOCK,
+                 block_timeout: float = None, spill_path: str = None, on_batch_done: Callable = None):
+        if on_queue_full not in (QUEUE_FULL_BLOCK, QUEUE_FULL_DROP, QUEUE_FULL_SPILL):
+            raise SuprsendConfigError("on_queue_full must be one of block, drop, spill")
+        if not 1 <= flush_at <= MAX_EVENTS_IN_BULK_API:
+            raise SuprsendConfigError(f"flush_at must be between 1 and {MAX_EVENTS_IN_BULK_API}")
+        if flush_interval <= 0:
+            raise SuprsendConfigError("flush_interval must be > 0")
+        self.config = config
+        self.flush_at = flush_at
+        self.flush_interval = flush_interval
+        self.flush_size_in_bytes = min(flush_size_in_bytes, BODY_MAX_APPARENT_SIZE_IN_BYTES)
+        self.on_queue_full = on_queue_full
+        self.block_timeout = block_timeout
+        # default path is unique per process: processes running together must not share a spill file
+        self.spill_path = spill_path or os.path.join(tempfile.gettempdir(),
+                                                     "suprsend-events-{}.spill".format(os.getpid()))
+        self.on_batch_done = on_batch_done
+        #
+        self.__queue = queue.Queue(maxsize=max_queue_size)
+        self.__stats = {"queued": 0, "sent": 0, "failed": 0, "dropped": 0, "spilled": 0, "spooled": 0,
+                        "batches": 0, "errors": 0}
+        self.__stats_lock = threading.Lock()
+        self.__spill_lock = threading.Lock()
+        # id(event-dict) -> seq in spool, of queued events
+        self.__spool_seqs = {}
+        self.__thread = None
+        self.__closed = False
+        # events are queued under it, so that none is queued behind _STOP put by shutdown()
+        self.__close_lock = threading.Lock()
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run, name="suprsend-event-collector", daemon=True)
+        self.__thread.start()
+        # send whatever is in queue before interpreter exits
+        atexit.register(self.shutdown)
+        return self
+
+    def collect(self, event: Event) -> Dict:
+        """
+        validates & enqueues event. Validation errors are raised here, api errors are reported to on_batch_done.
+        :return: {"success": True, "status": "queued", ...}, or a "fail" response if the event is dropped
+        :raises: SuprsendError if collector is shut down (with spool, an event collected while it was being shut
+            down is left in spool instead)
+        """
+        if self.__closed:
+            raise SuprsendError("background event collector is shut down")
+        event_dict, event_size, event_content = event.get_final_json_encoded(self.config, is_part_of_bulk=True)
+        record = (event_dict, event_size, event_content)
+        if self.config.spool is not None:
+            return self.__spool_and_enqueue(record)
+        # worker stopped by shutdown() meanwhile (not died): __enqueue() raises
+        if not self.__worker_alive() and not self.__closed:
+            self.__incr("dropped")
+            return {
+                "success": False,
+                "status": "fail",
+                "status_code": 503,
+                "message": "background event worker is not running, event dropped",
+                "raw_response": None,
+            }
+        if self.__enqueue(record):
+            return {
+                "success": True,
+                "status": "queued",
+                "status_code": 202,
+                "message": event_dict["$insert_id"],
+                "raw_response": None,
+            }
+        return {
+            "success": False,
+            "status": "fail",
+            "status_code": 503,
+            "message": "event queue is full, event dropped",
+            "raw_response": None,
+        }
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        sends all queued (and spilled) events, waits for the api calls to finish.
+        :return: False if timeout expired before events were sent, or if worker is not running (it died, or
+            was never started) i.e. queued events won't be sent
+        """
+        if not self.__worker_alive():
+            # worker stopped on shutdown (after sending queued events), died, or was never started
+            return self.__closed and self.__queue.empty()
+        req = _FlushRequest()
+        self.__queue.put(req)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait_for = _WORKER_CHECK_INTERVAL_SECS if deadline is None else \
+                min(_WORKER_CHECK_INTERVAL_SECS, max(deadline - time.monotonic(), 0))
+            if req.done.wait(wait_for):
+                return True
+            if not self.__worker_alive() or (deadline is not None and time.monotonic() >= deadline):
+                return False
+
+    def shutdown(self, timeout: float = None):
+        """
+        stops accepting events, sends the queued ones and stops the worker thread.
+        """
+        with self.__close_lock:
+            if self.__closed:
+                return
+            self.__closed = True
+        atexit.unregister(self.shutdown)
+        if getattr(self.config, "_background_events", None) is self:
+            self.config._background_events = None
+        if self.__thread is not None and self.__thread.is_alive():
+            self.__queue.put(_STOP)
+            self.__thread.join(timeout)
+
+    def stats(self) -> Dict:
+        with self.__stats_lock:
+            stats = dict(self.__stats)
+        stats["queue_size"] = self.__queue.qsize()
+        return stats
+
+    def __worker_alive(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def __incr(self, key: str, by: int = 1):
+        with self.__stats_lock:
+            self.__stats[key] += by
+
+    def __spool_and_enqueue(self, record) -> Dict:
+        event_dict, event_size, content = record
+        # lazy attachments are read once, here: the spooled content is what gets sent
+        content = record_content(event_dict, content, self.config.json_codec)
+        record = (event_dict, event_size, content)
+        seq = self.config.spool.append(SPOOL_KIND_EVENT, [content])[0]
+        with self.__stats_lock:
+            self.__spool_seqs[id(event_dict)] = seq
+        try:
+            queued = self.__worker_alive() and self.__enqueue(record, spill=False)
+        except SuprsendError:
+            # shut down meanwhile
+            queued = False
+        if queued:
+            status = "queued"
+        else:
+            # left in spool, sent on next replay
+            with self.__stats_lock:
+                del self.__spool_seqs[id(event_dict)]
+            self.config.spool.release([seq])
+            status = "spooled"
+        return {
+            "success": True,
+            "status": status,
+            "status_code": 202,
+            "message": event_dict["$insert_id"],
+            "raw_response": None,
+        }
+
+    def __enqueue(self, record, spill: bool = True) -> bool:
+        """
+        :raises: SuprsendError if collector is shut down
+        """
+        with self.__close_lock:
+            if self.__closed:
+                raise SuprsendError("background event collector is shut down")
+            try:
+                if self.on_queue_full == QUEUE_FULL_BLOCK:
+                    self.__put_blocking(record)
+                else:
+                    self.__queue.put_nowait(record)
+            except queue.Full:
+                if spill and self.on_queue_full == QUEUE_FULL_SPILL:
+                    self.__spill(record)
+                    return True
+                self.__incr("dropped" if spill else "spooled")
+                ss_logger.debug("event queue is full, event %s", "dropped" if spill else "left in spool")
+                return False
+        self.__incr("queued")
+        return True
+
+    def __put_blocking(self, record):
+        # waits for room upto block_timeout, but not for a worker which is not running anymore
+        deadline = None if self.block_timeout is None else time.monotonic() + self.block_timeout
+        while True:
+            wait_for = _WORKER_CHECK_INTERVAL_SECS if deadline is None else \
+                min(_WORKER_CHECK_INTERVAL_SECS, max(deadline - time.monotonic(), 0))
+            try:
+                self.__queue.put(record, timeout=wait_for)
+                return
+            except queue.Full:
+                if not self.__worker_alive() or (deadline is not None and time.monotonic() >= deadline):
+                    raise
+
+    # ---------- worker thread
+
+    def __run(self):
+        batch, batch_size, deadline = [], 0, None
+        # events spilled (at explicitly passed spill_path) or spooled by an earlier process which couldn't send them
+        self.__safely(self.__replay_spilled)
+        self.__safely(self.__replay_spool)
+        while True:
+            timeout = self.flush_interval if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.__queue.get(timeout=timeout)
+            except queue.Empty:
+                self.__safely(self.__send, batch)
+                batch, batch_size, deadline = [], 0, None
+                self.__safely(self.__replay_spilled)
+                continue
+            if item is _STOP or isinstance(item, _FlushRequest):
+                self.__safely(self.__send, batch)
+                batch, batch_size, deadline = [], 0, None
+                self.__safely(self.__replay_spilled)
+                if isinstance(item, _FlushRequest):
+                    self.__safely(self.__replay_spool)
+                if item is _STOP:
+                    self.__drain()
+                    return
+                item.done.set()
+                continue
+            if not batch:
+                deadline = time.monotonic() + self.flush_interval
+            batch.append(item)
+            batch_size += item[1]
+            if len(batch) >= self.flush_at or batch_size >= self.flush_size_in_bytes:
+                self.__safely(self.__send, batch)
+                batch, batch_size, deadline = [], 0, None
+
+    def __drain(self):
+        # whatever got queued behind _STOP (e.g. flush() racing with shutdown()) is not left waiting
+        records, flush_requests = [], []
+        while True:
+            try:
+                item = self.__queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _FlushRequest):
+                flush_requests.append(item)
+            elif item is not _STOP:
+                records.append(item)
+        self.__safely(self.__send, records)
+        for req in flush_requests:
+            req.done.set()
+
+    def __safely(self, fn: Callable, *args):
+        # worker must keep running whatever happens to one batch
+        try:
+            fn(*args)
+        except Exception:
+            self.__incr("errors")
+            ss_logger.exception("background events: error in worker")
+
+    def __send(self, records: List):
+        if not records:
+            return
+        # batch can exceed a chunk's byte limit by the last event, which then goes in a chunk of its own
+        spooled = None
+        if self.config.spool is not None:
+            spooled = self.config._spooled_records(SPOOL_KIND_EVENT)
+            with self.__stats_lock:
+                for rec in records:
+                    seq = self.__spool_seqs.pop(id(rec[0]), None)
+                    if seq is not None:
+                        spooled.adopt(rec[0], seq)
+        try:
+            failed_records = self.__send_chunks(records)
+        except BaseException:
+            if spooled is not None:
+                # left for replay
+                spooled.release_unsettled()
+            raise
+        if spooled is not None:
+            spooled.settle(failed_records)
+
+    def __send_chunks(self, records: List) -> List:
+        failed_records = []
+        for chunk in iter_chunks(records, lambda: _BulkEventsChunk(self.config)):
+            try:
+                chunk.trigger()
+            except Exception as ex:
+                # e.g. unexpected response body. Events of chunk are reported as failed (retryable)
+                ss_logger.exception("background events: api call failed")
+                chunk.response = BulkResponse.error_chunk_response(chunk.records, ex)
+            resp = chunk.response
+            failed_records.extend(resp["failed_records"])
+            self.__incr("batches")
+            self.__incr("sent", resp["success"])
+            self.__incr("failed", resp["failure"])
+            if resp["failure"]:
+                ss_logger.warning("background events: %d of %d events failed (status_code: %s)",
+                                  resp["failure"], resp["total"], resp["status_code"])
+            if self.on_batch_done is not None:
+                try:
+                    self.on_batch_done(resp)
+                except Exception:
+                    ss_logger.exception("background events: on_batch_done raised exception")
+        return failed_records
+
+    def __replay_spool(self):
+        if self.config.spool is None:
+            return
+        for chunks, spooled in self.config._spool_replay_rounds():
+            failed_records = []
+            for chunk in chunks:
+                try:
+                    chunk.trigger()
+                except Exception as ex:
+                    ss_logger.exception("background events: replay of spool failed")
+                    chunk.response = BulkResponse.error_chunk_response(chunk.records, ex)
+                self.__incr("sent", chunk.response["success"])
+                failed_records.extend(chunk.response["failed_records"])
+            spooled.settle(failed_records)
+
+    # ---------- spill file: one json-encoded event per line
+
+    def __spill(self, record):
+        event_dict, _, content = record
+        content = record_content(event_dict, content, self.config.json_codec)
+        with self.__spill_lock:
+            with open(self.spill_path, "ab") as f:
+                f.write(content + b"\n")
+        self.__incr("spilled")
+
+    def __replay_spilled(self):
+        replay_path = self.spill_path + ".replay"
+        with self.__spill_lock:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                # events spilled from now on go in a new file
+                os.replace(self.spill_path, replay_path)
+        batch = []
+        with open(replay_path, "rb") as f:
+            for line in f:
+                line = line.rstrip(b"\n")
+                if not line:
+                    continue
+                batch.append((self.config.json_codec.loads(line), len(line), line))
+                if len(batch) >= self.flush_at:
+                    self.__send(batch)
+                    batch = []
+        self.__send(batch)
+        os.remove(replay_path)
@@ -1,4 +1,3 @@
-import requests
 from typing import List, Dict
 
 from .exception import SuprsendAPIException
@@ -36,10 +35,10 @@ class BrandsApi:
         content_txt, sig = get_request_signature(url, 'GET', None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def detail_url(self, brand_id: str):
         brand_id = str(brand_id).strip()
@@ -55,10 +54,10 @@ class BrandsApi:
         content_txt, sig = get_request_signature(url, 'GET', None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def upsert(self, brand_id: str, brand_payload: Dict):
         url = self.detail_url(brand_id)
@@ -66,10 +65,35 @@ class BrandsApi:
         brand_payload = brand_payload or {}
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, 'POST', brand_payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, 'POST', brand_payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
+
+
+class AsyncBrandsApi(BrandsApi):
+    async def list(self, limit: int = 20, offset: int = 0):
+        limit, offset = self.cleaned_limit_offset(limit, offset)
+        params = {"limit": limit, "offset": offset}
+        encoded_params = urlencode_query(params)
+        url = f"{self.list_url}?{encoded_params}"
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get(self, brand_id: str):
+        resp = await self.config.signed_request("GET", self.detail_url(brand_id))
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def upsert(self, brand_id: str, brand_payload: Dict):
+        resp = await self.config.signed_request("POST", self.detail_url(brand_id), brand_payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
@@ -1,6 +1,13 @@
+from .transport import request_error_type
+
 
 class BulkResponse:
-    def __init__(self):
+    def __init__(self, keep_failed_records: bool = True):
+        """
+        :param keep_failed_records: False: only counters are kept (streaming mode, where each chunk's result
+            is reported to a callback instead)
+        """
+        self.keep_failed_records = keep_failed_records
         self.status = None
         self.failed_records = []
         self.total = 0
@@ -30,8 +37,8 @@ class BulkResponse:
         self.total += ch_resp.get("total", 0)
         self.success += ch_resp.get("success", 0)
         self.failure += ch_resp.get("failure", 0)
-        failed_recs = ch_resp.get("failed_records", [])
-        self.failed_records.extend(failed_recs)
+        if self.keep_failed_records:
+            self.failed_records.extend(ch_resp.get("failed_records", []))
 
     @classmethod
     def empty_chunk_success_response(cls):
@@ -57,6 +64,55 @@ class BulkResponse:
             "raw_response": None,
         }
 
+    @classmethod
+    def error_chunk_response(cls, records, ex: Exception):
+        """
+        response of a chunk whose api call raised ex. error_type of failed records tells whether the call
+        timed out (connect_timeout/read_timeout: code 504), failed fast on open circuit (circuit_open: code 503),
+        or failed otherwise (connection_error/error: code 500).
+        """
+        error_type = request_error_type(ex)
+        if error_type in ("connect_timeout", "read_timeout"):
+            code = 504
+        elif error_type == "circuit_open":
+            code = 503
+        else:
+            code = 500
+        error_str = ex.__str__()
+        return {
+            "status": "fail",
+            "status_code": code,
+            "total": len(records),
+            "success": 0,
+            "failure": len(records),
+            "failed_records": [{"record": c, "error": error_str, "code": code, "error_type": error_type}
+                               for c in records],
+            "raw_response": None,
+        }
+
+    @classmethod
+    def unexpected_response_chunk_response(cls, records, status_code: int, resp_text: str):
+        """
+        response of a chunk whose api call got a 2xx response with a body which is not a bulk api response
+        (e.g. html page of a proxy). Whether records were processed is unknown, so they are reported failed with
+        code 502 (error_type: unexpected_response) i.e. as retryable.
+        """
+        error_str = "unexpected response (status_code: {}): {}".format(status_code, (resp_text or "")[:200])
+        return {
+            "status": "fail",
+            "status_code": status_code,
+            "total": len(records),
+            "success": 0,
+            "failure": len(records),
+            "failed_records": [{"record": c, "error": error_str, "code": 502, "error_type": "unexpected_response"}
+                               for c in records],
+            "raw_response": None,
+        }
+
+    @staticmethod
+    def is_bulk_api_v2_response(resp_json) -> bool:
+        return isinstance(resp_json, dict) and isinstance(resp_json.get("records"), list)
+
     @classmethod
     def parse_bulk_api_v2_response(cls, resp_json: dict):
         total_count = len(resp_json["records"])
@@ -0,0 +1,146 @@
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlparse
+
+from .exception import SuprsendCircuitOpenError, SuprsendConfigError
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# path segments which are followed by the actual endpoint name e.g. v2/bulk/event/
+_PREFIX_SEGMENTS = ("v1", "v2", "bulk")
+
+
+def endpoint_of(url: str, base_path: str = "/") -> str:
+    """
+    endpoint (path prefix after base-url, without resource ids) of url e.g.
+    v1/user/<distinct_id>/ -> "v1/user/", v2/bulk/event/ -> "v2/bulk/event/", trigger/ -> "trigger/"
+    """
+    path = urlparse(url).path
+    if path.startswith(base_path):
+        path = path[len(base_path):]
+    segments = [seg for seg in path.split("/") if seg]
+    endpoint = []
+    for seg in segments:
+        endpoint.append(seg)
+        if seg not in _PREFIX_SEGMENTS:
+            break
+    return "/".join(endpoint) + "/" if endpoint else "/"
+
+
+class _Circuit:
+    def __init__(self):
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probes_in_flight = 0
+        self.total_failures = 0
+        self.rejected = 0
+
+
+class CircuitBreaker:
+    """
+    Stops calling an endpoint which keeps failing, so that callers don't pile up waiting on a degraded hub.
+    Maintains a circuit per endpoint (e.g. "v2/event/", "v1/user/"):
+    - closed: calls go through. failure_threshold consecutive failures (connection errors, timeouts, 5xx) open it.
+    - open: calls fail immediately with SuprsendCircuitOpenError (api methods which return a response dict instead
+      of raising, return it as a "fail" response). After recovery_timeout seconds, circuit becomes half-open.
+    - half_open: up to half_open_max_calls probe calls go through. A successful probe closes the circuit,
+      a failed one opens it again.
+    """
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30, half_open_max_calls: int = 1):
+        if failure_threshold < 1 or half_open_max_calls < 1:
+            raise SuprsendConfigError("failure_threshold and half_open_max_calls must be >= 1")
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        # path of base-url, endpoints are relative to it. Set by the client using this breaker
+        self.base_path = "/"
+        self.__circuits = {}
+        self.__lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __circuit(self, endpoint: str) -> _Circuit:
+        circuit = self.__circuits.get(endpoint)
+        if circuit is None:
+            circuit = self.__circuits[endpoint] = _Circuit()
+        return circuit
+
+    def before_call(self, url: str) -> str:
+        """
+        returns endpoint of the url (to be passed to on_success/on_failure)
+        :raises: SuprsendCircuitOpenError
+        """
+        endpoint = endpoint_of(url, self.base_path)
+        with self.__lock:
+            circuit = self.__circuit(endpoint)
+            if circuit.state == STATE_OPEN:
+                if time.monotonic() - circuit.opened_at < self.recovery_timeout:
+                    circuit.rejected += 1
+                    raise SuprsendCircuitOpenError(f"circuit open for endpoint {endpoint}: too many consecutive "
+                                                   f"failures, calls are not sent")
+                circuit.state = STATE_HALF_OPEN
+                circuit.probes_in_flight = 0
+            if circuit.state == STATE_HALF_OPEN:
+                if circuit.probes_in_flight >= self.half_open_max_calls:
+                    circuit.rejected += 1
+                    raise SuprsendCircuitOpenError(f"circuit half-open for endpoint {endpoint}: "
+                                                   f"waiting for probe call to complete")
+                circuit.probes_in_flight += 1
+        return endpoint
+
+    def on_success(self, endpoint: str):
+        with self.__lock:
+            circuit = self.__circuit(endpoint)
+            circuit.state = STATE_CLOSED
+            circuit.consecutive_failures = 0
+            circuit.probes_in_flight = 0
+            circuit.opened_at = None
+
+    def on_failure(self, endpoint: str):
+        with self.__lock:
+            circuit = self.__circuit(endpoint)
+            circuit.consecutive_failures += 1
+            circuit.total_failures += 1
+            if circuit.state == STATE_HALF_OPEN or circuit.consecutive_failures >= self.failure_threshold:
+                circuit.state = STATE_OPEN
+                circuit.opened_at = time.monotonic()
+                circuit.probes_in_flight = 0
+
+    def on_abort(self, endpoint: str):
+        """
+        call ended without an outcome (e.g. cancelled): only frees its probe slot
+        """
+        with self.__lock:
+            circuit = self.__circuit(endpoint)
+            if circuit.probes_in_flight > 0:
+                circuit.probes_in_flight -= 1
+
+    @staticmethod
+    def is_failure_status(status_code: int) -> bool:
+        return status_code >= 500
+
+    def state(self) -> Dict:
+        """
+        per endpoint state, for health checks
+        """
+        with self.__lock:
+            now = time.monotonic()
+            return {
+                endpoint: {
+                    "state": c.state,
+                    "consecutive_failures": c.consecutive_failures,
+                    "total_failures": c.total_failures,
+                    "rejected": c.rejected,
+                    "open_for_secs": (now - c.opened_at) if c.opened_at is not None else None,
+                }
+                for endpoint, c in self.__circuits.items()
+            }
+
+    def is_healthy(self) -> bool:
+        with self.__lock:
+            return all(c.state == STATE_CLOSED for c in self.__circuits.values())
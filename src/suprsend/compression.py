@@ -0,0 +1,59 @@
+import gzip
+import hashlib
+import zlib
+from typing import Dict, Optional, Tuple
+
+from .constants import DEFAULT_BULK_COMPRESSION_LEVEL, DEFAULT_BULK_COMPRESSION_MIN_SIZE_IN_BYTES
+from .exception import SuprsendConfigError
+
+ENCODING_GZIP = "gzip"
+ENCODING_DEFLATE = "deflate"
+
+
+class BodyCompression:
+    """
+    Compresses bodies of bulk api calls (Content-Encoding: gzip/deflate). Records of a bulk body repeat the same
+    keys and values, so they typically shrink 5-10x.
+    - encoding: "gzip" or "deflate" (zlib stream)
+    - level: 1 (fastest) to 9 (smallest)
+    - min_size: bodies smaller than this many bytes are sent as they are
+    Body is compressed before signing, so that the signature (Content-MD5) covers the bytes sent on wire.
+    """
+    def __init__(self, encoding: str = ENCODING_GZIP, level: int = DEFAULT_BULK_COMPRESSION_LEVEL,
+                 min_size: int = DEFAULT_BULK_COMPRESSION_MIN_SIZE_IN_BYTES):
+        if encoding not in (ENCODING_GZIP, ENCODING_DEFLATE):
+            raise SuprsendConfigError("encoding must be one of gzip, deflate")
+        if not 1 <= level <= 9:
+            raise SuprsendConfigError("compression level must be between 1 and 9")
+        self.encoding = encoding
+        self.level = level
+        self.min_size = min_size
+
+    def compress(self, data: bytes) -> Optional[bytes]:
+        """
+        :return: compressed data. None if data is below min_size or doesn't shrink on compression
+        """
+        if not data or len(data) < self.min_size:
+            return None
+        if self.encoding == ENCODING_GZIP:
+            # mtime=0: same body always compresses to same bytes
+            compressed = gzip.compress(data, compresslevel=self.level, mtime=0)
+        else:
+            compressed = zlib.compress(data, self.level)
+        if len(compressed) >= len(data):
+            return None
+        return compressed
+
+    def encode_body(self, data: bytes, content_md5: str, headers: Dict) -> Tuple[bytes, str]:
+        """
+        compresses data (if worth it) and sets Content-Encoding header.
+        :return: (body to send, md5 of body to send)
+        """
+        compressed = self.compress(data)
+        if compressed is None:
+            return data, content_md5
+        headers["Content-Encoding"] = self.encoding
+        return compressed, hashlib.md5(compressed).hexdigest()
+
+    def __repr__(self):
+        return "BodyCompression<{}, level: {}, min_size: {}>".format(self.encoding, self.level, self.min_size)
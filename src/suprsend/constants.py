@@ -27,3 +27,55 @@ MAX_IDENTITY_EVENTS_IN_BULK_API = 400
 
 # In TZ Format: "%a, %d %b %Y %H:%M:%S %Z"
 HEADER_DATE_FMT = "%a, %d %b %Y %H:%M:%S GMT"
+
+# -- http connection pool (keep-alive) defaults
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+# pooled connections idle for more than this many seconds are dropped before next request
+DEFAULT_POOL_IDLE_TIMEOUT_SECS = 60
+
+# -- http timeouts (seconds): connect timeout, read timeout (max wait for server between bytes of response)
+DEFAULT_CONNECT_TIMEOUT_SECS = 5
+DEFAULT_READ_TIMEOUT_SECS = 30
+# bulk requests carry up to 800KB and many records, server takes longer to respond
+DEFAULT_BULK_READ_TIMEOUT_SECS = 120
+
+# -- compression of bulk request bodies (when enabled)
+DEFAULT_BULK_COMPRESSION_LEVEL = 6
+# bodies smaller than this are not compressed, saving is too small to be worth the cpu
+DEFAULT_BULK_COMPRESSION_MIN_SIZE_IN_BYTES = 1024
+
+# -- background event collector (batched track_event)
+# a batch is sent at latest this many seconds after its first event was queued
+DEFAULT_BACKGROUND_FLUSH_INTERVAL_SECS = 5
+# max events waiting in queue to be sent
+DEFAULT_BACKGROUND_MAX_QUEUE_SIZE = 10000
+
+# -- spool (write-ahead log) of undelivered bulk records
+DEFAULT_SPOOL_SEGMENT_MAX_SIZE_IN_BYTES = 16 * 1024 * 1024
+DEFAULT_SPOOL_FSYNC_INTERVAL_SECS = 1
+# acknowledged records are compacted away once they take more than this (and more than live records)
+DEFAULT_SPOOL_COMPACT_MIN_SIZE_IN_BYTES = 64 * 1024 * 1024
+
+# -- retry of failed api calls (429/5xx responses, connection errors)
+# total attempts per call, including the first one
+DEFAULT_RETRY_MAX_ATTEMPTS = 3
+# backoff before n-th retry: min(DEFAULT_RETRY_BACKOFF_MAX_SECS, DEFAULT_RETRY_BACKOFF_BASE_SECS * 2^(n-1)), jittered
+DEFAULT_RETRY_BACKOFF_BASE_SECS = 0.5
+DEFAULT_RETRY_BACKOFF_MAX_SECS = 10
+# Retry-After asking to wait longer than this is not honoured, response is returned as it is
+DEFAULT_RETRY_AFTER_MAX_SECS = 60
+# retry budget: every call earns this fraction of a retry, so that retries can't multiply load on an outage
+DEFAULT_RETRY_BUDGET_RATIO = 0.2
+# retries available irrespective of calls made (also the initial budget)
+DEFAULT_RETRY_BUDGET_MIN_RETRIES = 10
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# -- attachment encoding
+# files are read & base64-encoded in blocks of this size (multiple of 3, so that blocks encode without padding)
+ATTACHMENT_READ_BLOCK_SIZE_IN_BYTES = 3 * 64 * 1024
+# files of at least this size are memory-mapped instead of being read into a buffer
+ATTACHMENT_MMAP_MIN_SIZE_IN_BYTES = 256 * 1024
+# encoded content of recently attached files is cached (LRU) up to this total size. 0: cache disabled (opt-in via
+# attachment_cache.resize())
+ATTACHMENT_CACHE_MAX_SIZE_IN_BYTES = 0
@@ -1,4 +1,3 @@
-import requests
 import time
 from typing import List, Dict
 import uuid
@@ -10,7 +9,8 @@ from .constants import (
 from .exception import InputValueError
 from .attachment import get_attachment_json
 from .signature import get_request_signature
-from .utils import (validate_track_event_schema, get_apparent_event_size, )
+from .retry import has_idempotency_keys
+from .utils import (validate_track_event_schema, get_apparent_event_size_and_content, )
 
 
 RESERVED_EVENT_NAMES = [
@@ -60,14 +60,19 @@ class Event:
         self.__check_event_prefix(event_name)
         self.event_name = event_name
 
-    def add_attachment(self, file_path: str, file_name: str = None, ignore_if_error: bool = False):
+    def add_attachment(self, file_path: str, file_name: str = None, ignore_if_error: bool = False,
+                       lazy: bool = False):
+        """
+        :param lazy: for local file, add only a reference to it (LazyAttachment). File is read and encoded
+            when the request is sent (or written to spool), instead of now.
+        """
         # if properties is not a dict, not raising error while adding attachment.
         if not isinstance(self.properties, (dict,)):
             ss_logger.warning("attachment cannot be added. please make sure properties is a dictionary. "
                                 "Event: %s", str(self.as_json()))
             return
         # ---
-        attachment = get_attachment_json(file_path, file_name, ignore_if_error)
+        attachment = get_attachment_json(file_path, file_name, ignore_if_error, lazy=lazy)
         if not attachment:
             return
         # --- add the attachment to properties->$attachments
@@ -77,6 +82,14 @@ class Event:
         self.properties["$attachments"].append(attachment)
 
     def get_final_json(self, config, is_part_of_bulk: bool = False):
+        event_dict, apparent_size, _ = self.get_final_json_encoded(config, is_part_of_bulk)
+        return event_dict, apparent_size
+
+    def get_final_json_encoded(self, config, is_part_of_bulk: bool = False):
+        """
+        same as get_final_json, additionally returns json-encoded event (bytes) produced while calculating size.
+        encoded event is None if size was calculated on a modified copy of the event.
+        """
         # --- validate
         self.__validate_distinct_id()
         self.__validate_event_name()
@@ -100,12 +113,13 @@ class Event:
         # ---
         event_dict = validate_track_event_schema(event_dict)
         # ---- Check size
-        apparent_size = get_apparent_event_size(event_dict, is_part_of_bulk)
+        apparent_size, content = get_apparent_event_size_and_content(event_dict, is_part_of_bulk,
+                                                                      config.json_codec)
         if apparent_size > BODY_MAX_APPARENT_SIZE_IN_BYTES:
             raise InputValueError(f"Event size too big - {apparent_size} Bytes, "
                                   f"must not cross {BODY_MAX_APPARENT_SIZE_IN_BYTES_READABLE}")
         # ----
-        return event_dict, apparent_size
+        return event_dict, apparent_size, content
 
     def as_json(self):
         event_dict = {
@@ -126,7 +140,7 @@ class Event:
 class EventCollector:
     def __init__(self, config):
         self.config = config
-        self.__url = self.__get_url()
+        self.url = self.__get_url()
 
     def __get_url(self):
         url_formatted = "{}v2/event/".format(self.config.base_url)
@@ -140,38 +154,69 @@ class EventCollector:
         try:
             headers = self.config.default_headers()
             # Signature and Authorization-header
-            content_txt, sig = get_request_signature(self.__url, 'POST', event, headers,
-                                                     self.config.workspace_secret)
+            content_txt, sig = get_request_signature(self.url, 'POST', event, headers,
+                                                     self.config.workspace_secret, self.config.json_codec)
             headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
             # -----
-            resp = requests.post(self.__url,
-                                 data=content_txt.encode('utf-8'),
-                                 headers=headers)
+            resp = self.config.transport.post(self.url,
+                                              data=content_txt.encode('utf-8'),
+                                              headers=headers,
+                                              idempotent=has_idempotency_keys(event))
         except Exception as ex:
-            error_str = ex.__str__()
+            return self._error_response(ex)
+        else:
+            return self._parse_response(resp)
+
+    @staticmethod
+    def _error_response(ex: Exception) -> Dict:
+        error_str = ex.__str__()
+        return {
+            "success": False,
+            "status": "fail",
+            "status_code": 500,
+            "message": error_str,
+            "raw_response": None,
+        }
+
+    def _parse_response(self, resp) -> Dict:
+        ok_response = resp.status_code // 100 == 2
+        resp_json = self.config.json_codec.loads(resp.content)
+        if ok_response:
+            return {
+                "success": True,
+                "status": "success",
+                "status_code": resp.status_code,
+                "message": resp_json.get("message_id"),
+                "raw_response": resp_json,
+            }
+        else:
             return {
                 "success": False,
                 "status": "fail",
-                "status_code": 500,
-                "message": error_str,
-                "raw_response": None,
+                "status_code": resp.status_code,
+                "message": resp_json.get("error", {}).get("message"),
+                "raw_response": resp_json,
             }
+
+
+class AsyncEventCollector(EventCollector):
+    async def collect(self, event: Event) -> Dict:
+        event_dict, event_size = event.get_final_json(self.config, is_part_of_bulk=False)
+        return await self.send(event_dict)
+
+    async def send(self, event: Dict) -> Dict:
+        try:
+            headers = self.config.default_headers()
+            # Signature and Authorization-header
+            content_txt, sig = get_request_signature(self.url, 'POST', event, headers,
+                                                     self.config.workspace_secret, self.config.json_codec)
+            headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
+            # -----
+            resp = await self.config.transport.post(self.url,
+                                                    data=content_txt.encode('utf-8'),
+                                                    headers=headers,
+                                                    idempotent=has_idempotency_keys(event))
+        except Exception as ex:
+            return self._error_response(ex)
         else:
-            ok_response = resp.status_code // 100 == 2
-            resp_json = resp.json()
-            if ok_response:
-                return {
-                    "success": True,
-                    "status": "success",
-                    "status_code": resp.status_code,
-                    "message": resp_json.get("message_id"),
-                    "raw_response": resp_json,
-                }
-            else:
-                return {
-                    "success": False,
-                    "status": "fail",
-                    "status_code": resp.status_code,
-                    "message": resp_json.get("error", {}).get("message"),
-                    "raw_response": resp_json,
-                }
+            return self._parse_response(resp)
@@ -70,3 +70,15 @@ class SuprsendValidationError(SuprsendError):
         self.error_type = "SuprsendValidationError"
         if self.message is None:
             self.message = "validation error"
+
+
+class SuprsendCircuitOpenError(SuprsendError):
+    """
+    raised (without making the http call) when circuit breaker of the endpoint is open i.e. endpoint has been failing.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.status_code = 503
+        self.error_type = "SuprsendCircuitOpenError"
+        if self.message is None:
+            self.message = "circuit open"
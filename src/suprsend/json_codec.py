@@ -0,0 +1,131 @@
+import json
+from typing import Union
+
+from .attachment import LazyAttachment
+from .exception import SuprsendConfigError
+
+try:
+    import orjson
+    _has_orjson = True
+except ImportError:
+    _has_orjson = False
+
+try:
+    import ujson
+    _has_ujson = True
+except ImportError:
+    _has_ujson = False
+
+
+def _materialize_default(obj):
+    # objects json can't encode natively. LazyAttachment file is read & encoded here i.e. when body is sent
+    if isinstance(obj, LazyAttachment):
+        return obj.materialize()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JsonCodec:
+    """
+    Encodes request bodies (utf-8 bytes) and decodes response bodies.
+    - item_separator: separator the codec puts between json-array items. Used to join already-encoded
+      records into an array body which is byte-identical to dumps(list_of_records).
+    - key_separator: separator between key and value of an object
+    dumps(obj, default): default is called for objects codec can't encode natively (LazyAttachment by default).
+    """
+    name = None
+    item_separator = b", "
+    key_separator = b": "
+
+    def dumps(self, obj, default=None) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, content: Union[bytes, str]):
+        raise NotImplementedError
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return "JsonCodec<{}>".format(self.name)
+
+
+class StdlibJsonCodec(JsonCodec):
+    name = "json"
+    item_separator = b", "
+    key_separator = b": "
+
+    def dumps(self, obj, default=None) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, default=default or _materialize_default).encode('utf-8')
+
+    def loads(self, content: Union[bytes, str]):
+        return json.loads(content)
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    orjson always produces compact json (no whitespace after separators), so bodies are smaller than
+    stdlib ones. Objects orjson can't serialize (e.g. integers beyond 64 bit) are handed over to stdlib json:
+    whole obj is encoded again, so default can be called more than once for the same object.
+    """
+    name = "orjson"
+    item_separator = b","
+    key_separator = b":"
+
+    def __init__(self):
+        if not _has_orjson:
+            raise SuprsendConfigError("orjson is not installed. Install it using: pip install suprsend-py-sdk[orjson]")
+        self.__option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, default=None) -> bytes:
+        default = default or _materialize_default
+        try:
+            return orjson.dumps(obj, default=default, option=self.__option)
+        except TypeError:
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default).encode('utf-8')
+
+    def loads(self, content: Union[bytes, str]):
+        return orjson.loads(content)
+
+
+class UjsonCodec(JsonCodec):
+    name = "ujson"
+    item_separator = b","
+    key_separator = b":"
+
+    def __init__(self):
+        if not _has_ujson:
+            raise SuprsendConfigError("ujson is not installed. Install it using: pip install ujson")
+
+    def dumps(self, obj, default=None) -> bytes:
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False,
+                           default=default or _materialize_default).encode('utf-8')
+
+    def loads(self, content: Union[bytes, str]):
+        return ujson.loads(content)
+
+
+_CODECS = {
+    StdlibJsonCodec.name: StdlibJsonCodec,
+    OrjsonCodec.name: OrjsonCodec,
+    UjsonCodec.name: UjsonCodec,
+}
+
+
+def get_json_codec(codec: Union[str, JsonCodec] = None) -> JsonCodec:
+    """
+    :param codec: JsonCodec instance or one of "json"/"orjson"/"ujson".
+        None: auto-detect i.e. orjson if installed, else stdlib json.
+    :raises: SuprsendConfigError
+    """
+    if isinstance(codec, JsonCodec):
+        return codec
+    if codec is None:
+        return OrjsonCodec() if _has_orjson else StdlibJsonCodec()
+    codec_cls = _CODECS.get(codec)
+    if codec_cls is None:
+        raise SuprsendConfigError("json_codec must be one of {}".format(", ".join(_CODECS.keys())))
+    return codec_cls()
+
+
+# used wherever a client instance (and hence its configured codec) is not available
+default_json_codec = get_json_codec()
@@ -1,7 +1,5 @@
 from typing import Dict, Union
 
-import requests
-
 from .exception import SuprsendAPIException, SuprsendValidationError
 from .signature import get_request_signature
 from .object_edit import ObjectEdit
@@ -36,10 +34,10 @@ class ObjectsApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def detail_url(self, object_type: str, object_id: str) -> str:
         object_type = self._validate_object_type(object_type)
@@ -58,23 +56,24 @@ class ObjectsApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def upsert(self, object_type: str, object_id: str, payload: Dict = None) -> Dict:
         url = self.detail_url(object_type, object_id)
         payload = payload or {}
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "POST", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "POST", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def edit(self, edit_ins_or_object_type: Union[ObjectEdit, str], object_id: str = None, edit_payload: Dict = None) -> Dict:
         if isinstance(edit_ins_or_object_type, ObjectEdit):
@@ -89,22 +88,24 @@ class ObjectsApi:
         # ---
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.patch(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.patch(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def delete(self, object_type: str, object_id: str) -> Dict:
         url = self.detail_url(object_type, object_id)
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "DELETE", "", headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "DELETE", "", headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.delete(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.delete(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
         return {"success": True, "status_code": resp.status_code}
@@ -122,10 +123,11 @@ class ObjectsApi:
         payload = payload or {}
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "DELETE", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "DELETE", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.delete(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.delete(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
         return {"success": True, "status_code": resp.status_code}
@@ -139,10 +141,10 @@ class ObjectsApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def create_subscriptions(self, object_type: str, object_id: str, payload: Dict) -> Dict:
         """
@@ -160,13 +162,14 @@ class ObjectsApi:
         payload = payload or {}
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "POST", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "POST", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def delete_subscriptions(self, object_type: str, object_id: str, payload: Dict) -> Dict:
         """
@@ -183,10 +186,11 @@ class ObjectsApi:
         payload = payload or {}
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "DELETE", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "DELETE", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.delete(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.delete(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
         return {"success": True, "status_code": resp.status_code}
@@ -200,10 +204,10 @@ class ObjectsApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def get_edit_instance(self, object_type: str, object_id: str) -> ObjectEdit:
         object_type = self._validate_object_type(object_type)
@@ -223,10 +227,10 @@ class ObjectsApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def update_global_channels_preference(self, object_type: str, object_id: str, payload: Dict, options: Dict = None) -> Dict:
         """
@@ -245,13 +249,14 @@ class ObjectsApi:
         # ----
         payload = payload or {}
         headers = self.config.default_headers()
-        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # ----
-        resp = requests.patch(url, data=content_txt.encode("utf-8"), headers=headers)
+        resp = self.config.transport.patch(url, data=content_txt.encode("utf-8"), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def get_category_preference(self, object_type: str, object_id: str, category: str, options: Dict = None) -> Dict:
         """
@@ -269,10 +274,10 @@ class ObjectsApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def update_category_preference(
         self, object_type: str, object_id: str, category: str, payload: Dict, options: Dict = None
@@ -289,10 +294,146 @@ class ObjectsApi:
         # ----
         payload = payload or {}
         headers = self.config.default_headers()
-        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # ----
-        resp = requests.patch(url, data=content_txt.encode("utf-8"), headers=headers)
+        resp = self.config.transport.patch(url, data=content_txt.encode("utf-8"), headers=headers)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+
+class AsyncObjectsApi(ObjectsApi):
+    async def list(self, object_type: str, options: Dict = None) -> Dict:
+        object_type = self._validate_object_type(object_type)
+        object_type_encoded = urlencode_path_param(object_type)
+        encoded_options = urlencode_query(options or {})
+        url = "{}{}/{}".format(self.list_url, object_type_encoded, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get(self, object_type: str, object_id: str) -> Dict:
+        url = self.detail_url(object_type, object_id)
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def upsert(self, object_type: str, object_id: str, payload: Dict = None) -> Dict:
+        url = self.detail_url(object_type, object_id)
+        resp = await self.config.signed_request("POST", url, payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def edit(self, edit_ins_or_object_type: Union[ObjectEdit, str], object_id: str = None, edit_payload: Dict = None) -> Dict:
+        if isinstance(edit_ins_or_object_type, ObjectEdit):
+            edit_ins = edit_ins_or_object_type
+            edit_ins.validate_body()
+            payload = edit_ins.get_payload()
+            url = self.detail_url(edit_ins.object_type, edit_ins.object_id)
+        else:
+            object_type = edit_ins_or_object_type
+            payload = edit_payload or {}
+            url = self.detail_url(object_type, object_id)
+        # ---
+        resp = await self.config.signed_request("PATCH", url, payload)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def delete(self, object_type: str, object_id: str) -> Dict:
+        url = self.detail_url(object_type, object_id)
+        resp = await self.config.signed_request("DELETE", url, "")
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return {"success": True, "status_code": resp.status_code}
+
+    async def bulk_delete(self, object_type: str, payload: Dict) -> Dict:
+        """
+        payload: {"object_ids": ["id1", "id2"]}
+        """
+        object_type = self._validate_object_type(object_type)
+        object_type_encoded = urlencode_path_param(object_type)
+        url = "{}{}/".format(self.bulk_url, object_type_encoded)
+        resp = await self.config.signed_request("DELETE", url, payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return {"success": True, "status_code": resp.status_code}
+
+    async def get_subscriptions(self, object_type: str, object_id: str, options: Dict = None) -> Dict:
+        encoded_options = urlencode_query(options or {})
+        _detail_url = self.detail_url(object_type, object_id)
+        url = "{}subscription/{}".format(_detail_url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def create_subscriptions(self, object_type: str, object_id: str, payload: Dict) -> Dict:
+        url = "{}subscription/".format(self.detail_url(object_type, object_id))
+        resp = await self.config.signed_request("POST", url, payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def delete_subscriptions(self, object_type: str, object_id: str, payload: Dict) -> Dict:
+        url = "{}subscription/".format(self.detail_url(object_type, object_id))
+        resp = await self.config.signed_request("DELETE", url, payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return {"success": True, "status_code": resp.status_code}
+
+    async def get_objects_subscribed_to(self, object_type: str, object_id: str, options: Dict = None) -> Dict:
+        encoded_options = urlencode_query(options or {})
+        _detail_url = self.detail_url(object_type, object_id)
+        url = "{}subscribed_to/object/{}".format(_detail_url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get_full_preference(self, object_type: str, object_id: str, options: Dict = None) -> Dict:
+        _detail_url = self.detail_url(object_type, object_id)
+        encoded_options = urlencode_query(options or {})
+        url = "{}preference/{}".format(_detail_url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def update_global_channels_preference(self, object_type: str, object_id: str, payload: Dict, options: Dict = None) -> Dict:
+        _detail_url = self.detail_url(object_type, object_id)
+        encoded_options = urlencode_query(options or {})
+        url = "{}preference/channel_preference/{}".format(_detail_url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("PATCH", url, payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get_category_preference(self, object_type: str, object_id: str, category: str, options: Dict = None) -> Dict:
+        if not category or not isinstance(category, (str,)) or not category.strip():
+            raise SuprsendValidationError("missing category")
+        category_encoded = urlencode_path_param(category.strip())
+        encoded_options = urlencode_query(options or {})
+        _detail_url = self.detail_url(object_type, object_id)
+        url = "{}preference/category/{}/{}".format(_detail_url, category_encoded, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def update_category_preference(
+        self, object_type: str, object_id: str, category: str, payload: Dict, options: Dict = None
+    ) -> Dict:
+        _detail_url = self.detail_url(object_type, object_id)
+        category_encoded = urlencode_path_param(category)
+        encoded_options = urlencode_query(options or {})
+        url = "{}preference/category/{}/{}".format(_detail_url, category_encoded, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("PATCH", url, payload or {})
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
@@ -0,0 +1,91 @@
+import threading
+import time
+from typing import Dict, Tuple, Union
+from urllib.parse import urlparse
+
+from .exception import SuprsendConfigError
+
+# family which applies to all endpoints not matching any other configured family
+DEFAULT_FAMILY = "*"
+
+
+class TokenBucket:
+    """
+    rate: tokens added per second, capacity: max tokens accumulated (i.e. burst size).
+    A caller reserves a token and waits for the returned duration; tokens can be reserved in advance (count goes
+    negative), so concurrent callers get evenly spaced slots instead of retrying in a busy loop.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        if not rate or rate <= 0:
+            raise SuprsendConfigError("rate must be > 0")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self.__tokens = self.capacity
+        self.__updated_at = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        reserves tokens, returns seconds to wait before using them
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated_at) * self.rate)
+            self.__updated_at = now
+            self.__tokens -= tokens
+            if self.__tokens >= 0:
+                return 0.0
+            return -self.__tokens / self.rate
+
+    @property
+    def available(self) -> float:
+        with self.__lock:
+            now = time.monotonic()
+            return min(self.capacity, self.__tokens + (now - self.__updated_at) * self.rate)
+
+
+class RateLimiter:
+    """
+    Client side rate limit per endpoint family, so that bursts are smoothed out instead of being rejected (429)
+    by SuprSend. Each http call (incl. each retry attempt of it) takes one token of its family's bucket.
+
+    limits: {family: rate} or {family: (rate, burst)}
+    - family: path prefix relative to base-url e.g. "trigger/", "v2/event/", "v2/bulk/event/", "event/", "v1/user/".
+      Longest matching prefix wins. "*" applies to all calls not matching any other family. Calls matching none
+      are not limited.
+    - rate: calls per second, burst: max calls made at once after being idle (default: max(1, rate))
+    """
+    def __init__(self, limits: Dict[str, Union[float, Tuple[float, float]]], base_url: str):
+        self.__base_path = urlparse(base_url).path
+        self.__buckets = {}
+        for family, limit in (limits or {}).items():
+            rate, burst = limit if isinstance(limit, (tuple, list)) else (limit, None)
+            self.__buckets[family.lstrip("/")] = TokenBucket(rate, burst)
+        # longest prefix first
+        self.__families = sorted((f for f in self.__buckets if f != DEFAULT_FAMILY), key=len, reverse=True)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def family(self, url: str):
+        path = urlparse(url).path
+        if path.startswith(self.__base_path):
+            path = path[len(self.__base_path):]
+        path = path.lstrip("/")
+        for family in self.__families:
+            if path.startswith(family):
+                return family
+        return DEFAULT_FAMILY if DEFAULT_FAMILY in self.__buckets else None
+
+    def reserve(self, url: str) -> float:
+        """
+        returns seconds to wait before calling url
+        """
+        family = self.family(url)
+        if family is None:
+            return 0.0
+        return self.__buckets[family].reserve()
+
+    def state(self) -> Dict:
+        return {family: {"rate": b.rate, "burst": b.capacity, "available": b.available}
+                for family, b in self.__buckets.items()}
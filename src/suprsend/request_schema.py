@@ -3,11 +3,40 @@ import json
 import jsonschema
 from .exception import SuprsendMissingSchema, SuprsendInvalidSchema
 
+try:
+    import fastjsonschema
+    _has_fastjsonschema = True
+except ImportError:
+    _has_fastjsonschema = False
+
 
 # Cached json schema
 __JSON_SCHEMAS = dict()
 
 
+class _CompiledSchemaValidator:
+    """
+    Validates using schema compiled into python code (fastjsonschema), which is an order of magnitude faster
+    than jsonschema's interpreted validation for valid instances. Compiled validator only decides whether instance
+    is valid, invalid instance is validated again using jsonschema so that raised error (and hence message) is
+    exactly the same as with plain jsonschema validator. So an invalid instance costs a little more (~10%) than
+    with jsonschema alone: fine as long as most records are valid.
+    """
+    def __init__(self, schema_body: dict, validator: jsonschema.Draft7Validator):
+        # - use_default=False: compiled code must not fill schema defaults into the instance.
+        # - use_formats=False: jsonschema validator is created without format_checker, so formats are not checked.
+        self.__compiled = fastjsonschema.compile(schema_body, use_default=False, use_formats=False,
+                                                 detailed_exceptions=False)
+        self.__validator = validator
+
+    def validate(self, instance):
+        try:
+            self.__compiled(instance)
+        except fastjsonschema.JsonSchemaException:
+            # raises jsonschema.exceptions.ValidationError
+            self.__validator.validate(instance)
+
+
 def _get_schema_validator(schema_name: str):
     schema_body = __JSON_SCHEMAS.get(schema_name)
     if not schema_body:
@@ -28,4 +57,11 @@ def __load_json_schema(schema_name: str):
             jsonschema.Draft7Validator.check_schema(schema_body)
         except jsonschema.exceptions.SchemaError as se:
             raise SuprsendInvalidSchema(se.message)
-        return jsonschema.Draft7Validator(schema_body)
+        validator = jsonschema.Draft7Validator(schema_body)
+        if _has_fastjsonschema:
+            try:
+                return _CompiledSchemaValidator(schema_body, validator)
+            except fastjsonschema.JsonSchemaDefinitionException:
+                # schema uses something the code-generator doesn't support, use jsonschema only.
+                pass
+        return validator
@@ -0,0 +1,165 @@
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from .constants import (
+    DEFAULT_RETRY_MAX_ATTEMPTS, DEFAULT_RETRY_BACKOFF_BASE_SECS, DEFAULT_RETRY_BACKOFF_MAX_SECS,
+    DEFAULT_RETRY_AFTER_MAX_SECS, DEFAULT_RETRY_BUDGET_RATIO, DEFAULT_RETRY_BUDGET_MIN_RETRIES,
+    RETRYABLE_STATUS_CODES,
+)
+from .exception import SuprsendConfigError
+
+# requests with these methods can be repeated without side effects
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+def has_idempotency_keys(*records) -> bool:
+    """
+    a POST of these records is safe to retry only if server can de-duplicate every one of them.
+    """
+    return bool(records) and all(isinstance(r, dict) and r.get("$idempotency_key") for r in records)
+
+
+def is_retryable_failure(code) -> bool:
+    """
+    whether a record which failed (in a bulk call) with this code may succeed if sent again: 429/5xx/timeouts
+    """
+    return code == 429 or (isinstance(code, int) and code >= 500)
+
+
+def is_retryable_failed_record(failed_record: Dict) -> bool:
+    """
+    whether a failed record (of BulkResponse.failed_records) may succeed if sent again. Records which failed
+    validation (never sent) are not, whatever their code.
+    """
+    if failed_record.get("error_type") == "invalid_record" or failed_record.get("record") is None:
+        return False
+    return is_retryable_failure(failed_record.get("code"))
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of calls: each call deposits `ratio` token, each retry withdraws one.
+    During an outage (every call failing) retries stop once the budget is spent, instead of multiplying the load.
+    """
+    def __init__(self, ratio: float = DEFAULT_RETRY_BUDGET_RATIO, min_retries: int = DEFAULT_RETRY_BUDGET_MIN_RETRIES):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.__max_tokens = min_retries + max(ratio, 0) * 1000
+        self.__tokens = float(min_retries)
+        self.__lock = threading.Lock()
+
+    def deposit(self):
+        with self.__lock:
+            self.__tokens = min(self.__max_tokens, self.__tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self.__lock:
+            if self.__tokens < 1:
+                return False
+            self.__tokens -= 1
+            return True
+
+    @property
+    def available(self) -> float:
+        return self.__tokens
+
+
+class RetryPolicy:
+    """
+    When and after how long a failed api call is attempted again. Used by the http transport.
+
+    - max_attempts: total attempts per call (1: no retry)
+    - backoff_base/backoff_max: exponential backoff (seconds) before n-th retry: min(max, base * 2^(n-1))
+    - jitter: sleep a random duration between 0 and backoff ("full jitter"), so that clients failing together
+      don't retry together
+    - retry_after_max: Retry-After (of 429/503) is honoured if it is at most these many seconds, else the response
+      is returned without retrying
+    - status_codes: response status codes to retry on. Connection errors and timeouts are always retried.
+    - budget: RetryBudget shared by all calls of the client
+
+    Only idempotent calls (GET/PUT/DELETE) and POST/PATCH calls whose every record carries $idempotency_key are
+    retried, others could get processed twice. Request is signed again (fresh Date header) before every retry.
+    """
+    def __init__(self, max_attempts: int = DEFAULT_RETRY_MAX_ATTEMPTS,
+                 backoff_base: float = DEFAULT_RETRY_BACKOFF_BASE_SECS,
+                 backoff_max: float = DEFAULT_RETRY_BACKOFF_MAX_SECS, jitter: bool = True,
+                 retry_after_max: float = DEFAULT_RETRY_AFTER_MAX_SECS, status_codes=RETRYABLE_STATUS_CODES,
+                 budget: RetryBudget = None):
+        if not isinstance(max_attempts, int) or max_attempts < 1:
+            raise SuprsendConfigError("max_attempts must be an integer >= 1")
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_after_max = retry_after_max
+        self.status_codes = frozenset(status_codes)
+        self.budget = budget if budget is not None else RetryBudget()
+
+    def __deepcopy__(self, memo):
+        return self
+
+    @classmethod
+    def no_retry(cls) -> "RetryPolicy":
+        return cls(max_attempts=1)
+
+    def is_retryable_call(self, method: str, idempotent: Optional[bool]) -> bool:
+        """
+        :param idempotent: None: decided by http method
+        """
+        if self.max_attempts <= 1:
+            return False
+        if idempotent is None:
+            return method.upper() in IDEMPOTENT_METHODS
+        return idempotent
+
+    def on_call(self):
+        self.budget.deposit()
+
+    def backoff(self, attempt: int) -> float:
+        """
+        :param attempt: number of the attempt that just failed (1 for the first call)
+        """
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def __parse_retry_after(self, value: str) -> Optional[float]:
+        value = value.strip()
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    def delay_for_response(self, status_code: int, headers: Dict, attempt: int) -> Optional[float]:
+        """
+        returns seconds to wait before retrying a call which got this response, None if it must not be retried.
+        """
+        if status_code not in self.status_codes or attempt >= self.max_attempts:
+            return None
+        retry_after = headers.get("Retry-After") if headers is not None else None
+        if retry_after:
+            delay = self.__parse_retry_after(retry_after)
+            if delay is not None:
+                return delay if delay <= self.retry_after_max else None
+        return self.backoff(attempt)
+
+    def delay_for_error(self, attempt: int) -> Optional[float]:
+        """
+        returns seconds to wait before retrying a call which failed with a connection error/timeout.
+        """
+        if attempt >= self.max_attempts:
+            return None
+        return self.backoff(attempt)
+
+    def acquire_retry(self) -> bool:
+        return self.budget.try_withdraw()
+
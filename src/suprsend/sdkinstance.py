@@ -1,24 +1,42 @@
+import hashlib
 import json
 import platform
 from datetime import datetime, timezone
 
-from typing import List, Dict, Optional, Tuple, TypedDict
+from typing import List, Dict, Optional, Tuple, TypedDict, Union
+from urllib.parse import urlparse
 from warnings import warn
 import logging
 
 from .version import __version__
-from .constants import DEFAULT_URL, HEADER_DATE_FMT
+from .constants import (
+    DEFAULT_URL, HEADER_DATE_FMT,
+    DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE, DEFAULT_POOL_IDLE_TIMEOUT_SECS,
+)
 from .exception import SuprsendConfigError, InputValueError
 from .attachment import get_attachment_json
 from .workflow import Workflow, _WorkflowTrigger
 from .workflow_api import WorkflowsApi
 from .logger import set_logging
+from .transport import HttpTransport, request_timeout
+from .retry import RetryPolicy
+from .rate_limiter import RateLimiter
+from .circuit_breaker import CircuitBreaker
+from .compression import BodyCompression
+from .spool import Spool, SpooledRecords, SPOOL_KIND_EVENT, SPOOL_KIND_WORKFLOW_TRIGGER
+from .bulk_response import BulkResponse
+from .utils import iter_chunks, trigger_chunks
+from .events_bulk import _BulkEventsChunk
+from .workflow_trigger_bulk import _BulkWorkflowTriggerChunk
+from .signature import get_request_signature_for_md5
+from .json_codec import JsonCodec, get_json_codec
 from .workflows_bulk import BulkWorkflowsFactory
 from .events_bulk import BulkEventsFactory
 from .subscribers_bulk import BulkSubscribersFactory
 from .subscriber import SubscriberFactory
 from .subscriber_list import SubscriberListsApi
 from .event import Event, EventCollector
+from .background_events import BackgroundEventCollector
 from .tenant import TenantsApi
 from .brand import BrandsApi
 from .objects_api import ObjectsApi
@@ -87,30 +105,178 @@ class UserAgentBuilder(TypedDict):
         return user_agent, cua
 
 
-class Suprsend:
+class _SuprsendConfig:
     """
-    - Basic instance
-     supr_client = Suprsend("__workspace_key__", "__workspace_secret__")
-    - Instance with debug on
-     supr_client = Suprsend("__workspace_key__", "__workspace_secret__", debug=True)
-    - Instance with custom base-url
-     supr_client = Suprsend("__workspace_key__", "__workspace_secret__", base_url="https://example.com/", debug=False)
+    Workspace credentials, base-url and request headers. Shared by Suprsend and AsyncSuprsend.
     """
-    def __init__(self, workspace_key: str, workspace_secret: str, base_url: str = None, debug: bool = False, app_info: AppInfo = None, **kwargs):
+    def __init__(self, workspace_key: str, workspace_secret: str, base_url: str = None, debug: bool = False,
+                 app_info: AppInfo = None, json_codec: Union[str, JsonCodec] = None,
+                 bulk_compression: BodyCompression = None, spool: Spool = None):
         self.workspace_key = workspace_key
         self.workspace_secret = workspace_secret
         #
         self.user_agent, self.client_user_agent = UserAgentBuilder.build_user_agent(app_info)
         #
         self.base_url = self.__get_base_url(base_url)
+        # --- json encoder/decoder for request/response bodies
+        self.json_codec = get_json_codec(json_codec)
+        # --- compression of bulk api bodies. None: sent uncompressed
+        self.bulk_compression = bulk_compression
+        # --- write-ahead log of records of bulk calls till they are delivered. None: disabled
+        self.spool = spool
         # ---
         self.__validate()
         # --- set logging level for http request
         self.req_log_level = logging.DEBUG if debug else logging.WARN
         set_logging(level=self.req_log_level, http_debug= debug)
+
+    def __deepcopy__(self, memo):
+        # client instance (and its connection pool) is shared by the objects referring to it
+        # e.g. UserEdit/Subscriber deep-copied on bulk append. Never copy it.
+        return self
+
+    def default_headers(self) -> Dict:
+        return {
+            "Content-Type": "application/json; charset=utf-8",
+            "User-Agent": self.user_agent,
+            "X-Suprsend-Client-User-Agent": self.client_user_agent,
+            "Date": datetime.now(timezone.utc).strftime(HEADER_DATE_FMT),
+        }
+
+    @staticmethod
+    def request_timeout(timeout):
+        """
+        overrides timeout of api calls made within the with-block (current thread/asyncio-task only)
+         with supr_client.request_timeout((2, 5)):
+            supr_client.workflows.trigger(...)
+        :param timeout: seconds, or (connect-timeout, read-timeout) tuple
+        """
+        return request_timeout(timeout)
+
+    def _rate_limiter(self, rate_limits: Dict):
+        return RateLimiter(rate_limits, self.base_url) if rate_limits else None
+
+    def _bind_circuit_breaker(self, circuit_breaker: CircuitBreaker):
+        if circuit_breaker is not None:
+            circuit_breaker.base_path = urlparse(self.base_url).path
+        return circuit_breaker
+
+    def _encode_bulk_body(self, data: bytes, content_md5: str, headers: Dict):
+        """
+        compresses body of a bulk api call (if enabled), before it is signed.
+        :return: (body to send, md5 of body to send)
+        """
+        if self.bulk_compression is None:
+            return data, content_md5
+        return self.bulk_compression.encode_body(data, content_md5, headers)
+
+    def _spooled_records(self, kind: str) -> Optional[SpooledRecords]:
+        return SpooledRecords(self.spool, kind, self.json_codec) if self.spool is not None else None
+
+    def _spool_replay_rounds(self, round_size: int = 1000):
+        """
+        claims records waiting in spool (appended by a process which died, or failed with a retryable error)
+        round_size at a time, yields (chunks, spooled-records) of each round. A record is claimed at most once
+        per replay, so records failing again are left for next replay.
+        """
+        chunk_classes = ((SPOOL_KIND_EVENT, _BulkEventsChunk), (SPOOL_KIND_WORKFLOW_TRIGGER, _BulkWorkflowTriggerChunk))
+        for kind, chunk_cls in chunk_classes:
+            after_seq = 0
+            while True:
+                claimed = self.spool.claim_pending(kind, limit=round_size, after_seq=after_seq)
+                if not claimed:
+                    break
+                after_seq = claimed[-1][0]
+                spooled = self._spooled_records(kind)
+                records = []
+                for seq, _, content in claimed:
+                    record = self.json_codec.loads(content)
+                    spooled.adopt(record, seq)
+                    records.append((record, len(content), content))
+                yield list(iter_chunks(records, lambda: chunk_cls(self))), spooled
+
+    def _resign_request(self, http_verb: str, url: str, data: bytes, headers: Dict):
+        """
+        refreshes Date header and signs the already encoded request again. Called by transport before a retry.
+        """
+        headers["Date"] = datetime.now(timezone.utc).strftime(HEADER_DATE_FMT)
+        content_md5 = hashlib.md5(data).hexdigest() if data else ""
+        sig = get_request_signature_for_md5(url, http_verb, content_md5, headers, self.workspace_secret)
+        headers["Authorization"] = "{}:{}".format(self.workspace_key, sig)
+
+    @staticmethod
+    def __get_base_url(base_url):
+        # ---- strip
+        if base_url:
+            base_url = base_url.strip()
+        # ---- if url not passed, set url based on server env
+        if not base_url:
+            base_url = DEFAULT_URL
+        # ---- check url ends with /
+        base_url = base_url.strip()
+        if base_url[len(base_url) - 1] != "/":
+            base_url = base_url + "/"
+        return base_url
+
+    def __validate(self):
+        if not self.workspace_key:
+            raise SuprsendConfigError("Missing workspace_key")
+        if not self.workspace_secret:
+            raise SuprsendConfigError("Missing workspace_secret")
+        if not self.base_url:
+            raise SuprsendConfigError("Missing base_url")
+
+
+class Suprsend(_SuprsendConfig):
+    """
+    - Basic instance
+     supr_client = Suprsend("__workspace_key__", "__workspace_secret__")
+    - Instance with debug on
+     supr_client = Suprsend("__workspace_key__", "__workspace_secret__", debug=True)
+    - Instance with custom base-url
+     supr_client = Suprsend("__workspace_key__", "__workspace_secret__", base_url="https://example.com/", debug=False)
+    - Instance with custom http connection-pool (keep-alive) settings
+     supr_client = Suprsend("__workspace_key__", "__workspace_secret__", pool_connections=4, pool_maxsize=50,
+                            pool_idle_timeout=30)
+    - Instance with explicit json backend ("json"/"orjson"/"ujson"). By default orjson is used if installed.
+     supr_client = Suprsend("__workspace_key__", "__workspace_secret__", json_codec="json")
+    - Instance with custom retry policy (by default, idempotent calls are attempted 3 times on 429/5xx/connection errors)
+     supr_client = Suprsend("__workspace_key__", "__workspace_secret__", retry_policy=RetryPolicy(max_attempts=5))
+     supr_client = Suprsend("__workspace_key__", "__workspace_secret__", retry_policy=RetryPolicy.no_retry())
+    - Instance with client-side rate limits (calls per second, or (calls per second, burst)) per endpoint family
+     supr_client = Suprsend("__workspace_key__", "__workspace_secret__",
+                            rate_limits={"trigger/": 50, "v2/bulk/event/": (5, 10), "*": 100})
+    - Instance with circuit breaker: calls to an endpoint fail fast (for 30s) after it fails 5 times in a row
+     supr_client = Suprsend("__workspace_key__", "__workspace_secret__",
+                            circuit_breaker=CircuitBreaker(failure_threshold=5, recovery_timeout=30))
+     supr_client.transport.circuit_breaker.state()  # per endpoint state, for health checks
+    - Instance with custom timeouts: seconds, or (connect-timeout, read-timeout). bulk_timeout applies to bulk calls
+     supr_client = Suprsend("__workspace_key__", "__workspace_secret__", timeout=(3, 10), bulk_timeout=(3, 60))
+    - Instance with compressed (gzip) bodies of bulk api calls
+     supr_client = Suprsend("__workspace_key__", "__workspace_secret__",
+                            bulk_compression=BodyCompression("gzip", level=6, min_size=1024))
+    - Instance with spool: records of bulk calls (and background events) are kept on disk till delivered
+     supr_client = Suprsend("__workspace_key__", "__workspace_secret__", spool=Spool("/var/lib/app/suprsend"))
+     supr_client.replay_spool()  # e.g. on startup, sends records left undelivered by previous run
+    """
+    def __init__(self, workspace_key: str, workspace_secret: str, base_url: str = None, debug: bool = False, app_info: AppInfo = None,
+                 pool_connections: int = DEFAULT_POOL_CONNECTIONS, pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 pool_idle_timeout: float = DEFAULT_POOL_IDLE_TIMEOUT_SECS, json_codec: Union[str, JsonCodec] = None,
+                 retry_policy: RetryPolicy = None, rate_limits: Dict = None,
+                 circuit_breaker: CircuitBreaker = None, timeout=None, bulk_timeout=None,
+                 bulk_compression: BodyCompression = None, spool: Spool = None, **kwargs):
+        super().__init__(workspace_key, workspace_secret, base_url=base_url, debug=debug, app_info=app_info,
+                         json_codec=json_codec, bulk_compression=bulk_compression, spool=spool)
+        # --- keep-alive connection pool shared by all api calls made using this instance
+        self.transport = HttpTransport(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                       pool_idle_timeout=pool_idle_timeout, retry_policy=retry_policy,
+                                       signer=self._resign_request, rate_limiter=self._rate_limiter(rate_limits),
+                                       circuit_breaker=self._bind_circuit_breaker(circuit_breaker),
+                                       timeout=timeout, bulk_timeout=bulk_timeout)
         #
         self._workflow_trigger = _WorkflowTrigger(self)
         self._eventcollector = EventCollector(self)
+        self._background_events = None
         # -- bulk instances
         self._bulk_workflows = BulkWorkflowsFactory(self)
         self._bulk_events = BulkEventsFactory(self)
@@ -127,6 +293,48 @@ class Suprsend:
         # --
         self.subscriber_lists = SubscriberListsApi(self)
 
+    def close(self):
+        """
+        Close all pooled http connections. The instance remains usable, a new pool is created on next api call.
+        """
+        self.transport.close()
+
+    def start_background_events(self, **kwargs) -> BackgroundEventCollector:
+        """
+        From now on, track_event queues the event and returns immediately, events are sent in batches
+        (v2/bulk/event/) from a background thread. Call flush() on returned collector to send queued events,
+        shutdown() to go back to sending events inline.
+         collector = supr_client.start_background_events(flush_at=100, flush_interval=5, on_queue_full="drop")
+        :param kwargs: options of BackgroundEventCollector
+        """
+        if self._background_events is not None:
+            raise SuprsendConfigError("background events already started")
+        self._background_events = BackgroundEventCollector(self, **kwargs).start()
+        return self._background_events
+
+    def replay_spool(self, max_concurrency: int = 1) -> BulkResponse:
+        """
+        sends records waiting in spool. Delivered (or rejected by server with non-retryable error) records are
+        removed from spool, the ones failing with a retryable error (429/5xx/timeout) are kept for next replay.
+        """
+        if self.spool is None:
+            raise SuprsendConfigError("spool is not configured")
+        response = BulkResponse()
+        for chunks, spooled in self._spool_replay_rounds():
+            trigger_chunks(chunks, max_concurrency)
+            round_failed = []
+            for ch in chunks:
+                response.merge_chunk_response(ch.response)
+                round_failed.extend(ch.response["failed_records"])
+            spooled.settle(round_failed)
+        if response.status is None:
+            response.merge_chunk_response(BulkResponse.empty_chunk_success_response())
+        return response
+
+    @property
+    def background_events(self) -> Optional[BackgroundEventCollector]:
+        return self._background_events
+
     @property
     def bulk_workflows(self):
         return self._bulk_workflows
@@ -143,36 +351,6 @@ class Suprsend:
     def user(self):
         return self._user
 
-    def default_headers(self) -> Dict:
-        return {
-            "Content-Type": "application/json; charset=utf-8",
-            "User-Agent": self.user_agent,
-            "X-Suprsend-Client-User-Agent": self.client_user_agent,
-            "Date": datetime.now(timezone.utc).strftime(HEADER_DATE_FMT),
-        }
-
-    @staticmethod
-    def __get_base_url(base_url):
-        # ---- strip
-        if base_url:
-            base_url = base_url.strip()
-        # ---- if url not passed, set url based on server env
-        if not base_url:
-            base_url = DEFAULT_URL
-        # ---- check url ends with /
-        base_url = base_url.strip()
-        if base_url[len(base_url) - 1] != "/":
-            base_url = base_url + "/"
-        return base_url
-
-    def __validate(self):
-        if not self.workspace_key:
-            raise SuprsendConfigError("Missing workspace_key")
-        if not self.workspace_secret:
-            raise SuprsendConfigError("Missing workspace_secret")
-        if not self.base_url:
-            raise SuprsendConfigError("Missing base_url")
-
     def add_attachment(self, body: Dict, file_path: str, file_name: str = None, ignore_if_error: bool = False) -> Dict:
         warn('This method is deprecated. Use "WorkflowTriggerRequest.add_attachment()" instead',
              DeprecationWarning, stacklevel=2)
@@ -246,10 +424,14 @@ class Suprsend:
             "status_code": resp.status_code,
             "message": resp.text,
         }
+        if background events are started, status is "queued" and message is $insert_id of the event.
         :except:
             - SuprsendValidationError (if post-data is invalid.)
             - ValueError
         """
         if not isinstance(event, Event):
             raise InputValueError("argument must be an instance of suprsend.Event")
+        background_events = self._background_events
+        if background_events is not None:
+            return background_events.collect(event)
         return self._eventcollector.collect(event)
@@ -1,21 +1,63 @@
 import hashlib
 import hmac
 import base64
-import json
-from typing import Dict, Tuple
+import io
+from typing import Dict, Iterable, Tuple
 from urllib.parse import urlparse
 
+from .json_codec import JsonCodec, default_json_codec
 
-def get_request_signature(url: str, http_verb: str, content, headers: Dict, secret: str) -> Tuple[str, str]:
+
+def json_encode(content, json_codec: JsonCodec = None, default=None) -> bytes:
+    return (json_codec or default_json_codec).dumps(content, default)
+
+
+def join_json_array(encoded_items: Iterable[bytes], json_codec: JsonCodec = None) -> Tuple[bytes, str]:
+    """
+    assembles a json-array out of already json-encoded items (same bytes as json_encode(list_of_items))
+    and computes md5 of it incrementally. Items are written to a single buffer as they come, so only
+    the array (and not a list of items along with it) is held in memory.
+    :return: array-bytes, md5-hexdigest
+    """
+    item_separator = (json_codec or default_json_codec).item_separator
+    md5 = hashlib.md5()
+    out = io.BytesIO()
+    sep = b"["
+    for item in encoded_items:
+        md5.update(sep)
+        md5.update(item)
+        out.write(sep)
+        out.write(item)
+        sep = item_separator
+    if sep == b"[":
+        md5.update(sep)
+        out.write(sep)
+    md5.update(b"]")
+    out.write(b"]")
+    # buffer is handed over without copying it
+    return out.getvalue(), md5.hexdigest()
+
+
+def get_request_signature(url: str, http_verb: str, content, headers: Dict, secret: str,
+                          json_codec: JsonCodec = None) -> Tuple[str, str]:
     if http_verb == "GET":  # POST/GET/PUT
         content_txt, content_md5 = "", ""
     else:
         if content == "":
             content_txt, content_md5 = "", ""
         else:
-            content_txt = json.dumps(content, ensure_ascii=False)
-            content_md5 = hashlib.md5(content_txt.encode()).hexdigest()
+            content_bytes = json_encode(content, json_codec)
+            content_txt = content_bytes.decode('utf-8')
+            content_md5 = hashlib.md5(content_bytes).hexdigest()
     # ----
+    sig = get_request_signature_for_md5(url, http_verb, content_md5, headers, secret)
+    return content_txt, sig
+
+
+def get_request_signature_for_md5(url: str, http_verb: str, content_md5: str, headers: Dict, secret: str) -> str:
+    """
+    signature for a request whose body is already encoded, content_md5: md5 hexdigest of body ("" if no body)
+    """
     request_uri = get_uri(url)
     # ----- Create string to sign
     string_to_sign = "{}\n{}\n{}\n{}\n{}".format(
@@ -30,7 +72,7 @@ def get_request_signature(url: str, http_verb: str, content, headers: Dict, secr
     sig_hexdigest = hmac.HMAC(secret.encode(), msg=string_to_sign.encode(), digestmod=hashlib.sha256).digest()
     # -----
     sig = base64.b64encode(sig_hexdigest).decode()  # decode('utf-8'/'ascii')
-    return content_txt, sig
+    return sig
 
 
 def get_uri(url: str) -> str:
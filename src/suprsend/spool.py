@@ -0,0 +1,412 @@
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+from .constants import (
+    DEFAULT_SPOOL_SEGMENT_MAX_SIZE_IN_BYTES, DEFAULT_SPOOL_FSYNC_INTERVAL_SECS,
+    DEFAULT_SPOOL_COMPACT_MIN_SIZE_IN_BYTES,
+)
+from .exception import SuprsendConfigError
+from .logger import ss_logger
+from .retry import is_retryable_failed_record
+from .utils import record_content
+
+FSYNC_ALWAYS = "always"
+FSYNC_INTERVAL = "interval"
+FSYNC_NEVER = "never"
+
+SPOOL_KIND_EVENT = "event"
+SPOOL_KIND_WORKFLOW_TRIGGER = "workflow_trigger"
+
+_SEGMENT_NAME_FMT = "segment-{:010d}.log"
+_SEGMENT_NAME_RE = re.compile(r"^segment-(\d{10})\.log$")
+# spool without live records is compacted (i.e. its segments are deleted) once acks take this much space
+_EMPTY_SPOOL_COMPACT_SIZE_IN_BYTES = 1024 * 1024
+
+
+def _crc(data: bytes) -> bytes:
+    return b"%08x" % zlib.crc32(data)
+
+
+def _fsync_dir(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # e.g. windows, directories can't be opened
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Spool:
+    """
+    Write-ahead log of records (json-encoded events/workflow-triggers) which are not delivered yet.
+    Records are appended to segment files in directory, and acknowledged (ack) once delivered (or rejected by
+    server with a non-retryable error). Records not acknowledged by a process which died, or which failed
+    with a retryable error (429/5xx/timeout), are sent again by replay.
+    - fsync: "always" (fsync on every write, nothing is lost even on os crash), "interval" (fsync at most once in
+      fsync_interval seconds) or "never" (left to os). Process crash doesn't lose records with any of these.
+    - segment_max_size: active segment is closed and a new one started once it crosses this size.
+    - compact_min_size: acknowledged records are compacted away once they take more than this many bytes and
+      more than live records. Oldest segments having only acknowledged records are deleted right away.
+    Line format: put - "P <seq> <kind> <crc32-of-content> <content>\\n", ack - "A <crc32-of-seqs> <seq,seq,..>\\n".
+    Lines failing crc check (torn write on crash) are skipped while loading.
+    """
+    def __init__(self, directory: str, fsync: str = FSYNC_INTERVAL,
+                 fsync_interval: float = DEFAULT_SPOOL_FSYNC_INTERVAL_SECS,
+                 segment_max_size: int = DEFAULT_SPOOL_SEGMENT_MAX_SIZE_IN_BYTES,
+                 compact_min_size: int = DEFAULT_SPOOL_COMPACT_MIN_SIZE_IN_BYTES):
+        if fsync not in (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER):
+            raise SuprsendConfigError("fsync must be one of always, interval, never")
+        self.directory = os.path.abspath(directory)
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.segment_max_size = segment_max_size
+        self.compact_min_size = compact_min_size
+        #
+        self.__lock = threading.RLock()
+        # seq -> (segment_no, offset of content, length of content, kind, line size)
+        self.__records = {}
+        # segment_no -> number of live records in it
+        self.__segment_live = {}
+        self.__segment_size = {}
+        self.__claimed = set()
+        self.__live_size = 0
+        self.__next_seq = 1
+        self.__active_no = 0
+        self.__active = None
+        self.__last_fsync = 0.0
+        #
+        os.makedirs(self.directory, exist_ok=True)
+        self.__load()
+        self.__open_new_segment()
+        self.__drop_dead_segments()
+
+    # ---------- public api
+
+    def append(self, kind: str, contents: Iterable[bytes]) -> List[int]:
+        """
+        writes records (in one write) and returns their seqs. Records are claimed by caller i.e. not replayed
+        (by this process) till they are released.
+        """
+        seqs, lines = [], []
+        with self.__lock:
+            offset = self.__active.tell()
+            for content in contents:
+                seq = self.__next_seq
+                self.__next_seq += 1
+                prefix = b"P %d %s %s " % (seq, kind.encode(), _crc(content))
+                line_size = len(prefix) + len(content) + 1
+                self.__records[seq] = (self.__active_no, offset + len(prefix), len(content), kind, line_size)
+                offset += line_size
+                self.__live_size += line_size
+                self.__segment_live[self.__active_no] += 1
+                self.__claimed.add(seq)
+                lines.extend((prefix, content, b"\n"))
+                seqs.append(seq)
+            if seqs:
+                self.__write(b"".join(lines))
+        return seqs
+
+    def ack(self, seqs: Iterable[int]):
+        """
+        marks records as delivered, they are never replayed.
+        """
+        with self.__lock:
+            acked = []
+            for seq in seqs:
+                rec = self.__records.pop(seq, None)
+                if rec is None:
+                    continue
+                self.__claimed.discard(seq)
+                self.__live_size -= rec[4]
+                self.__segment_live[rec[0]] -= 1
+                acked.append(b"%d" % seq)
+            if not acked:
+                return
+            seqs_bytes = b",".join(acked)
+            self.__write(b"A %s %s\n" % (_crc(seqs_bytes), seqs_bytes))
+            self.__drop_dead_segments()
+            compact_min_size = self.compact_min_size if self.__records else _EMPTY_SPOOL_COMPACT_SIZE_IN_BYTES
+            if self.__dead_size() > max(compact_min_size, self.__live_size):
+                self.compact()
+
+    def claim(self, seqs: Iterable[int]) -> List[int]:
+        """
+        claims records (released earlier) back e.g. to send them again.
+        :return: seqs claimed. Records already acknowledged or claimed by someone else (replay) are left out
+        """
+        with self.__lock:
+            claimed = [seq for seq in seqs if seq in self.__records and seq not in self.__claimed]
+            self.__claimed.update(claimed)
+            return claimed
+
+    def release(self, seqs: Iterable[int]):
+        """
+        gives up claim on records (e.g. failed with a retryable error), so that replay sends them.
+        """
+        with self.__lock:
+            self.__claimed.difference_update(seqs)
+
+    def claim_pending(self, kind: str = None, limit: int = None, after_seq: int = 0) -> List[Tuple[int, str, bytes]]:
+        """
+        claims unclaimed records (of kind, if passed) for replay.
+        :param after_seq: only records appended after this one
+        :return: [(seq, kind, content), ...] in the order they were appended
+        """
+        with self.__lock:
+            claimed = []
+            for seq, (seg_no, offset, length, rec_kind, _) in self.__records.items():
+                if seq <= after_seq or seq in self.__claimed or (kind is not None and rec_kind != kind):
+                    continue
+                claimed.append((seq, rec_kind, self.__read(seg_no, offset, length)))
+                self.__claimed.add(seq)
+                if limit is not None and len(claimed) >= limit:
+                    break
+            return claimed
+
+    def compact(self):
+        """
+        rewrites live records in a new segment and deletes all older segments.
+        """
+        with self.__lock:
+            old_segments = sorted(self.__segment_size)
+            self.__close_active()
+            compacted_no = self.__active_no + 1
+            tmp_path = self.__segment_path(compacted_no) + ".tmp"
+            records, size = {}, 0
+            with open(tmp_path, "wb") as f:
+                for seq, (seg_no, offset, length, kind, _) in self.__records.items():
+                    content = self.__read(seg_no, offset, length)
+                    prefix = b"P %d %s %s " % (seq, kind.encode(), _crc(content))
+                    f.write(prefix + content + b"\n")
+                    records[seq] = (compacted_no, size + len(prefix), length, kind, len(prefix) + length + 1)
+                    size += len(prefix) + length + 1
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.__segment_path(compacted_no))
+            _fsync_dir(self.directory)
+            for seg_no in old_segments:
+                os.remove(self.__segment_path(seg_no))
+            _fsync_dir(self.directory)
+            # ---
+            self.__records = records
+            self.__segment_live = {compacted_no: len(records)}
+            self.__segment_size = {compacted_no: size}
+            self.__live_size = size
+            self.__active_no = compacted_no
+            self.__open_new_segment()
+
+    def pending_count(self) -> int:
+        with self.__lock:
+            return len(self.__records)
+
+    def stats(self) -> Dict:
+        with self.__lock:
+            return {
+                "pending": len(self.__records),
+                "claimed": len(self.__claimed),
+                "segments": len(self.__segment_size),
+                "live_size_in_bytes": self.__live_size,
+                "size_in_bytes": sum(self.__segment_size.values()),
+            }
+
+    def flush(self):
+        """
+        fsyncs active segment.
+        """
+        with self.__lock:
+            if self.__active is not None:
+                self.__active.flush()
+                os.fsync(self.__active.fileno())
+                self.__last_fsync = time.monotonic()
+
+    def close(self):
+        with self.__lock:
+            self.__close_active()
+
+    # ---------- internals
+
+    def __segment_path(self, seg_no: int) -> str:
+        return os.path.join(self.directory, _SEGMENT_NAME_FMT.format(seg_no))
+
+    def __write(self, data: bytes):
+        self.__active.write(data)
+        # written to os, so that a process crash doesn't lose it
+        self.__active.flush()
+        self.__segment_size[self.__active_no] += len(data)
+        if self.fsync == FSYNC_ALWAYS or \
+                (self.fsync == FSYNC_INTERVAL and time.monotonic() - self.__last_fsync >= self.fsync_interval):
+            os.fsync(self.__active.fileno())
+            self.__last_fsync = time.monotonic()
+        if self.__segment_size[self.__active_no] >= self.segment_max_size:
+            self.__close_active()
+            self.__open_new_segment()
+
+    def __read(self, seg_no: int, offset: int, length: int) -> bytes:
+        if seg_no == self.__active_no and self.__active is not None:
+            self.__active.flush()
+        with open(self.__segment_path(seg_no), "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def __dead_size(self) -> int:
+        return sum(self.__segment_size.values()) - self.__live_size
+
+    def __drop_dead_segments(self):
+        # oldest segment without live records can go: acks in it are for records of itself or of older
+        # segments (which are gone already). A newer one can't, its acks may be for records of older segments.
+        for seg_no in sorted(self.__segment_size):
+            if seg_no == self.__active_no or self.__segment_live[seg_no] > 0:
+                break
+            os.remove(self.__segment_path(seg_no))
+            del self.__segment_size[seg_no]
+            del self.__segment_live[seg_no]
+
+    def __close_active(self):
+        if self.__active is not None:
+            self.__active.flush()
+            if self.fsync != FSYNC_NEVER:
+                os.fsync(self.__active.fileno())
+            self.__active.close()
+            self.__active = None
+
+    def __open_new_segment(self):
+        self.__active_no += 1
+        self.__active = open(self.__segment_path(self.__active_no), "ab")
+        self.__segment_size[self.__active_no] = 0
+        self.__segment_live[self.__active_no] = 0
+        _fsync_dir(self.directory)
+
+    def __load(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            m = _SEGMENT_NAME_RE.match(name)
+            if m:
+                segments.append(int(m.group(1)))
+            elif name.endswith(".log.tmp"):
+                # incomplete compaction, its source segments are still there
+                os.remove(os.path.join(self.directory, name))
+        for seg_no in sorted(segments):
+            self.__segment_size[seg_no] = 0
+            self.__segment_live.setdefault(seg_no, 0)
+            with open(self.__segment_path(seg_no), "rb") as f:
+                offset = 0
+                for line in f:
+                    self.__segment_size[seg_no] += len(line)
+                    self.__load_line(seg_no, offset, line)
+                    offset += len(line)
+            self.__active_no = seg_no
+        # records are claimed only by a live process
+        self.__live_size = sum(rec[4] for rec in self.__records.values())
+
+    def __load_line(self, seg_no: int, offset: int, line: bytes):
+        if not line.endswith(b"\n"):
+            ss_logger.warning("spool: skipping incomplete record in %s", self.__segment_path(seg_no))
+            return
+        try:
+            if line.startswith(b"P "):
+                _, seq, kind, crc, content = line[:-1].split(b" ", 4)
+                if _crc(content) != crc:
+                    raise ValueError("crc mismatch")
+                seq = int(seq)
+                if seq in self.__records:
+                    # copied by a compaction which couldn't delete source segment
+                    old = self.__records[seq]
+                    self.__segment_live[old[0]] -= 1
+                self.__records[seq] = (seg_no, offset + len(line) - 1 - len(content), len(content),
+                                       kind.decode(), len(line))
+                self.__segment_live[seg_no] += 1
+                self.__next_seq = max(self.__next_seq, seq + 1)
+            elif line.startswith(b"A "):
+                _, crc, seqs = line[:-1].split(b" ", 2)
+                if _crc(seqs) != crc:
+                    raise ValueError("crc mismatch")
+                for seq in seqs.split(b","):
+                    rec = self.__records.pop(int(seq), None)
+                    if rec is not None:
+                        self.__segment_live[rec[0]] -= 1
+            else:
+                raise ValueError("unknown record type")
+        except ValueError as ex:
+            ss_logger.warning("spool: skipping corrupt record in %s: %s", self.__segment_path(seg_no), ex)
+
+
+class SpooledRecords:
+    """
+    records of one bulk call (or background batch) written to spool. settle() acknowledges the delivered
+    (and non-retryably rejected) ones, and releases the ones which failed with a retryable error for replay.
+    Released records can be claimed back by reclaim() to retry them.
+    """
+    def __init__(self, spool: Spool, kind: str, json_codec):
+        self.spool = spool
+        self.kind = kind
+        self.json_codec = json_codec
+        # id(record-dict) -> seq
+        self.__seqs = {}
+        # records released by settle
+        self.__released = {}
+
+    def add(self, records: List[Tuple]) -> List[Tuple]:
+        """
+        :param records: [(record-dict, size, content), ...] (content as returned by *_size_and_content)
+        :return: records with content as written to spool. Lazy attachments are read here (only), send this content.
+        """
+        rendered = [(rec, size, record_content(rec, content, self.json_codec)) for rec, size, content in records]
+        for (rec, _, _), seq in zip(rendered, self.spool.append(self.kind, [content for _, _, content in rendered])):
+            self.__seqs[id(rec)] = seq
+        return rendered
+
+    def adopt(self, record: Dict, seq: int):
+        self.__seqs[id(record)] = seq
+
+    def settle(self, failed_records: List[Dict], records: List[Dict] = None):
+        """
+        acknowledges sent records, except the ones which failed with a retryable error: those are released.
+        :param records: records to settle e.g. of one chunk. None: all records (not settled yet) of this instance
+        """
+        retryable = {id(fr["record"]) for fr in failed_records if is_retryable_failed_record(fr)}
+        if records is None:
+            settled, self.__seqs = self.__seqs, {}
+        else:
+            settled = {id(rec): self.__seqs.pop(id(rec)) for rec in records if id(rec) in self.__seqs}
+        to_ack, to_release = [], []
+        for rec_id, seq in settled.items():
+            if rec_id in retryable:
+                to_release.append(seq)
+                self.__released[rec_id] = seq
+            else:
+                to_ack.append(seq)
+        self.spool.ack(to_ack)
+        self.spool.release(to_release)
+
+    def release_unsettled(self):
+        """
+        gives up claim on records not settled yet (e.g. never sent as the bulk call was aborted midway),
+        so that replay sends them.
+        """
+        self.spool.release(self.__seqs.values())
+        self.__seqs = {}
+
+    def reclaim(self, records: List[Dict]) -> List[Dict]:
+        """
+        claims released records back from spool, to send them again.
+        :return: records which can be sent i.e. leaving out the ones replay has claimed (or delivered) meanwhile
+        """
+        seqs = {id(rec): self.__released.pop(id(rec)) for rec in records if id(rec) in self.__released}
+        claimed = set(self.spool.claim(seqs.values()))
+        to_send = []
+        for rec in records:
+            seq = seqs.get(id(rec))
+            if seq is None:
+                # not written to spool
+                to_send.append(rec)
+            elif seq in claimed:
+                self.__seqs[id(rec)] = seq
+                to_send.append(rec)
+        return to_send
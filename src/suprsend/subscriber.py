@@ -1,4 +1,3 @@
-import requests
 import time
 from typing import Any, Dict, Iterable, Union
 import uuid
@@ -9,7 +8,7 @@ from .constants import (
 )
 from .exception import InputValueError
 from .signature import get_request_signature
-from .utils import (get_apparent_identity_event_size, )
+from .utils import (get_apparent_identity_event_size_and_content, )
 from .subscriber_helper import _SubscriberInternalHelper
 from .logger import ss_logger
 
@@ -72,12 +71,19 @@ class Subscriber:
         return event_dict
 
     def validate_event_size(self, event_dict: Dict):
-        apparent_size = get_apparent_identity_event_size(event_dict)
+        event_dict, apparent_size, _ = self.validate_event_size_encoded(event_dict)
+        return event_dict, apparent_size
+
+    def validate_event_size_encoded(self, event_dict: Dict):
+        """
+        same as validate_event_size, additionally returns json-encoded event (bytes) used for size calculation
+        """
+        apparent_size, content = get_apparent_identity_event_size_and_content(event_dict, self.config.json_codec)
         if apparent_size > IDENTITY_SINGLE_EVENT_MAX_APPARENT_SIZE_IN_BYTES:
             raise InputValueError(f"User Event size too big - {apparent_size} Bytes, "
                                   f"must not cross {IDENTITY_SINGLE_EVENT_MAX_APPARENT_SIZE_IN_BYTES_READABLE}")
         # ----
-        return event_dict, apparent_size
+        return event_dict, apparent_size, content
 
     def validate_body(self, is_part_of_bulk=False):
         self.__warnings_list = []
@@ -110,10 +116,10 @@ class Subscriber:
 
             # --- Signature and Authorization-header
             content_txt, sig = get_request_signature(self.__url, 'POST', event, headers,
-                                                     self.config.workspace_secret)
+                                                     self.config.workspace_secret, self.config.json_codec)
             headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
             # -----
-            resp = requests.post(self.__url,
+            resp = self.config.transport.post(self.__url,
                                  data=content_txt.encode('utf-8'),
                                  headers=headers)
         except Exception as ex:
@@ -1,4 +1,3 @@
-import requests
 import time
 from typing import List, Dict
 import uuid
@@ -9,7 +8,9 @@ from .constants import (
 )
 from .utils import (get_apparent_list_broadcast_body_size, validate_list_broadcast_body_schema, urlencode_query, urlencode_path_param)
 from .signature import get_request_signature
+from .retry import has_idempotency_keys
 from .attachment import get_attachment_json
+from .json_codec import JsonCodec
 from .logger import ss_logger
 
 
@@ -22,7 +23,12 @@ class SubscriberListBroadcast:
         self.tenant_id = tenant_id
         self.brand_id = brand_id
 
-    def add_attachment(self, file_path: str, file_name: str = None, ignore_if_error: bool = False):
+    def add_attachment(self, file_path: str, file_name: str = None, ignore_if_error: bool = False,
+                       lazy: bool = False):
+        """
+        :param lazy: for local file, add only a reference to it (LazyAttachment). File is read and encoded
+            when the request is sent, instead of now.
+        """
         if self.body.get("data") is None:
             self.body["data"] = {}
         # if body["data"] is not a dict, not raising error while adding attachment.
@@ -31,7 +37,7 @@ class SubscriberListBroadcast:
                                 "SubscriberListBroadcast: %s", str(self.as_json()))
             return
         # ---
-        attachment = get_attachment_json(file_path, file_name, ignore_if_error)
+        attachment = get_attachment_json(file_path, file_name, ignore_if_error, lazy=lazy)
         if not attachment:
             return
         # --- add the attachment to body->data->$attachments
@@ -40,7 +46,11 @@ class SubscriberListBroadcast:
         # -----
         self.body["data"]["$attachments"].append(attachment)
 
-    def get_final_json(self):
+    def get_final_json(self, json_codec: JsonCodec = None):
+        """
+        :param json_codec: codec the body is sent with. Size of lazy attachments is derived from file size,
+            file is read only when the body is sent.
+        """
         self.body["$insert_id"] = str(uuid.uuid4())
         self.body["$time"] = int(time.time() * 1000)
         if self.idempotency_key:
@@ -52,7 +62,7 @@ class SubscriberListBroadcast:
         # --
         self.body = validate_list_broadcast_body_schema(self.body)
         # ---- Check body size
-        apparent_size = get_apparent_list_broadcast_body_size(self.body)
+        apparent_size = get_apparent_list_broadcast_body_size(self.body, json_codec)
         if apparent_size > BODY_MAX_APPARENT_SIZE_IN_BYTES:
             raise InputValueError(f"SubscriberListBroadcast body too big - {apparent_size} Bytes, "
                                   f"must not cross {BODY_MAX_APPARENT_SIZE_IN_BYTES_READABLE}")
@@ -100,13 +110,14 @@ class SubscriberListsApi:
         url = "{}{}".format(self.subscriber_list_url, (f"?{encoded_options}" if encoded_options else ""))
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, 'POST', payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, 'POST', payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def cleaned_limit_offset(self, limit: int, offset: int):
         # limit must be 0 < x <= 1000
@@ -128,12 +139,12 @@ class SubscriberListsApi:
         content_txt, sig = get_request_signature(url, 'GET', None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
-    def __subscriber_list_detail_url(self, list_id: str):
+    def _subscriber_list_detail_url(self, list_id: str):
         list_id = str(list_id).strip()
         list_id_encoded = urlencode_path_param(list_id)
         url = f"{self.subscriber_list_url}{list_id_encoded}/"
@@ -143,17 +154,17 @@ class SubscriberListsApi:
         list_id = self._validate_list_id(list_id)
         # --------
         encoded_options = urlencode_query(options or {})
-        url = "{}{}".format(self.__subscriber_list_detail_url(list_id), (f"?{encoded_options}" if encoded_options else ""))
+        url = "{}{}".format(self._subscriber_list_detail_url(list_id), (f"?{encoded_options}" if encoded_options else ""))
         headers = self.config.default_headers()
         # ---
         # Signature and Authorization-header
         content_txt, sig = get_request_signature(url, 'GET', None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def add(self, list_id: str, distinct_ids: list, options: Dict = None):
         list_id = self._validate_list_id(list_id)
@@ -163,19 +174,20 @@ class SubscriberListsApi:
             return self.non_error_default_response
         # ---
         encoded_options = urlencode_query(options or {})
-        url = "{}subscriber/add/".format(self.__subscriber_list_detail_url(list_id))
+        url = "{}subscriber/add/".format(self._subscriber_list_detail_url(list_id))
         url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
         headers = self.config.default_headers()
         # ---
         payload = {"distinct_ids": distinct_ids}
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, 'POST', payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, 'POST', payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def remove(self, list_id: str, distinct_ids: list, options: Dict = None):
         list_id = self._validate_list_id(list_id)
@@ -185,32 +197,34 @@ class SubscriberListsApi:
             return self.non_error_default_response
         # ---
         encoded_options = urlencode_query(options or {})
-        url = "{}subscriber/remove/".format(self.__subscriber_list_detail_url(list_id))
+        url = "{}subscriber/remove/".format(self._subscriber_list_detail_url(list_id))
         url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
         headers = self.config.default_headers()
         # ---
         payload = {"distinct_ids": distinct_ids}
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, 'POST', payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, 'POST', payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def delete(self, list_id: str, options: Dict = None):
         list_id = self._validate_list_id(list_id)
         # --
         encoded_options = urlencode_query(options or {})
-        url = self.__subscriber_list_detail_url(list_id)
+        url = self._subscriber_list_detail_url(list_id)
         url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, 'DELETE', "", headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, 'DELETE', "", headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.delete(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.delete(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
         return {"success": True, "status_code": resp.status_code}
@@ -219,17 +233,18 @@ class SubscriberListsApi:
         if not isinstance(broadcast_instance, SubscriberListBroadcast):
             raise InputValueError("argument must be an instance of suprsend.SubscriberListBroadcast")
 
-        broadcast_body, body_size = broadcast_instance.get_final_json()
+        broadcast_body, body_size = broadcast_instance.get_final_json(self.config.json_codec)
         try:
             headers = self.config.default_headers()
             # Signature and Authorization-header
             content_txt, sig = get_request_signature(self.broadcast_url, 'POST', broadcast_body,
-                                                     headers, self.config.workspace_secret)
+                                                     headers, self.config.workspace_secret, self.config.json_codec)
             headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
             # -----
-            resp = requests.post(self.broadcast_url,
+            resp = self.config.transport.post(self.broadcast_url,
                                  data=content_txt.encode('utf-8'),
-                                 headers=headers)
+                                 headers=headers,
+                                 idempotent=has_idempotency_keys(broadcast_body))
         except Exception as ex:
             error_str = ex.__str__()
             return {
@@ -259,19 +274,20 @@ class SubscriberListsApi:
         list_id = self._validate_list_id(list_id)
         # --
         encoded_options = urlencode_query(options or {})
-        url = "{}start_sync/".format(self.__subscriber_list_detail_url(list_id))
+        url = "{}start_sync/".format(self._subscriber_list_detail_url(list_id))
         url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
         headers = self.config.default_headers()
         # --
         payload = {}
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, 'POST', payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, 'POST', payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def _validate_version_id(self, version_id):
         if not isinstance(version_id, (str,)):
@@ -281,7 +297,7 @@ class SubscriberListsApi:
             raise SuprsendValidationError("missing version_id")
         return version_id
 
-    def __subscriber_list_url_with_version(self, list_id: str, version_id: str):
+    def _subscriber_list_url_with_version(self, list_id: str, version_id: str):
         list_id = str(list_id).strip()
         list_id_encoded = urlencode_path_param(list_id)
         version_id = str(version_id).strip()
@@ -294,17 +310,17 @@ class SubscriberListsApi:
         version_id = self._validate_version_id(version_id)
         # --------
         encoded_options = urlencode_query(options or {})
-        url = self.__subscriber_list_url_with_version(list_id, version_id)
+        url = self._subscriber_list_url_with_version(list_id, version_id)
         url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
         headers = self.config.default_headers()
         # Signature and Authorization-header
         content_txt, sig = get_request_signature(url, 'GET', None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def add_to_version(self, list_id: str, version_id: str, distinct_ids: list, options: Dict = None):
         list_id = self._validate_list_id(list_id)
@@ -315,19 +331,20 @@ class SubscriberListsApi:
         version_id = self._validate_version_id(version_id)
         # --
         encoded_options = urlencode_query(options or {})
-        url = "{}subscriber/add/".format(self.__subscriber_list_url_with_version(list_id, version_id))
+        url = "{}subscriber/add/".format(self._subscriber_list_url_with_version(list_id, version_id))
         url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
         headers = self.config.default_headers()
         # --
         payload = {"distinct_ids": distinct_ids}
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, 'POST', payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, 'POST', payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def remove_from_version(self, list_id: str, version_id: str, distinct_ids: list, options: Dict = None):
         list_id = self._validate_list_id(list_id)
@@ -338,53 +355,234 @@ class SubscriberListsApi:
         version_id = self._validate_version_id(version_id)
         # --
         encoded_options = urlencode_query(options or {})
-        url = "{}subscriber/remove/".format(self.__subscriber_list_url_with_version(list_id, version_id))
+        url = "{}subscriber/remove/".format(self._subscriber_list_url_with_version(list_id, version_id))
         url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
         headers = self.config.default_headers()
         # --
         payload = {"distinct_ids": distinct_ids}
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, 'POST', payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, 'POST', payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def finish_sync(self, list_id: str, version_id: str, options: Dict = None):
         list_id = self._validate_list_id(list_id)
         version_id = self._validate_version_id(version_id)
         # --
         encoded_options = urlencode_query(options or {})
-        url = "{}finish_sync/".format(self.__subscriber_list_url_with_version(list_id, version_id))
+        url = "{}finish_sync/".format(self._subscriber_list_url_with_version(list_id, version_id))
         url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
         headers = self.config.default_headers()
         # 
         payload = {}
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, 'PATCH', payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, 'PATCH', payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.patch(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.patch(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def delete_version(self, list_id: str, version_id: str, options: Dict = None):
         list_id = self._validate_list_id(list_id)
         version_id = self._validate_version_id(version_id)
         # --
         encoded_options = urlencode_query(options or {})
-        url = self.__subscriber_list_url_with_version(list_id, version_id)
+        url = self._subscriber_list_url_with_version(list_id, version_id)
         url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
         headers = self.config.default_headers()
         # --
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, 'DELETE', "", headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, 'DELETE', "", headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.delete(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.delete(url, data=content_txt.encode('utf-8'), headers=headers)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return {"success": True, "status_code": resp.status_code}
+
+
+class AsyncSubscriberListsApi(SubscriberListsApi):
+    async def create(self, payload: Dict, options: Dict = None):
+        if not payload:
+            raise SuprsendValidationError("missing payload")
+        list_id = payload.get("list_id")
+        if not list_id:
+            raise SuprsendValidationError("missing list_id is payload")
+        list_id = self._validate_list_id(list_id)
+        # -----
+        payload["list_id"] = list_id
+        #
+        encoded_options = urlencode_query(options or {})
+        url = "{}{}".format(self.subscriber_list_url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("POST", url, payload)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get_all(self, limit: int = 20, offset: int = 0, options: Dict = None):
+        limit, offset = self.cleaned_limit_offset(limit, offset)
+        params = {"limit": limit, "offset": offset}
+        params.update((options or {}))
+        encoded_options = urlencode_query(params)
+        url = "{}{}".format(self.subscriber_list_url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get(self, list_id: str, options: Dict = None):
+        list_id = self._validate_list_id(list_id)
+        encoded_options = urlencode_query(options or {})
+        url = "{}{}".format(self._subscriber_list_detail_url(list_id), (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def add(self, list_id: str, distinct_ids: list, options: Dict = None):
+        list_id = self._validate_list_id(list_id)
+        if not isinstance(distinct_ids, (list, )):
+            raise SuprsendValidationError("distinct_ids must be list of strings")
+        if len(distinct_ids) == 0:
+            return self.non_error_default_response
+        # ---
+        encoded_options = urlencode_query(options or {})
+        url = "{}subscriber/add/".format(self._subscriber_list_detail_url(list_id))
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("POST", url, {"distinct_ids": distinct_ids})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def remove(self, list_id: str, distinct_ids: list, options: Dict = None):
+        list_id = self._validate_list_id(list_id)
+        if not isinstance(distinct_ids, (list,)):
+            raise SuprsendValidationError("distinct_ids must be list of strings")
+        if len(distinct_ids) == 0:
+            return self.non_error_default_response
+        # ---
+        encoded_options = urlencode_query(options or {})
+        url = "{}subscriber/remove/".format(self._subscriber_list_detail_url(list_id))
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("POST", url, {"distinct_ids": distinct_ids})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def delete(self, list_id: str, options: Dict = None):
+        list_id = self._validate_list_id(list_id)
+        encoded_options = urlencode_query(options or {})
+        url = self._subscriber_list_detail_url(list_id)
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("DELETE", url, "")
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return {"success": True, "status_code": resp.status_code}
+
+    async def broadcast(self, broadcast_instance: SubscriberListBroadcast) -> Dict:
+        if not isinstance(broadcast_instance, SubscriberListBroadcast):
+            raise InputValueError("argument must be an instance of suprsend.SubscriberListBroadcast")
+
+        broadcast_body, body_size = broadcast_instance.get_final_json(self.config.json_codec)
+        try:
+            resp = await self.config.signed_request("POST", self.broadcast_url, broadcast_body)
+        except Exception as ex:
+            error_str = ex.__str__()
+            return {
+                "success": False,
+                "status": "fail",
+                "status_code": 500,
+                "message": error_str,
+            }
+        else:
+            ok_response = resp.status_code // 100 == 2
+            return {
+                "success": ok_response,
+                "status": "success" if ok_response else "fail",
+                "status_code": resp.status_code,
+                "message": resp.text,
+            }
+
+    async def start_sync(self, list_id: str, options: Dict = None):
+        list_id = self._validate_list_id(list_id)
+        encoded_options = urlencode_query(options or {})
+        url = "{}start_sync/".format(self._subscriber_list_detail_url(list_id))
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("POST", url, {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get_version(self, list_id: str, version_id: str, options: Dict = None):
+        list_id = self._validate_list_id(list_id)
+        version_id = self._validate_version_id(version_id)
+        encoded_options = urlencode_query(options or {})
+        url = self._subscriber_list_url_with_version(list_id, version_id)
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def add_to_version(self, list_id: str, version_id: str, distinct_ids: list, options: Dict = None):
+        list_id = self._validate_list_id(list_id)
+        if not isinstance(distinct_ids, (list,)):
+            raise SuprsendValidationError("distinct_ids must be list of strings")
+        if len(distinct_ids) == 0:
+            return self.non_error_default_response
+        version_id = self._validate_version_id(version_id)
+        # --
+        encoded_options = urlencode_query(options or {})
+        url = "{}subscriber/add/".format(self._subscriber_list_url_with_version(list_id, version_id))
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("POST", url, {"distinct_ids": distinct_ids})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def remove_from_version(self, list_id: str, version_id: str, distinct_ids: list, options: Dict = None):
+        list_id = self._validate_list_id(list_id)
+        if not isinstance(distinct_ids, (list,)):
+            raise SuprsendValidationError("distinct_ids must be list of strings")
+        if len(distinct_ids) == 0:
+            return self.non_error_default_response
+        version_id = self._validate_version_id(version_id)
+        # --
+        encoded_options = urlencode_query(options or {})
+        url = "{}subscriber/remove/".format(self._subscriber_list_url_with_version(list_id, version_id))
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("POST", url, {"distinct_ids": distinct_ids})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def finish_sync(self, list_id: str, version_id: str, options: Dict = None):
+        list_id = self._validate_list_id(list_id)
+        version_id = self._validate_version_id(version_id)
+        encoded_options = urlencode_query(options or {})
+        url = "{}finish_sync/".format(self._subscriber_list_url_with_version(list_id, version_id))
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("PATCH", url, {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def delete_version(self, list_id: str, version_id: str, options: Dict = None):
+        list_id = self._validate_list_id(list_id)
+        version_id = self._validate_version_id(version_id)
+        encoded_options = urlencode_query(options or {})
+        url = self._subscriber_list_url_with_version(list_id, version_id)
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("DELETE", url, "")
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
         return {"success": True, "status_code": resp.status_code}
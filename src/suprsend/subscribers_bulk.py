@@ -1,5 +1,3 @@
-import copy
-import requests
 from typing import List, Dict
 
 from .constants import (
@@ -9,8 +7,9 @@ from .constants import (
     MAX_IDENTITY_EVENTS_IN_BULK_API,
 )
 from .exception import InputValueError
-from .signature import get_request_signature
-from .utils import invalid_record_json
+from .signature import get_request_signature_for_md5, json_encode, join_json_array
+from .utils import invalid_record_json, iter_chunks
+from .retry import has_idempotency_keys
 from .bulk_response import BulkResponse
 from .subscriber import Subscriber
 from .logger import ss_logger
@@ -61,6 +60,7 @@ class _BulkSubscribersChunk:
     def __init__(self, config):
         self.config = config
         self.__chunk = []
+        self.__chunk_content = []
         self.__url = self.__get_url()
         #
         self.__running_size = 0
@@ -71,10 +71,11 @@ class _BulkSubscribersChunk:
         url_formatted = "{}event/".format(self.config.base_url)
         return url_formatted
 
-    def __add_event_to_chunk(self, event, event_size):
+    def __add_event_to_chunk(self, event, event_size, event_content):
         # First add size, then event to reduce effects of race condition
         self.__running_size += event_size
         self.__chunk.append(event)
+        self.__chunk_content.append(event_content if event_content is not None else json_encode(event, self.config.json_codec))
         self.__running_length += 1
 
     def __check_limit_reached(self):
@@ -84,12 +85,13 @@ class _BulkSubscribersChunk:
         else:
             return False
 
-    def try_to_add_into_chunk(self, event: Dict, event_size: int) -> bool:
+    def try_to_add_into_chunk(self, event: Dict, event_size: int, event_content: bytes = None) -> bool:
         """
         returns whether passed event was able to get added to this chunk or not,
         if true, event gets added to chunk
         :param event:
         :param event_size:
+        :param event_content: json-encoded event (if already available). if None, event is encoded here.
         :return:
         :raises: InputValueError
         """
@@ -106,32 +108,27 @@ class _BulkSubscribersChunk:
             return False
 
         # Add Event to chunk
-        self.__add_event_to_chunk(event, event_size)
+        self.__add_event_to_chunk(event, event_size, event_content)
         return True
 
     def trigger(self):
         headers = self.config.default_headers()
+        # records were json-encoded once while calculating their size, join them to build body
+        data, content_md5 = join_json_array(self.__chunk_content, self.config.json_codec)
+        data, content_md5 = self.config._encode_bulk_body(data, content_md5, headers)
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(self.__url, 'POST', self.__chunk, headers,
-                                                 self.config.workspace_secret)
+        sig = get_request_signature_for_md5(self.__url, 'POST', content_md5, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
         try:
-            resp = requests.post(self.__url,
-                                 data=content_txt.encode('utf-8'),
-                                 headers=headers)
+            resp = self.config.transport.post(self.__url, data=data, headers=headers,
+                                              idempotent=has_idempotency_keys(*self.__chunk),
+                                              timeout=self.config.transport.bulk_timeout)
         except Exception as ex:
-            error_str = ex.__str__()
-            self.response = {
-                "status": "fail",
-                "status_code": 500,
-                "total": len(self.__chunk),
-                "success": 0,
-                "failure": len(self.__chunk),
-                "failed_records": [{"record": c, "error": error_str, "code": 500} for c in self.__chunk]
-            }
+            self.response = BulkResponse.error_chunk_response(self.__chunk, ex)
         else:
-            # TODO: handle 500/503 errors
+            # if every record carries $idempotency_key, 429/5xx are retried by transport (as per its retry_policy)
+            # and this is response of the last attempt. Otherwise chunk is sent only once.
             ok_response = resp.status_code // 100 == 2
             if ok_response:
                 self.response = {
@@ -158,53 +155,48 @@ class _BulkSubscribersChunk:
 class BulkSubscribers:
     def __init__(self, config):
         self.config = config
-        self.__subscribers = []
         self.__pending_records = []
         self.chunks = []
         self.response = BulkResponse()
         # invalid_record json: {"record": event-json, "error": error_str, "code": 500}
         self.__invalid_records = []
 
-    def __validate_subscriber_events(self):
-        for sub in self.__subscribers:
-            try:
-                # -- check if there is any error/warning, if so add it to warnings list of BulkResponse
-                warnings_list = sub.validate_body(is_part_of_bulk=True)
-                if warnings_list:
-                    self.response.warnings.extend(warnings_list)
-                # ---
-                ev = sub.get_event()
-                ev_json, body_size = sub.validate_event_size(ev)
-                self.__pending_records.append((ev_json, body_size))
-            except Exception as ex:
-                inv_rec = invalid_record_json(sub.as_json(), ex)
-                self.__invalid_records.append(inv_rec)
-
-    def __chunkify(self, start_idx=0):
-        curr_chunk = _BulkSubscribersChunk(self.config)
-        self.chunks.append(curr_chunk)
-        for rel_idx, rec in enumerate(self.__pending_records[start_idx:]):
-            is_added = curr_chunk.try_to_add_into_chunk(rec[0], rec[1])
-            if not is_added:
-                # create chunks from remaining records
-                self.__chunkify(start_idx=(start_idx + rel_idx))
-                # Don't forget to break. As current loop must not continue further
-                break
+    def __validate_subscriber_event(self, sub):
+        """
+        returns (event-json, size, encoded-event) if subscriber is valid, else adds it to invalid records.
+        """
+        try:
+            # -- check if there is any error/warning, if so add it to warnings list of BulkResponse
+            warnings_list = sub.validate_body(is_part_of_bulk=True)
+            if warnings_list:
+                self.response.warnings.extend(warnings_list)
+            # ---
+            ev = sub.get_event()
+            return sub.validate_event_size_encoded(ev)
+        except Exception as ex:
+            inv_rec = invalid_record_json(sub.as_json(), ex)
+            self.__invalid_records.append(inv_rec)
+
+    def __chunkify(self):
+        self.chunks.extend(iter_chunks(self.__pending_records, lambda: _BulkSubscribersChunk(self.config)))
 
     def append(self, *subscribers):
+        """
+        subscribers are validated and serialized when appended (instead of keeping a deep-copy till save),
+        so changes made to a subscriber after appending it are not sent.
+        """
         if not subscribers:
             return
         for sub in subscribers:
             if sub and isinstance(sub, Subscriber):
-                sub_copy = copy.deepcopy(sub)
-                self.__subscribers.append(sub_copy)
+                rec = self.__validate_subscriber_event(sub)
+                if rec:
+                    self.__pending_records.append(rec)
 
     def trigger(self):
         return self.save()
 
     def save(self):
-        self.__validate_subscriber_events()
-        # --------
         if len(self.__invalid_records) > 0:
             ch_response = BulkResponse.invalid_records_chunk_response(self.__invalid_records)
             self.response.merge_chunk_response(ch_response)
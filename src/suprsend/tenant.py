@@ -1,4 +1,3 @@
-import requests
 from typing import Dict
 
 from .exception import SuprsendAPIException, SuprsendValidationError
@@ -36,10 +35,10 @@ class TenantsApi:
         content_txt, sig = get_request_signature(url, 'GET', None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def _validate_tenant_id(self, tenant_id):
         if not isinstance(tenant_id, (str,)):
@@ -63,10 +62,10 @@ class TenantsApi:
         content_txt, sig = get_request_signature(url, 'GET', None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def upsert(self, tenant_id: str, tenant_payload: Dict):
         tenant_id = self._validate_tenant_id(tenant_id)
@@ -75,13 +74,14 @@ class TenantsApi:
         tenant_payload = tenant_payload or {}
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, 'POST', tenant_payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, 'POST', tenant_payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def delete(self, tenant_id: str):
         tenant_id = self._validate_tenant_id(tenant_id)
@@ -89,10 +89,11 @@ class TenantsApi:
         # ---
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, 'DELETE', "", headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, 'DELETE', "", headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.delete(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.delete(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
         return {"success": True, "status_code": resp.status_code}
@@ -110,10 +111,10 @@ class TenantsApi:
         content_txt, sig = get_request_signature(url, 'GET', None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def get_preference_category(self, tenant_id: str, category: str, options: Dict = None) -> Dict:
         """
@@ -129,10 +130,10 @@ class TenantsApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def update_preference_category(self, tenant_id: str, category: str, payload: Dict, options: Dict = None) -> Dict:
         """
@@ -156,10 +157,73 @@ class TenantsApi:
         # -----
         payload = payload or {}
         headers = self.config.default_headers()
-        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.patch(url, data=content_txt.encode("utf-8"), headers=headers)
+        resp = self.config.transport.patch(url, data=content_txt.encode("utf-8"), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
+
+
+class AsyncTenantsApi(TenantsApi):
+    async def list(self, limit: int = 20, offset: int = 0):
+        limit, offset = self.cleaned_limit_offset(limit, offset)
+        params = {"limit": limit, "offset": offset}
+        encoded_params = urlencode_query(params)
+        url = f"{self.list_url}?{encoded_params}"
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get(self, tenant_id: str):
+        tenant_id = self._validate_tenant_id(tenant_id)
+        resp = await self.config.signed_request("GET", self.detail_url(tenant_id))
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def upsert(self, tenant_id: str, tenant_payload: Dict):
+        tenant_id = self._validate_tenant_id(tenant_id)
+        resp = await self.config.signed_request("POST", self.detail_url(tenant_id), tenant_payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def delete(self, tenant_id: str):
+        tenant_id = self._validate_tenant_id(tenant_id)
+        resp = await self.config.signed_request("DELETE", self.detail_url(tenant_id), "")
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return {"success": True, "status_code": resp.status_code}
+
+    async def list_preference_categories(self, tenant_id: str, options: Dict = None) -> Dict:
+        tenant_id = self._validate_tenant_id(tenant_id)
+        encoded_options = urlencode_query(options or {})
+        url = "{}preference/category/{}".format(self.detail_url(tenant_id), (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get_preference_category(self, tenant_id: str, category: str, options: Dict = None) -> Dict:
+        tenant_id = self._validate_tenant_id(tenant_id)
+        category_encoded = urlencode_path_param(category)
+        encoded_options = urlencode_query(options or {})
+        url = "{}preference/category/{}/{}".format(self.detail_url(tenant_id), category_encoded, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def update_preference_category(self, tenant_id: str, category: str, payload: Dict, options: Dict = None) -> Dict:
+        tenant_id = self._validate_tenant_id(tenant_id)
+        category_encoded = urlencode_path_param(category)
+        encoded_options = urlencode_query(options or {})
+        url = "{}preference/category/{}/{}".format(self.detail_url(tenant_id), category_encoded, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("PATCH", url, payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
@@ -0,0 +1,351 @@
+import asyncio
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Callable, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .constants import (
+    DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE, DEFAULT_POOL_IDLE_TIMEOUT_SECS,
+    DEFAULT_CONNECT_TIMEOUT_SECS, DEFAULT_READ_TIMEOUT_SECS, DEFAULT_BULK_READ_TIMEOUT_SECS,
+)
+from .exception import SuprsendConfigError, SuprsendCircuitOpenError
+from .logger import ss_logger
+from .retry import RetryPolicy
+from .rate_limiter import RateLimiter
+from .circuit_breaker import CircuitBreaker
+
+try:
+    import httpx
+    _has_httpx = True
+except ImportError:
+    _has_httpx = False
+
+# (connect-timeout, read-timeout) in seconds, None: wait indefinitely
+Timeout = Tuple[Optional[float], Optional[float]]
+
+# timeout set by request_timeout() for calls made in current thread/asyncio-task
+_timeout_override = contextvars.ContextVar("suprsend_timeout_override", default=None)
+
+
+def normalize_timeout(timeout: Union[float, Tuple, None], default: Timeout) -> Timeout:
+    """
+    :param timeout: seconds (both connect and read) or (connect, read) tuple. None: default
+    """
+    if timeout is None:
+        return default
+    if isinstance(timeout, (tuple, list)):
+        if len(timeout) != 2:
+            raise SuprsendConfigError("timeout must be a number or a (connect, read) tuple")
+        return timeout[0], timeout[1]
+    return timeout, timeout
+
+
+@contextlib.contextmanager
+def request_timeout(timeout: Union[float, Tuple]):
+    """
+    overrides timeout of all api calls (single as well as bulk) made within the block, in current thread/asyncio-task
+    (and chunks of bulk calls triggered from it).
+    """
+    token = _timeout_override.set(normalize_timeout(timeout, None))
+    try:
+        yield
+    finally:
+        _timeout_override.reset(token)
+
+
+def request_error_type(ex: BaseException) -> str:
+    """
+    classifies exception raised by a transport call: connect_timeout/read_timeout/connection_error/circuit_open/error
+    """
+    if isinstance(ex, SuprsendCircuitOpenError):
+        return "circuit_open"
+    if isinstance(ex, requests.exceptions.ConnectTimeout):
+        return "connect_timeout"
+    if isinstance(ex, requests.exceptions.Timeout):
+        return "read_timeout"
+    if isinstance(ex, requests.exceptions.ConnectionError):
+        return "connection_error"
+    if _has_httpx:
+        if isinstance(ex, httpx.ConnectTimeout):
+            return "connect_timeout"
+        if isinstance(ex, httpx.TimeoutException):
+            return "read_timeout"
+        if isinstance(ex, httpx.TransportError):
+            return "connection_error"
+    return "error"
+
+
+class _TimeoutsMixin:
+    def _init_timeouts(self, timeout, bulk_timeout):
+        self.timeout = normalize_timeout(timeout, (DEFAULT_CONNECT_TIMEOUT_SECS, DEFAULT_READ_TIMEOUT_SECS))
+        self.bulk_timeout = normalize_timeout(bulk_timeout,
+                                              (DEFAULT_CONNECT_TIMEOUT_SECS, DEFAULT_BULK_READ_TIMEOUT_SECS))
+
+    def _effective_timeout(self, timeout: Optional[Timeout]) -> Timeout:
+        override = _timeout_override.get()
+        if override is not None:
+            return override
+        return timeout if timeout is not None else self.timeout
+
+
+class HttpTransport(_TimeoutsMixin):
+    """
+    Keep-alive connection pool shared by all API classes of a Suprsend instance.
+
+    - pool_connections: number of per-host connection pools to cache
+    - pool_maxsize: max connections kept alive per host
+    - pool_block: if True, wait for a free connection instead of opening an extra (non-pooled) one
+    - pool_idle_timeout: pooled connections unused for longer than this (in seconds) are dropped
+      before the next request. None disables idle eviction.
+    - retry_policy: retries of 429/5xx responses and connection errors. None: RetryPolicy() defaults
+    - signer: signer(method, url, data, headers) re-signs headers (in-place) before a retry
+    - rate_limiter: RateLimiter, every attempt waits for a token of its endpoint family. None: no limit
+    - circuit_breaker: CircuitBreaker, attempts to a failing endpoint fail fast. None: disabled
+    - timeout: (connect, read) timeout of single-record calls, bulk_timeout: of bulk calls (chunks).
+      A number sets both connect and read timeout. Per call, request_timeout() overrides them.
+    """
+    _retryable_errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+    def __init__(self, pool_connections: int = DEFAULT_POOL_CONNECTIONS, pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 pool_block: bool = False, pool_idle_timeout: float = DEFAULT_POOL_IDLE_TIMEOUT_SECS,
+                 retry_policy: RetryPolicy = None, signer: Callable = None, rate_limiter: RateLimiter = None,
+                 circuit_breaker: CircuitBreaker = None, timeout=None, bulk_timeout=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.pool_idle_timeout = pool_idle_timeout
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.signer = signer
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self._init_timeouts(timeout, bulk_timeout)
+        #
+        self.__lock = threading.Lock()
+        self.__session = None
+        self.__last_used_at = 0.0
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                              pool_block=self.pool_block)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def __get_session(self) -> requests.Session:
+        with self.__lock:
+            now = time.monotonic()
+            if self.__session is not None and self.pool_idle_timeout is not None and \
+                    now - self.__last_used_at > self.pool_idle_timeout:
+                # connections idle for too long are likely closed by the server/load-balancer already.
+                self.__session.close()
+                self.__session = None
+            if self.__session is None:
+                self.__session = self.__new_session()
+            self.__last_used_at = now
+            return self.__session
+
+    def request(self, method: str, url: str, data: bytes = None, headers: dict = None,
+                idempotent: bool = None, timeout: Timeout = None) -> requests.Response:
+        """
+        :param idempotent: whether call can be retried safely. None: decided by method (GET/PUT/DELETE are)
+        :param timeout: (connect, read) timeout of each attempt. None: self.timeout
+        """
+        timeout = self._effective_timeout(timeout)
+        policy = self.retry_policy
+        policy.on_call()
+        retryable = policy.is_retryable_call(method, idempotent)
+        attempt = 1
+        while True:
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve(url)
+                if wait > 0:
+                    time.sleep(wait)
+                    if self.signer is not None:
+                        self.signer(method, url, data, headers)
+            try:
+                resp = self.__send(method, url, data, headers, timeout)
+            except self._retryable_errors as ex:
+                delay = policy.delay_for_error(attempt) if retryable else None
+                if delay is None or not policy.acquire_retry():
+                    raise ex
+                ss_logger.info("%s %s failed (attempt %s): %s. retrying in %.2fs", method, url, attempt, ex, delay)
+            else:
+                delay = policy.delay_for_response(resp.status_code, resp.headers, attempt) if retryable else None
+                if delay is None or not policy.acquire_retry():
+                    return resp
+                ss_logger.info("%s %s got %s (attempt %s). retrying in %.2fs",
+                               method, url, resp.status_code, attempt, delay)
+                resp.close()
+            # ---
+            time.sleep(delay)
+            attempt += 1
+            if self.signer is not None:
+                self.signer(method, url, data, headers)
+
+    def __send(self, method: str, url: str, data: bytes, headers: dict, timeout: Timeout) -> requests.Response:
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return self.__get_session().request(method, url, data=data, headers=headers, timeout=timeout)
+        # raises SuprsendCircuitOpenError
+        endpoint = breaker.before_call(url)
+        try:
+            resp = self.__get_session().request(method, url, data=data, headers=headers, timeout=timeout)
+        except self._retryable_errors:
+            breaker.on_failure(endpoint)
+            raise
+        except BaseException:
+            breaker.on_abort(endpoint)
+            raise
+        if breaker.is_failure_status(resp.status_code):
+            breaker.on_failure(endpoint)
+        else:
+            breaker.on_success(endpoint)
+        return resp
+
+    def get(self, url: str, headers: dict = None, idempotent: bool = None,
+            timeout: Timeout = None) -> requests.Response:
+        return self.request("GET", url, headers=headers, idempotent=idempotent, timeout=timeout)
+
+    def post(self, url: str, data: bytes = None, headers: dict = None, idempotent: bool = None,
+             timeout: Timeout = None) -> requests.Response:
+        return self.request("POST", url, data=data, headers=headers, idempotent=idempotent, timeout=timeout)
+
+    def patch(self, url: str, data: bytes = None, headers: dict = None, idempotent: bool = None,
+              timeout: Timeout = None) -> requests.Response:
+        return self.request("PATCH", url, data=data, headers=headers, idempotent=idempotent, timeout=timeout)
+
+    def delete(self, url: str, data: bytes = None, headers: dict = None, idempotent: bool = None,
+               timeout: Timeout = None) -> requests.Response:
+        return self.request("DELETE", url, data=data, headers=headers, idempotent=idempotent, timeout=timeout)
+
+    def close(self):
+        with self.__lock:
+            if self.__session is not None:
+                self.__session.close()
+                self.__session = None
+
+
+class AsyncHttpTransport(_TimeoutsMixin):
+    """
+    Non-blocking counterpart of HttpTransport (uses httpx.AsyncClient), used by AsyncSuprsend.
+
+    - pool_maxsize: max keep-alive connections held in the pool
+    - pool_idle_timeout: keep-alive connections idle for longer than this (in seconds) are closed
+    - max_connections: max concurrent connections (None: no limit)
+    - retry_policy, signer, rate_limiter, circuit_breaker, timeout, bulk_timeout: same as HttpTransport
+    """
+    def __init__(self, pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 pool_idle_timeout: float = DEFAULT_POOL_IDLE_TIMEOUT_SECS, max_connections: int = None,
+                 retry_policy: RetryPolicy = None, signer: Callable = None, rate_limiter: RateLimiter = None,
+                 circuit_breaker: CircuitBreaker = None, timeout=None, bulk_timeout=None):
+        if not _has_httpx:
+            raise SuprsendConfigError("httpx is required for AsyncSuprsend. "
+                                      "Install it using: pip install suprsend-py-sdk[async]")
+        self.pool_maxsize = pool_maxsize
+        self.pool_idle_timeout = pool_idle_timeout
+        self.max_connections = max_connections
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.signer = signer
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self._init_timeouts(timeout, bulk_timeout)
+        self._retryable_errors = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+        #
+        self.__client = None
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __get_client(self) -> "httpx.AsyncClient":
+        if self.__client is None or self.__client.is_closed:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.pool_maxsize,
+                                  keepalive_expiry=self.pool_idle_timeout)
+            # timeout is passed per request
+            self.__client = httpx.AsyncClient(limits=limits, timeout=None)
+        return self.__client
+
+    async def request(self, method: str, url: str, data: bytes = None, headers: dict = None,
+                      idempotent: bool = None, timeout: Timeout = None) -> "httpx.Response":
+        connect_timeout, read_timeout = self._effective_timeout(timeout)
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        policy = self.retry_policy
+        policy.on_call()
+        retryable = policy.is_retryable_call(method, idempotent)
+        attempt = 1
+        while True:
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve(url)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    if self.signer is not None:
+                        self.signer(method, url, data, headers)
+            try:
+                resp = await self.__send(method, url, data, headers, timeout)
+            except self._retryable_errors as ex:
+                delay = policy.delay_for_error(attempt) if retryable else None
+                if delay is None or not policy.acquire_retry():
+                    raise ex
+                ss_logger.info("%s %s failed (attempt %s): %s. retrying in %.2fs", method, url, attempt, ex, delay)
+            else:
+                delay = policy.delay_for_response(resp.status_code, resp.headers, attempt) if retryable else None
+                if delay is None or not policy.acquire_retry():
+                    return resp
+                ss_logger.info("%s %s got %s (attempt %s). retrying in %.2fs",
+                               method, url, resp.status_code, attempt, delay)
+                await resp.aclose()
+            # ---
+            await asyncio.sleep(delay)
+            attempt += 1
+            if self.signer is not None:
+                self.signer(method, url, data, headers)
+
+    async def __send(self, method: str, url: str, data: bytes, headers: dict,
+                     timeout: "httpx.Timeout") -> "httpx.Response":
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return await self.__get_client().request(method, url, content=data, headers=headers, timeout=timeout)
+        # raises SuprsendCircuitOpenError
+        endpoint = breaker.before_call(url)
+        try:
+            resp = await self.__get_client().request(method, url, content=data, headers=headers, timeout=timeout)
+        except self._retryable_errors:
+            breaker.on_failure(endpoint)
+            raise
+        except BaseException:
+            breaker.on_abort(endpoint)
+            raise
+        if breaker.is_failure_status(resp.status_code):
+            breaker.on_failure(endpoint)
+        else:
+            breaker.on_success(endpoint)
+        return resp
+
+    async def get(self, url: str, headers: dict = None, idempotent: bool = None,
+                  timeout: Timeout = None) -> "httpx.Response":
+        return await self.request("GET", url, headers=headers, idempotent=idempotent, timeout=timeout)
+
+    async def post(self, url: str, data: bytes = None, headers: dict = None, idempotent: bool = None,
+                   timeout: Timeout = None) -> "httpx.Response":
+        return await self.request("POST", url, data=data, headers=headers, idempotent=idempotent, timeout=timeout)
+
+    async def patch(self, url: str, data: bytes = None, headers: dict = None, idempotent: bool = None,
+                    timeout: Timeout = None) -> "httpx.Response":
+        return await self.request("PATCH", url, data=data, headers=headers, idempotent=idempotent, timeout=timeout)
+
+    async def delete(self, url: str, data: bytes = None, headers: dict = None, idempotent: bool = None,
+                     timeout: Timeout = None) -> "httpx.Response":
+        return await self.request("DELETE", url, data=data, headers=headers, idempotent=idempotent, timeout=timeout)
+
+    async def aclose(self):
+        if self.__client is not None:
+            await self.__client.aclose()
+            self.__client = None
@@ -7,7 +7,7 @@ from .constants import (
     IDENTITY_SINGLE_EVENT_MAX_APPARENT_SIZE_IN_BYTES_READABLE,
 )
 from .exception import InputValueError
-from .utils import (get_apparent_identity_event_size, )
+from .utils import (get_apparent_identity_event_size_and_content, )
 from .user_edit_internal_helper import _UserEditInternalHelper
 from .logger import ss_logger
 
@@ -62,12 +62,19 @@ class UserEdit:
         return ev
 
     def validate_payload_size(self, payload: Dict):
-        apparent_size = get_apparent_identity_event_size(payload)
+        payload, apparent_size, _ = self.validate_payload_size_encoded(payload)
+        return payload, apparent_size
+
+    def validate_payload_size_encoded(self, payload: Dict):
+        """
+        same as validate_payload_size, additionally returns json-encoded payload (bytes) used for size calculation
+        """
+        apparent_size, content = get_apparent_identity_event_size_and_content(payload, self.config.json_codec)
         if apparent_size > IDENTITY_SINGLE_EVENT_MAX_APPARENT_SIZE_IN_BYTES:
             raise InputValueError(f"User Payload size too big - {apparent_size} Bytes, "
                                   f"must not cross {IDENTITY_SINGLE_EVENT_MAX_APPARENT_SIZE_IN_BYTES_READABLE}")
         # ----
-        return payload, apparent_size
+        return payload, apparent_size, content
 
     def validate_body(self):
         self.__warnings_list = []
@@ -1,10 +1,9 @@
 from typing import Dict, Union
-import requests
 
 from .exception import SuprsendAPIException, SuprsendValidationError
 from .signature import get_request_signature
 from .user_edit import UserEdit
-from .users_edit_bulk import BulkUsersEdit
+from .users_edit_bulk import BulkUsersEdit, AsyncBulkUsersEdit
 from .utils import urlencode_query, urlencode_path_param
 
 
@@ -23,10 +22,10 @@ class UsersApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def _validate_distinct_id(self, distinct_id: str) -> str:
         if not distinct_id or not isinstance(distinct_id, (str,)) or not distinct_id.strip():
@@ -47,10 +46,10 @@ class UsersApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def upsert(self, distinct_id: str, payload: Dict = None, options: Dict = None) -> Dict:
         url = self.detail_url(distinct_id)
@@ -60,13 +59,14 @@ class UsersApi:
         # ---
         payload = payload or {}
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "POST", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "POST", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def async_edit(self, edit_instance: UserEdit) -> Dict:
         if not edit_instance:
@@ -77,10 +77,11 @@ class UsersApi:
         # --- Signature and Authorization-header
         url = "{}event/".format(self.config.base_url)
         headers = self.config.default_headers()
-        content_txt, sig = get_request_signature(url, "POST", a_payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "POST", a_payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
         # if no error, return success response
@@ -108,13 +109,14 @@ class UsersApi:
         url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.patch(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.patch(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def merge(self, distinct_id: str, from_user_id: str) -> Dict:
         url = "{}merge/".format(self.detail_url(distinct_id))
@@ -122,23 +124,25 @@ class UsersApi:
         headers = self.config.default_headers()
         # ---
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "POST", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "POST", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def delete(self, distinct_id: str) -> Dict:
         url = self.detail_url(distinct_id)
         headers = self.config.default_headers()
         # ---
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "DELETE", "", headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "DELETE", "", headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.delete(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.delete(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
         return {"success": True, "status_code": resp.status_code}
@@ -153,10 +157,11 @@ class UsersApi:
         url = self.bulk_url
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "DELETE", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "DELETE", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.delete(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.delete(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
         return {"success": True, "status_code": resp.status_code}
@@ -171,10 +176,10 @@ class UsersApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def _validate_tenant_id(self, tenant_id: str) -> str:
         if not tenant_id or not isinstance(tenant_id, (str,)) or not tenant_id.strip():
@@ -194,10 +199,10 @@ class UsersApi:
         # Signature and Authorization-header
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def upsert_for_tenant(self, distinct_id: str, tenant_id: str, payload: Dict = None, options: Dict = None) -> Dict:
         url = self.detail_url_for_tenant(distinct_id, tenant_id)
@@ -207,22 +212,24 @@ class UsersApi:
         # ---
         payload = payload or {}
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "POST", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "POST", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def unlink_tenant(self, distinct_id: str, tenant_id: str) -> Dict:
         url = self.detail_url_for_tenant(distinct_id, tenant_id)
         headers = self.config.default_headers()
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(url, "DELETE", "", headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "DELETE", "", headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.delete(url, data=content_txt.encode('utf-8'), headers=headers)
+        resp = self.config.transport.delete(url, data=content_txt.encode('utf-8'), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
         return {"success": True, "status_code": resp.status_code}
@@ -238,10 +245,10 @@ class UsersApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def get_lists_subscribed_to(self, distinct_id: str, options: Dict = None) -> Dict:
         encoded_options = urlencode_query(options or {})
@@ -252,10 +259,10 @@ class UsersApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def get_edit_instance(self, distinct_id: str, tenant_id: str = None) -> UserEdit:
         distinct_id = self._validate_distinct_id(distinct_id)
@@ -263,8 +270,9 @@ class UsersApi:
             tenant_id = self._validate_tenant_id(tenant_id)
         return UserEdit(self.config, distinct_id, tenant_id)
 
-    def get_bulk_edit_instance(self) -> BulkUsersEdit:
-        return BulkUsersEdit(self.config)
+    def get_bulk_edit_instance(self, compact_failed_records: bool = False,
+                               failed_record_tracebacks: bool = False) -> BulkUsersEdit:
+        return BulkUsersEdit(self.config, compact_failed_records, failed_record_tracebacks)
 
     def get_full_preference(self, distinct_id: str, options: Dict = None) -> Dict:
         """
@@ -279,10 +287,10 @@ class UsersApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def update_global_channels_preference(self, distinct_id: str, payload: Dict, options: Dict = None) -> Dict:
         """
@@ -301,13 +309,14 @@ class UsersApi:
         # ----
         payload = payload or {}
         headers = self.config.default_headers()
-        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # ----
-        resp = requests.patch(url, data=content_txt.encode("utf-8"), headers=headers)
+        resp = self.config.transport.patch(url, data=content_txt.encode("utf-8"), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def get_category_preference(self, distinct_id: str, category: str, options: Dict = None) -> Dict:
         """
@@ -325,10 +334,10 @@ class UsersApi:
         content_txt, sig = get_request_signature(url, "GET", None, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # -----
-        resp = requests.get(url, headers=headers)
+        resp = self.config.transport.get(url, headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
 
     def update_category_preference(
         self, distinct_id: str, category: str, payload: Dict, options: Dict = None
@@ -345,10 +354,192 @@ class UsersApi:
         # ----
         payload = payload or {}
         headers = self.config.default_headers()
-        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret)
+        content_txt, sig = get_request_signature(url, "PATCH", payload, headers, self.config.workspace_secret,
+                                                 self.config.json_codec)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
         # ----
-        resp = requests.patch(url, data=content_txt.encode("utf-8"), headers=headers)
+        resp = self.config.transport.patch(url, data=content_txt.encode("utf-8"), headers=headers)
         if resp.status_code >= 400:
             raise SuprsendAPIException(resp)
-        return resp.json()
+        return self.config.json_codec.loads(resp.content)
+
+
+class AsyncUsersApi(UsersApi):
+    async def list(self, options: Dict = None) -> Dict:
+        encoded_options = urlencode_query(options or {})
+        url = "{}{}".format(self.list_url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get(self, distinct_id: str, options: Dict = None) -> Dict:
+        url = self.detail_url(distinct_id)
+        encoded_options = urlencode_query(options or {})
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def upsert(self, distinct_id: str, payload: Dict = None, options: Dict = None) -> Dict:
+        url = self.detail_url(distinct_id)
+        encoded_options = urlencode_query(options or {})
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("POST", url, payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def async_edit(self, edit_instance: UserEdit) -> Dict:
+        if not edit_instance:
+            raise SuprsendValidationError("instance is required")
+        edit_instance.validate_body()
+        a_payload = edit_instance.get_async_payload()
+        edit_instance.validate_payload_size(a_payload)
+        # ---
+        url = "{}event/".format(self.config.base_url)
+        resp = await self.config.signed_request("POST", url, a_payload)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        # if no error, return success response
+        return {"success": True, "status": "success", "status_code": resp.status_code, "message": resp.text}
+
+    async def edit(self, edit_ins_or_distinct_id: Union[UserEdit, str], edit_payload: Dict = None, tenant_id: str = None, options: Dict = None) -> Dict:
+        if isinstance(edit_ins_or_distinct_id, UserEdit):
+            edit_ins = edit_ins_or_distinct_id
+            edit_ins.validate_body()
+            payload = edit_ins.get_payload()
+            if edit_ins.tenant_id:
+                url = self.detail_url_for_tenant(edit_ins.distinct_id, edit_ins.tenant_id)
+            else:
+                url = self.detail_url(edit_ins.distinct_id)
+        else:
+            distinct_id = edit_ins_or_distinct_id
+            payload = edit_payload or {}
+            if tenant_id:
+                url = self.detail_url_for_tenant(distinct_id, tenant_id)
+            else:
+                url = self.detail_url(distinct_id)
+        # ----
+        encoded_options = urlencode_query(options or {})
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("PATCH", url, payload)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def merge(self, distinct_id: str, from_user_id: str) -> Dict:
+        url = "{}merge/".format(self.detail_url(distinct_id))
+        payload = {"from_user_id": from_user_id}
+        resp = await self.config.signed_request("POST", url, payload)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def delete(self, distinct_id: str) -> Dict:
+        url = self.detail_url(distinct_id)
+        resp = await self.config.signed_request("DELETE", url, "")
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return {"success": True, "status_code": resp.status_code}
+
+    async def bulk_delete(self, payload: Dict) -> Dict:
+        """
+        payload: {"distinct_ids": ["id1", "id2"]}
+        """
+        resp = await self.config.signed_request("DELETE", self.bulk_url, payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return {"success": True, "status_code": resp.status_code}
+
+    async def list_associated_tenants(self, distinct_id: str, options: Dict = None) -> Dict:
+        encoded_options = urlencode_query(options or {})
+        url = "{}associated_tenant/{}".format(self.detail_url(distinct_id), (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get_for_tenant(self, distinct_id: str, tenant_id: str, options: Dict = None) -> Dict:
+        url = self.detail_url_for_tenant(distinct_id, tenant_id)
+        encoded_options = urlencode_query(options or {})
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def upsert_for_tenant(self, distinct_id: str, tenant_id: str, payload: Dict = None, options: Dict = None) -> Dict:
+        url = self.detail_url_for_tenant(distinct_id, tenant_id)
+        encoded_options = urlencode_query(options or {})
+        url = "{}{}".format(url, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("POST", url, payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def unlink_tenant(self, distinct_id: str, tenant_id: str) -> Dict:
+        url = self.detail_url_for_tenant(distinct_id, tenant_id)
+        resp = await self.config.signed_request("DELETE", url, "")
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return {"success": True, "status_code": resp.status_code}
+
+    async def get_objects_subscribed_to(self, distinct_id: str, options: Dict = None) -> Dict:
+        encoded_options = urlencode_query(options or {})
+        url = "{}subscribed_to/object/{}".format(self.detail_url(distinct_id), (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get_lists_subscribed_to(self, distinct_id: str, options: Dict = None) -> Dict:
+        encoded_options = urlencode_query(options or {})
+        url = "{}subscribed_to/list/{}".format(self.detail_url(distinct_id), (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    def get_bulk_edit_instance(self, compact_failed_records: bool = False,
+                               failed_record_tracebacks: bool = False) -> AsyncBulkUsersEdit:
+        return AsyncBulkUsersEdit(self.config, compact_failed_records, failed_record_tracebacks)
+
+    async def get_full_preference(self, distinct_id: str, options: Dict = None) -> Dict:
+        encoded_options = urlencode_query(options or {})
+        url = "{}preference/{}".format(self.detail_url(distinct_id), (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def update_global_channels_preference(self, distinct_id: str, payload: Dict, options: Dict = None) -> Dict:
+        encoded_options = urlencode_query(options or {})
+        url = "{}preference/channel_preference/{}".format(self.detail_url(distinct_id), (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("PATCH", url, payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def get_category_preference(self, distinct_id: str, category: str, options: Dict = None) -> Dict:
+        if not category or not isinstance(category, (str,)) or not category.strip():
+            raise SuprsendValidationError("missing category")
+        category_encoded = urlencode_path_param(category.strip())
+        encoded_options = urlencode_query(options or {})
+        url = "{}preference/category/{}/{}".format(self.detail_url(distinct_id), category_encoded, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("GET", url)
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
+
+    async def update_category_preference(
+        self, distinct_id: str, category: str, payload: Dict, options: Dict = None
+    ) -> Dict:
+        category_encoded = urlencode_path_param(category)
+        encoded_options = urlencode_query(options or {})
+        url = "{}preference/category/{}/{}".format(self.detail_url(distinct_id), category_encoded, (f"?{encoded_options}" if encoded_options else ""))
+        resp = await self.config.signed_request("PATCH", url, payload or {})
+        if resp.status_code >= 400:
+            raise SuprsendAPIException(resp)
+        return self.config.json_codec.loads(resp.content)
@@ -1,6 +1,4 @@
-import copy
-import requests
-from typing import Dict, Union
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
 
 from .constants import (
     IDENTITY_SINGLE_EVENT_MAX_APPARENT_SIZE_IN_BYTES,
@@ -9,8 +7,11 @@ from .constants import (
     MAX_IDENTITY_EVENTS_IN_BULK_API,
 )
 from .exception import InputValueError
-from .signature import get_request_signature
-from .utils import invalid_record_json
+from .signature import get_request_signature_for_md5, json_encode, join_json_array
+from .utils import (invalid_record_json, compact_invalid_record_json, iter_chunks, trigger_chunks_stream,
+                    async_trigger_chunks_stream, failed_records_to_retry, sized_records_as_sent, drain,
+                    get_apparent_identity_event_size_and_content)
+from .retry import has_idempotency_keys
 from .bulk_response import BulkResponse
 from .user_edit import UserEdit
 from .logger import ss_logger
@@ -23,18 +24,28 @@ class _BulkUsersEditChunk:
     def __init__(self, config):
         self.config = config
         self.__chunk = []
+        self.__chunk_content = []
+        self.__chunk_sizes = []
         self.__url = "{}event/".format(self.config.base_url)
         #
         self.__running_size = 0
         self.__running_length = 0
         self.response = None
 
-    def __add_event_to_chunk(self, event, event_size):
+    def __add_event_to_chunk(self, event, event_size, event_content):
         # First add size, then event to reduce effects of race condition
         self.__running_size += event_size
         self.__chunk.append(event)
+        self.__chunk_content.append(event_content if event_content is not None else json_encode(event, self.config.json_codec))
+        self.__chunk_sizes.append(event_size)
         self.__running_length += 1
 
+    def sized_records(self) -> Iterator[Tuple]:
+        """
+        (record, size, content) of records as they were added, to send them again exactly as they were sent
+        """
+        return zip(self.__chunk, self.__chunk_sizes, self.__chunk_content)
+
     def __check_limit_reached(self):
         if self.__running_length >= self._max_records_in_chunk or \
                 self.__running_size >= self._chunk_apparent_size_in_bytes:
@@ -42,12 +53,13 @@ class _BulkUsersEditChunk:
         else:
             return False
 
-    def try_to_add_into_chunk(self, event: Dict, event_size: int) -> bool:
+    def try_to_add_into_chunk(self, event: Dict, event_size: int, event_content: bytes = None) -> bool:
         """
         returns whether passed event was able to get added to this chunk or not,
         if true, event gets added to chunk
         :param event:
         :param event_size:
+        :param event_content: json-encoded event (if already available). if None, event is encoded here.
         :return:
         :raises: InputValueError
         """
@@ -64,117 +76,290 @@ class _BulkUsersEditChunk:
             return False
 
         # Add Event to chunk
-        self.__add_event_to_chunk(event, event_size)
+        self.__add_event_to_chunk(event, event_size, event_content)
         return True
 
-    def trigger(self):
+    def __signed_request(self):
         headers = self.config.default_headers()
+        # records were json-encoded once while calculating their size, join them to build body
+        data, content_md5 = join_json_array(self.__chunk_content, self.config.json_codec)
+        data, content_md5 = self.config._encode_bulk_body(data, content_md5, headers)
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(self.__url, "POST", self.__chunk, headers,
-                                                 self.config.workspace_secret)
+        sig = get_request_signature_for_md5(self.__url, "POST", content_md5, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
-        # -----
+        return data, headers
+
+    def trigger(self):
+        data, headers = self.__signed_request()
         try:
-            resp = requests.post(self.__url, data=content_txt.encode('utf-8'), headers=headers)
+            resp = self.config.transport.post(self.__url, data=data, headers=headers,
+                                              idempotent=has_idempotency_keys(*self.__chunk),
+                                              timeout=self.config.transport.bulk_timeout)
         except Exception as ex:
-            error_str = ex.__str__()
+            self.__set_error_response(ex)
+        else:
+            self.__set_api_response(resp)
+
+    async def async_trigger(self):
+        data, headers = self.__signed_request()
+        try:
+            resp = await self.config.transport.post(self.__url, data=data, headers=headers,
+                                                    idempotent=has_idempotency_keys(*self.__chunk),
+                                                    timeout=self.config.transport.bulk_timeout)
+        except Exception as ex:
+            self.__set_error_response(ex)
+        else:
+            self.__set_api_response(resp)
+
+    def __set_error_response(self, ex: Exception):
+        self.response = BulkResponse.error_chunk_response(self.__chunk, ex)
+
+    def __set_api_response(self, resp):
+        # if every record carries $idempotency_key, 429/5xx are retried by transport (as per its retry_policy)
+        # and this is response of the last attempt. Otherwise chunk is sent only once.
+        ok_response = resp.status_code // 100 == 2
+        if ok_response:
+            self.response = {
+                "status": "success",
+                "status_code": resp.status_code,
+                "total": len(self.__chunk),
+                "success": len(self.__chunk),
+                "failure": 0,
+                "failed_records": []
+            }
+        else:
+            error_str = resp.text
             self.response = {
                 "status": "fail",
-                "status_code": 500,
+                "status_code": resp.status_code,
                 "total": len(self.__chunk),
                 "success": 0,
                 "failure": len(self.__chunk),
-                "failed_records": [{"record": c, "error": error_str, "code": 500} for c in self.__chunk]
+                "failed_records": [{"record": c, "error": error_str, "code": resp.status_code}
+                                   for c in self.__chunk]
             }
-        else:
-            # TODO: handle 500/503 errors
-            ok_response = resp.status_code // 100 == 2
-            if ok_response:
-                self.response = {
-                    "status": "success",
-                    "status_code": resp.status_code,
-                    "total": len(self.__chunk),
-                    "success": len(self.__chunk),
-                    "failure": 0,
-                    "failed_records": []
-                }
-            else:
-                error_str = resp.text
-                self.response = {
-                    "status": "fail",
-                    "status_code": resp.status_code,
-                    "total": len(self.__chunk),
-                    "success": 0,
-                    "failure": len(self.__chunk),
-                    "failed_records": [{"record": c, "error": error_str, "code": resp.status_code}
-                                       for c in self.__chunk]
-                }
 
 
 class BulkUsersEdit:
-    def __init__(self, config):
+    def __init__(self, config, compact_failed_records: bool = False, failed_record_tracebacks: bool = False):
+        """
+        :param compact_failed_records: invalid records (failing validation) are kept in failed_records as
+            {"index": index-in-input, "error": interned error message, "code": 500, "error_type": "invalid_record"}
+            instead of a copy of the record with its formatted traceback. index counts every item passed to
+            append/save_stream of this instance, in order.
+        :param failed_record_tracebacks: with compact_failed_records, also keep traceback of the error under
+            "traceback" key, formatted only when str() is called on it.
+        """
         self.config = config
-        self.__users = []
+        self.compact_failed_records = compact_failed_records
+        self.failed_record_tracebacks = failed_record_tracebacks
         self.__pending_records = []
         # invalid_record json: {"record": event-json, "error": error_str, "code": 500}
         self.__invalid_records = []
+        # index (in input) of next record passed to append/save_stream
+        self.__input_index = 0
         self.chunks = []
+        # chunks made by retry_failed, to retry their records again as they were sent
+        self.__retry_chunks = []
         self.response = BulkResponse()
+        # streaming mode: result of each chunk is reported to this callback, response keeps counters only
+        self.__on_chunk_complete = None
 
-    def __validate_users(self):
-        for u in self.__users:
-            try:
-                # -- check if there is any error/warning, if so add it to warnings list of BulkResponse
-                warnings_list = u.validate_body()
-                if warnings_list:
-                    self.response.warnings.extend(warnings_list)
-                # ---
-                pl = u.get_async_payload()
-                pl_json, pl_size = u.validate_payload_size(pl)
-                self.__pending_records.append((pl_json, pl_size))
-            except Exception as ex:
-                # invalid_record json: {"record": payload-json, "error": error_str, "code": 500}
+    def __validate_user(self, u, index: int):
+        """
+        returns (payload-json, size, encoded-payload) if user is valid, else adds it to invalid records.
+        """
+        try:
+            # -- check if there is any error/warning, if so add it to warnings list of BulkResponse
+            warnings_list = u.validate_body()
+            if warnings_list:
+                self.response.warnings.extend(warnings_list)
+            # ---
+            pl = u.get_async_payload()
+            return u.validate_payload_size_encoded(pl)
+        except Exception as ex:
+            # invalid_record json: {"record": payload-json, "error": error_str, "code": 500}
+            if self.compact_failed_records:
+                inv_rec = compact_invalid_record_json(index, ex, self.failed_record_tracebacks)
+            else:
                 inv_rec = invalid_record_json(u.as_json_async(), ex)
-                self.__invalid_records.append(inv_rec)
-
-    def __chunkify(self, start_idx=0):
-        curr_chunk = _BulkUsersEditChunk(self.config)
-        self.chunks.append(curr_chunk)
-        for rel_idx, rec in enumerate(self.__pending_records[start_idx:]):
-            is_added = curr_chunk.try_to_add_into_chunk(rec[0], rec[1])
-            if not is_added:
-                # create chunks from remaining records
-                self.__chunkify(start_idx=(start_idx + rel_idx))
-                # Don't forget to break. As current loop must not continue further
-                break
+            self.__invalid_records.append(inv_rec)
+
+    def __iter_valid_records(self, users: Iterable[UserEdit]):
+        """
+        validates users one by one, yields (payload, size, encoded-payload) of valid ones
+        """
+        for u in users:
+            index = self.__input_index
+            self.__input_index += 1
+            if u and isinstance(u, UserEdit):
+                rec = self.__validate_user(u, index)
+                if rec:
+                    yield rec
+
+    def __chunkify(self):
+        self.chunks.extend(iter_chunks(self.__pending_records, lambda: _BulkUsersEditChunk(self.config)))
 
     def append(self, *users):
+        """
+        users are validated and serialized when appended (instead of keeping a deep-copy till trigger),
+        so changes made to a user after appending it are not sent (not even by retry_failed).
+        """
         if not users:
             return
-        for u in users:
-            if u and isinstance(u, UserEdit):
-                u_copy = copy.deepcopy(u)
-                self.__users.append(u_copy)
+        self.__pending_records.extend(self.__iter_valid_records(users))
 
-    def save(self):
-        self.__validate_users()
-        # --------
+    def _prepare_for_save(self):
+        """
+        creates callable-chunks out of valid appended users
+        """
         if len(self.__invalid_records) > 0:
             ch_response = BulkResponse.invalid_records_chunk_response(self.__invalid_records)
             self.response.merge_chunk_response(ch_response)
         # --------
         if len(self.__pending_records):
             self.__chunkify()
-            for c_idx, ch in enumerate(self.chunks):
-                ss_logger.debug("triggering api call for chunk: %d", c_idx)
-                # do api call
-                ch.trigger()
-                # merge response
-                self.response.merge_chunk_response(ch.response)
         else:
             # if no records. i.e. len(invalid_records) and len(pending_records) both are 0
             # then add empty success response
             if len(self.__invalid_records) == 0:
                 self.response.merge_chunk_response(BulkResponse.empty_chunk_success_response())
+        # merged in response, not to be reported again by a later save_stream of this instance
+        self.__invalid_records = []
+
+    def _iter_stream_chunks(self, users: Iterable[UserEdit]):
+        """
+        validates users lazily (as chunks are pulled) and yields filled chunks
+        """
+        return iter_chunks(self.__iter_valid_records(users), lambda: _BulkUsersEditChunk(self.config))
+
+    def _iter_pending_chunks(self):
+        """
+        chunks of appended records, each record is released (by this instance) as it is put into a chunk
+        """
+        return iter_chunks(drain(self.__pending_records), lambda: _BulkUsersEditChunk(self.config))
+
+    def _start_streaming(self, on_chunk_complete: Callable):
+        self.__on_chunk_complete = on_chunk_complete
+        self.response.keep_failed_records = False
+
+    def _retry_chunks(self, response: BulkResponse, only_codes: Iterable[int] = None) -> List:
+        records = failed_records_to_retry(response, only_codes)
+        # records are sent as they were encoded when appended (changes made to them since are not sent)
+        codec = self.config.json_codec
+        sized_records = sized_records_as_sent(records, self.chunks + self.__retry_chunks,
+                                              lambda rec: get_apparent_identity_event_size_and_content(rec, codec))
+        chunks = list(iter_chunks(sized_records, lambda: _BulkUsersEditChunk(self.config)))
+        self.__retry_chunks.extend(chunks)
+        return chunks
+
+    @staticmethod
+    def _retry_response(chunks: List) -> BulkResponse:
+        retry_response = BulkResponse()
+        for ch in chunks:
+            retry_response.merge_chunk_response(ch.response)
+        if retry_response.status is None:
+            retry_response.merge_chunk_response(BulkResponse.empty_chunk_success_response())
+        return retry_response
+
+    def _merge_chunk(self, chunk):
+        self._merge_chunk_response(chunk.response)
+
+    def _merge_chunk_response(self, ch_response):
+        self.response.merge_chunk_response(ch_response)
+        if self.__on_chunk_complete is not None:
+            self.__on_chunk_complete(ch_response)
+
+    def _finish_stream(self):
+        if len(self.__invalid_records) > 0:
+            ch_response = BulkResponse.invalid_records_chunk_response(self.__invalid_records)
+            self._merge_chunk_response(ch_response)
+            self.__invalid_records = []
+        # if no records at all, add empty success response
+        if self.response.status is None:
+            self.response.merge_chunk_response(BulkResponse.empty_chunk_success_response())
+
+    def save_stream(self, users: Iterable[UserEdit], max_concurrency: int = 1, on_chunk_complete: Callable = None):
+        """
+        Validates, chunks and saves users as they are read from the iterable (e.g. a generator or db-cursor)
+        instead of holding all of them in memory. A chunk is sent as soon as it is full, so at most
+        max_concurrency + 2 chunks are held in memory at a time.
+        - users are not copied. Don't modify them after passing.
+        - users added using append() are not part of this call, and chunks are not kept in self.chunks.
+        - response of invalid users is merged at the end.
+        :param users: iterable of suprsend.UserEdit
+        :param max_concurrency: number of chunks (api calls) sent in parallel.
+        :param on_chunk_complete: if passed, called with result (response dict) of each chunk, in chunk order.
+            response keeps only counters (no failed_records) then.
+        """
+        if on_chunk_complete is not None:
+            self._start_streaming(on_chunk_complete)
+        trigger_chunks_stream(self._iter_stream_chunks(users), self._merge_chunk, max_concurrency)
+        self._finish_stream()
+        return self.response
+
+    def save(self, on_chunk_complete: Callable = None):
+        """
+        :param on_chunk_complete: streaming mode, for very large batches. If passed, called with result
+            (response dict) of each chunk in chunk order, after which the chunk (and its records) is released.
+            response keeps only counters (no failed_records), chunks are not kept in self.chunks.
+        """
+        if on_chunk_complete is not None:
+            self._start_streaming(on_chunk_complete)
+            trigger_chunks_stream(self._iter_pending_chunks(), self._merge_chunk)
+            self._finish_stream()
+            return self.response
+        self._prepare_for_save()
+        for c_idx, ch in enumerate(self.chunks):
+            ss_logger.debug("triggering api call for chunk: %d", c_idx)
+            # do api call
+            ch.trigger()
+            # merge response
+            self.response.merge_chunk_response(ch.response)
+        # -----
+        return self.response
+
+    def retry_failed(self, response: BulkResponse, only_codes: Iterable[int] = None) -> BulkResponse:
+        """
+        saves failed users of response (returned by save of this instance) again, with payloads as they were
+        sent, without validating them again.
+        :param only_codes: retry records failed with these codes. None: 429/5xx/timeouts.
+            records which failed validation are never retried.
+        :return: new BulkResponse, of retried records only
+        """
+        chunks = self._retry_chunks(response, only_codes)
+        for ch in chunks:
+            ch.trigger()
+        return self._retry_response(chunks)
+
+
+class AsyncBulkUsersEdit(BulkUsersEdit):
+    async def save_stream(self, users: Iterable[UserEdit], max_concurrency: int = 1,
+                          on_chunk_complete: Callable = None):
+        if on_chunk_complete is not None:
+            self._start_streaming(on_chunk_complete)
+        await async_trigger_chunks_stream(self._iter_stream_chunks(users), self._merge_chunk, max_concurrency)
+        self._finish_stream()
+        return self.response
+
+    async def save(self, on_chunk_complete: Callable = None):
+        if on_chunk_complete is not None:
+            self._start_streaming(on_chunk_complete)
+            await async_trigger_chunks_stream(self._iter_pending_chunks(), self._merge_chunk)
+            self._finish_stream()
+            return self.response
+        self._prepare_for_save()
+        for c_idx, ch in enumerate(self.chunks):
+            ss_logger.debug("triggering api call for chunk: %d", c_idx)
+            # do api call
+            await ch.async_trigger()
+            # merge response
+            self.response.merge_chunk_response(ch.response)
         # -----
         return self.response
+
+    async def retry_failed(self, response: BulkResponse, only_codes: Iterable[int] = None) -> BulkResponse:
+        chunks = self._retry_chunks(response, only_codes)
+        for ch in chunks:
+            await ch.async_trigger()
+        return self._retry_response(chunks)
@@ -1,9 +1,13 @@
-from typing import Dict
-import copy
-import json
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import collections
+import contextvars
 import jsonschema
+import sys
 import traceback
 import urllib.parse
+import uuid
 
 from .constants import (
     WORKFLOW_RUNTIME_KEYS_POTENTIAL_SIZE_IN_BYTES,
@@ -12,108 +16,181 @@ from .constants import (
 )
 from .exception import SuprsendValidationError, InputValueError
 from .request_schema import _get_schema_validator
+from .logger import ss_logger
+from .signature import json_encode
+from .json_codec import JsonCodec, default_json_codec
+from .attachment import LazyAttachment
+from .retry import is_retryable_failed_record
 
+# json-encoded record (see record_content)
+_EncodedContent = Union[bytes, "LazyEncodedRecord", None]
 
-def get_apparent_workflow_body_size(body: Dict, is_part_of_bulk: bool) -> int:
-    # ---
-    extra_bytes = WORKFLOW_RUNTIME_KEYS_POTENTIAL_SIZE_IN_BYTES
-    apparent_body = body
-    # ---
-    if body.get("data") and body["data"].get("$attachments"):
-        num_attachments = len(body["data"]["$attachments"])
-        if is_part_of_bulk:
-            if ALLOW_ATTACHMENTS_IN_BULK_API:
-                # if attachment is allowed in bulk api, then calculate size based on whether auto Upload is enabled
-                if ATTACHMENT_UPLOAD_ENABLED:
-                    # If auto upload enabled, To calculate size, replace attachment size with equivalent url size
-                    extra_bytes += num_attachments * ATTACHMENT_URL_POTENTIAL_SIZE_IN_BYTES
-                    # -- remove attachments->data key to calculate data size
-                    apparent_body = copy.deepcopy(body)
-                    for attach_data in apparent_body["data"]["$attachments"]:
-                        del attach_data["data"]
-                    # ----
-                else:
-                    # if auto upload is not enabled, attachment data will be passed as it is.
-                    pass
-            else:
-                # If attachment not allowed, then remove data->$attachments before calculating size
-                apparent_body = copy.deepcopy(body)
-                apparent_body["data"].pop("$attachments", None)
-        else:
-            if ATTACHMENT_UPLOAD_ENABLED:
-                # if auto upload enabled, to calculate size, replace attachment size with equivalent url size
-                extra_bytes += num_attachments * ATTACHMENT_URL_POTENTIAL_SIZE_IN_BYTES
-                # -- remove attachments->data key to calculate data size
-                apparent_body = copy.deepcopy(body)
-                for attach_data in apparent_body["data"]["$attachments"]:
-                    del attach_data["data"]
-                # ----
-            else:
-                # if auto upload is not enabled, attachment data will be passed as it is.
-                pass
 
-    # ---
-    body_size = len(json.dumps(apparent_body, ensure_ascii=False).encode('utf-8'))
-    apparent_body_size = body_size + extra_bytes
-    # --
+def get_apparent_workflow_body_size(body: Dict, is_part_of_bulk: bool, json_codec: JsonCodec = None) -> int:
+    apparent_body_size, _ = get_apparent_workflow_body_size_and_content(body, is_part_of_bulk, json_codec)
     return apparent_body_size
 
 
-def get_apparent_event_size(event: Dict, is_part_of_bulk: bool) -> int:
-    # ---
-    extra_bytes = 0
-    apparent_body = event
-    # ---
-    if event.get("properties") and event["properties"].get("$attachments"):
-        num_attachments = len(event["properties"]["$attachments"])
-        if is_part_of_bulk:
-            if ALLOW_ATTACHMENTS_IN_BULK_API:
-                # if attachment is allowed in bulk api, then calculate size based on whether auto Upload is enabled
-                if ATTACHMENT_UPLOAD_ENABLED:
-                    # If auto upload enabled, To calculate size, replace attachment size with equivalent url size
-                    extra_bytes += num_attachments * ATTACHMENT_URL_POTENTIAL_SIZE_IN_BYTES
-                    # -- remove attachments->data key to calculate data size
-                    apparent_body = copy.deepcopy(event)
-                    for attach_data in apparent_body["properties"]["$attachments"]:
-                        del attach_data["data"]
-                    # ----
-                else:
-                    # if auto upload is not enabled, attachment data will be passed as it is.
-                    pass
-            else:
-                # If attachment not allowed, then remove data->$attachments before calculating size
-                apparent_body = copy.deepcopy(event)
-                apparent_body["properties"].pop("$attachments", None)
-        else:
-            if ATTACHMENT_UPLOAD_ENABLED:
-                # if auto upload enabled, to calculate size, replace attachment size with equivalent url size
-                extra_bytes += num_attachments * ATTACHMENT_URL_POTENTIAL_SIZE_IN_BYTES
-                # -- remove attachments->data key to calculate data size
-                apparent_body = copy.deepcopy(event)
-                for attach_data in apparent_body["properties"]["$attachments"]:
-                    del attach_data["data"]
-                # ----
-            else:
-                # if auto upload is not enabled, attachment data will be passed as it is.
-                pass
+def get_apparent_workflow_body_size_and_content(body: Dict, is_part_of_bulk: bool,
+                                                json_codec: JsonCodec = None) -> Tuple[int, _EncodedContent]:
+    """
+    :return: apparent size, json-encoded body (LazyEncodedRecord if it has lazy attachments, None if attachments
+        are removed from body before sending). record_content() gives bytes to send.
+    """
+    return _get_apparent_size_and_content(body, "data", is_part_of_bulk, WORKFLOW_RUNTIME_KEYS_POTENTIAL_SIZE_IN_BYTES,
+                                          json_codec)
+
+
+def get_apparent_event_size(event: Dict, is_part_of_bulk: bool, json_codec: JsonCodec = None) -> int:
+    apparent_size, _ = get_apparent_event_size_and_content(event, is_part_of_bulk, json_codec)
+    return apparent_size
+
+
+def get_apparent_event_size_and_content(event: Dict, is_part_of_bulk: bool,
+                                        json_codec: JsonCodec = None) -> Tuple[int, _EncodedContent]:
+    """
+    :return: apparent size, json-encoded event (LazyEncodedRecord if it has lazy attachments, None if attachments
+        are removed from event before sending). record_content() gives bytes to send.
+    """
+    return _get_apparent_size_and_content(event, "properties", is_part_of_bulk, 0, json_codec)
+
+
+def _attachment_data_size(attachment: Dict, json_codec: JsonCodec) -> int:
+    """
+    bytes contributed by "data" key to json-encoded attachment i.e. len of `"data": "<base64-str>", `
+    """
+    if isinstance(attachment, LazyAttachment):
+        data_size = attachment.encoded_data_size + 2
+    elif "data" not in attachment:
+        return 0
+    else:
+        data = attachment["data"]
+        # base64 string has no character to escape, it is encoded as it is within quotes
+        data_size = len(data) + 2 if isinstance(data, str) else len(json_encode(data, json_codec))
+    return len(b'"data"') + len(json_codec.key_separator) + data_size + len(json_codec.item_separator)
+
+
+# stands in for a lazy attachment in encoded record, till it is spliced in. Random, so it can't clash with user data
+_LAZY_ATTACHMENT_MARKER = "$lazy-attachment:{}".format(uuid.uuid4().hex)
+
+
+class LazyEncodedRecord:
+    """
+    json-encoded record (snapshot taken when it is appended) whose lazy attachments are read and spliced in only
+    when it is rendered i.e. when it is sent or written to spool. Changes made to the record afterwards are not sent.
+    """
+    __slots__ = ("parts", "attachments")
+
+    def __init__(self, parts: List[bytes], attachments: List[LazyAttachment]):
+        # encoded record split at lazy attachments: len(parts) == len(attachments) + 1
+        self.parts = parts
+        self.attachments = attachments
+
+    def render(self, json_codec: JsonCodec = None) -> bytes:
+        """
+        :raises: OSError, InputValueError (attachment file can't be read)
+        """
+        out = [self.parts[0]]
+        for attachment, part in zip(self.attachments, self.parts[1:]):
+            out.append(json_encode(attachment.materialize(), json_codec))
+            out.append(part)
+        return b"".join(out)
+
+
+def _encode_with_lazy_attachments(body: Dict, json_codec: JsonCodec) -> LazyEncodedRecord:
+    attachments = []
+
+    def _marker(obj):
+        if isinstance(obj, LazyAttachment):
+            attachments.append(obj)
+            return _LAZY_ATTACHMENT_MARKER
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    content = json_encode(body, json_codec, default=_marker)
+    parts = content.split(b'"' + _LAZY_ATTACHMENT_MARKER.encode() + b'"')
+    # codec may encode body again after a failed attempt (orjson -> stdlib fallback) calling default again:
+    # attachments collected by the attempt that produced content are the last ones
+    attachments = attachments[len(attachments) - (len(parts) - 1):]
+    return LazyEncodedRecord(parts, attachments)
 
+
+def record_content(record: Dict, content, json_codec: JsonCodec = None) -> bytes:
+    """
+    json-encoded record, as sent: content returned by *_size_and_content() (bytes, LazyEncodedRecord or None)
+    """
+    if content is None:
+        return json_encode(record, json_codec)
+    if isinstance(content, LazyEncodedRecord):
+        return content.render(json_codec)
+    return content
+
+
+def has_lazy_content(contents: Iterable) -> bool:
+    """
+    whether rendering these contents reads (or waits for encoding of) attachment files i.e. may block
+    """
+    return any(isinstance(content, LazyEncodedRecord) for content in contents)
+
+
+def _get_apparent_size_and_content(body: Dict, attachments_parent_key: str, is_part_of_bulk: bool,
+                                   extra_bytes: int, json_codec: JsonCodec = None) -> Tuple[int, _EncodedContent]:
+    """
+    Size is calculated arithmetically from the encoded body and attachment metadata, body is never copied.
+    - attachments not allowed in bulk api: size is of body without body->attachments_parent_key->$attachments
+    - attachment auto upload enabled: attachment data is replaced by url, so url size is counted instead of data.
+    - lazy attachments: file is not read, size of its encoded content is derived from file size. Content is
+      LazyEncodedRecord: body is encoded now, file is read when it is rendered (see record_content).
+    """
+    json_codec = json_codec or default_json_codec
     # ---
-    body_size = len(json.dumps(apparent_body, ensure_ascii=False).encode('utf-8'))
-    apparent_size = body_size + extra_bytes
+    attachments = None
+    if body.get(attachments_parent_key):
+        attachments = body[attachments_parent_key].get("$attachments")
+    if attachments and is_part_of_bulk and not ALLOW_ATTACHMENTS_IN_BULK_API:
+        # attachments are removed before sending (in chunk). Calculate size on a shallow copy without them
+        parent = {k: v for k, v in body[attachments_parent_key].items() if k != "$attachments"}
+        apparent_body = {**body, attachments_parent_key: parent}
+        return len(json_encode(apparent_body, json_codec)) + extra_bytes, None
+    # ---
+    if attachments and any(isinstance(a, LazyAttachment) for a in attachments):
+        content = _encode_with_lazy_attachments(body, json_codec)
+        apparent_size = sum(len(part) for part in content.parts) + extra_bytes + \
+            sum(len(json_encode(a.placeholder_json(), json_codec)) + a.encoded_data_size
+                for a in content.attachments)
+    else:
+        content = json_encode(body, json_codec)
+        apparent_size = len(content) + extra_bytes
+    if attachments and ATTACHMENT_UPLOAD_ENABLED:
+        for attachment in attachments:
+            apparent_size += ATTACHMENT_URL_POTENTIAL_SIZE_IN_BYTES - _attachment_data_size(attachment, json_codec)
     # --
-    return apparent_size
+    return apparent_size, content
 
 
-def get_apparent_identity_event_size(event: Dict) -> int:
-    body_size = len(json.dumps(event, ensure_ascii=False).encode('utf-8'))
+def get_apparent_identity_event_size(event: Dict, json_codec: JsonCodec = None) -> int:
+    body_size, _ = get_apparent_identity_event_size_and_content(event, json_codec)
     return body_size
 
 
-def get_apparent_list_broadcast_body_size(body: Dict) -> int:
-    body_size = len(json.dumps(body, ensure_ascii=False).encode('utf-8'))
+def get_apparent_identity_event_size_and_content(event: Dict, json_codec: JsonCodec = None) -> Tuple[int, bytes]:
+    content = json_encode(event, json_codec)
+    return len(content), content
+
+
+def get_apparent_list_broadcast_body_size(body: Dict, json_codec: JsonCodec = None) -> int:
+    body_size, _ = get_apparent_list_broadcast_body_size_and_content(body, json_codec)
     return body_size
 
 
+def get_apparent_list_broadcast_body_size_and_content(body: Dict,
+                                                      json_codec: JsonCodec = None) -> Tuple[int, _EncodedContent]:
+    """
+    :return: apparent size, json-encoded body (LazyEncodedRecord if it has lazy attachments, file is not read).
+        record_content() gives bytes to send.
+    """
+    return _get_apparent_size_and_content(body, "data", False, 0, json_codec)
+
+
 def validate_workflow_body_schema(body: Dict) -> Dict:
     # --- In case data is not provided, set it to empty dict
     if body.get("data") is None:
@@ -180,10 +257,201 @@ def invalid_record_json(failed_record, err):
         # OR any other error
         err_str = traceback.format_exc()
     # ------
-    rec = {"record": failed_record, "error": err_str, "code": 500}
+    # error_type tells it apart from records which failed in api call (with same code)
+    rec = {"record": failed_record, "error": err_str, "code": 500, "error_type": "invalid_record"}
     return rec
 
 
+class LazyTraceback:
+    """
+    traceback of an exception, formatted only when str() is called on it. Frames are summarized when captured
+    (without reading source lines), so frames and their locals are not kept alive.
+    """
+    __slots__ = ("__tb_exception", "__formatted")
+
+    def __init__(self, ex: BaseException):
+        self.__tb_exception = traceback.TracebackException(type(ex), ex, ex.__traceback__, lookup_lines=False)
+        self.__formatted = None
+
+    def __str__(self):
+        if self.__formatted is None:
+            self.__formatted = "".join(self.__tb_exception.format())
+            self.__tb_exception = None
+        return self.__formatted
+
+    def __repr__(self):
+        return "LazyTraceback<{}>".format("formatted" if self.__formatted is not None else "not formatted")
+
+
+def compact_invalid_record_json(index: int, err, with_traceback: bool = False):
+    """
+    compact counterpart of invalid_record_json: instead of a copy of the record, its index in the input
+    (records passed to bulk instance), error message interned (so that records failing with same error
+    share one string) and, optionally, traceback formatted lazily.
+    """
+    if isinstance(err, (InputValueError,)):
+        err_str = str(err)
+    else:
+        err_str = "{}: {}".format(type(err).__name__, err)
+    rec = {"index": index, "error": sys.intern(err_str), "code": 500, "error_type": "invalid_record"}
+    if with_traceback and not isinstance(err, (InputValueError,)):
+        rec["traceback"] = LazyTraceback(err)
+    return rec
+
+
+def failed_records_to_retry(response, only_codes: Iterable[int] = None) -> List[Dict]:
+    """
+    records (as they were sent) of response.failed_records which failed with one of only_codes.
+    only_codes None: the ones which may succeed if sent again i.e. 429/5xx/timeouts.
+    Records which failed validation (never sent) are left out.
+    """
+    only_codes = set(only_codes) if only_codes is not None else None
+    records = []
+    for fr in response.failed_records:
+        if fr.get("error_type") == "invalid_record" or fr.get("record") is None:
+            continue
+        if (fr.get("code") in only_codes) if only_codes is not None else is_retryable_failed_record(fr):
+            records.append(fr["record"])
+    return records
+
+
+def sized_records_as_sent(records: List[Dict], chunks: Iterable, sizer: Callable) -> Iterator[Tuple]:
+    """
+    (record, size, content) of records as they were put into chunks i.e. encoded when appended, so that a retry
+    sends them exactly as they were sent. Records not found in chunks are sized & encoded again: sizer(record).
+    """
+    wanted = {id(rec) for rec in records}
+    as_sent = {}
+    for ch in chunks:
+        for sized in ch.sized_records():
+            if id(sized[0]) in wanted:
+                as_sent[id(sized[0])] = sized
+    for rec in records:
+        yield as_sent.get(id(rec)) or (rec, *sizer(rec))
+
+
+def drain(items: List) -> Iterator:
+    """
+    yields items of list, removing each from list as it is yielded, so that it can be released once consumed.
+    """
+    items.reverse()
+    while items:
+        yield items.pop()
+
+
+def iter_chunks(records: Iterable[Tuple], new_chunk: Callable) -> Iterator:
+    """
+    distributes records into chunks in a single pass (records are neither copied nor sliced).
+    A chunk is yielded as soon as a record doesn't fit into it, and the last chunk at the end.
+    :param records: tuples (record, size, ...) which are passed as it is to chunk.try_to_add_into_chunk
+    :param new_chunk: returns a new empty chunk
+    :raises: InputValueError (raised by try_to_add_into_chunk)
+    """
+    curr_chunk, curr_length = new_chunk(), 0
+    for rec in records:
+        if not curr_chunk.try_to_add_into_chunk(*rec):
+            yield curr_chunk
+            curr_chunk, curr_length = new_chunk(), 0
+            # an empty chunk always accepts a record which is within size limit
+            curr_chunk.try_to_add_into_chunk(*rec)
+        curr_length += 1
+    if curr_length:
+        yield curr_chunk
+
+
+def trigger_chunks(chunks: List, max_concurrency: int = 1):
+    """
+    makes api call for each bulk-chunk (chunk.trigger()). If max_concurrency > 1, upto max_concurrency
+    calls are made in parallel on a thread-pool. Response of each call is available in chunk.response.
+    Note: connection-pool size (pool_maxsize) should be >= max_concurrency, otherwise extra connections
+    are opened and discarded after each call.
+    """
+    if not max_concurrency or max_concurrency <= 1 or len(chunks) <= 1:
+        for c_idx, ch in enumerate(chunks):
+            ss_logger.debug("triggering api call for chunk: %d", c_idx)
+            ch.trigger()
+        return
+    # ---
+    def _trigger(c_idx):
+        ss_logger.debug("triggering api call for chunk: %d", c_idx)
+        chunks[c_idx].trigger()
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(chunks))) as executor:
+        # calls run in caller's context, so that timeout override (request_timeout) applies to them too.
+        # consume results to propagate exceptions (if any) to the caller
+        futures = [executor.submit(contextvars.copy_context().run, _trigger, c_idx) for c_idx in range(len(chunks))]
+        for future in futures:
+            future.result()
+
+
+async def async_trigger_chunks(chunks: List, max_concurrency: int = 1):
+    """
+    asyncio counterpart of trigger_chunks. keeps upto max_concurrency chunk.async_trigger() calls in-flight.
+    """
+    semaphore = asyncio.Semaphore(max(max_concurrency or 1, 1))
+
+    async def _trigger(c_idx):
+        async with semaphore:
+            ss_logger.debug("triggering api call for chunk: %d", c_idx)
+            await chunks[c_idx].async_trigger()
+
+    await asyncio.gather(*[_trigger(c_idx) for c_idx in range(len(chunks))])
+
+
+def trigger_chunks_stream(chunks: Iterable, on_chunk_done: Callable, max_concurrency: int = 1):
+    """
+    streaming counterpart of trigger_chunks. chunks are pulled from the iterable (e.g. iter_chunks generator)
+    only when there is room for one more in-flight api call, so only max_concurrency in-flight chunks (plus the
+    ones being filled/queued by the iterable) are held in memory. on_chunk_done(chunk) is called in chunk order,
+    after which the chunk is no longer referenced.
+    """
+    if not max_concurrency or max_concurrency <= 1:
+        for c_idx, ch in enumerate(chunks):
+            ss_logger.debug("triggering api call for chunk: %d", c_idx)
+            ch.trigger()
+            on_chunk_done(ch)
+        return
+    # ---
+    in_flight = collections.deque()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for c_idx, ch in enumerate(chunks):
+            if len(in_flight) >= max_concurrency:
+                future, done_ch = in_flight.popleft()
+                future.result()
+                on_chunk_done(done_ch)
+            ss_logger.debug("triggering api call for chunk: %d", c_idx)
+            # run in caller's context, so that timeout override (request_timeout) applies to the call
+            in_flight.append((executor.submit(contextvars.copy_context().run, ch.trigger), ch))
+        while in_flight:
+            future, done_ch = in_flight.popleft()
+            future.result()
+            on_chunk_done(done_ch)
+
+
+async def async_trigger_chunks_stream(chunks: Iterable, on_chunk_done: Callable, max_concurrency: int = 1):
+    """
+    asyncio counterpart of trigger_chunks_stream.
+    """
+    max_concurrency = max(max_concurrency or 1, 1)
+    in_flight = collections.deque()
+    try:
+        for c_idx, ch in enumerate(chunks):
+            if len(in_flight) >= max_concurrency:
+                task, done_ch = in_flight.popleft()
+                await task
+                on_chunk_done(done_ch)
+            ss_logger.debug("triggering api call for chunk: %d", c_idx)
+            in_flight.append((asyncio.ensure_future(ch.async_trigger()), ch))
+        while in_flight:
+            task, done_ch = in_flight.popleft()
+            await task
+            on_chunk_done(done_ch)
+    finally:
+        # in case of error, don't leave api calls running in background
+        for task, _ in in_flight:
+            task.cancel()
+
+
 def safe_get(lst, index, default=None):
     """
     method to safely get element from list
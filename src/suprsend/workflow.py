@@ -1,4 +1,3 @@
-import requests
 from typing import Dict
 from warnings import warn
 
@@ -6,8 +5,9 @@ from .constants import (
     BODY_MAX_APPARENT_SIZE_IN_BYTES, BODY_MAX_APPARENT_SIZE_IN_BYTES_READABLE,
 )
 from .exception import InputValueError
-from .utils import (get_apparent_workflow_body_size, validate_workflow_body_schema)
+from .utils import (get_apparent_workflow_body_size_and_content, validate_workflow_body_schema)
 from .signature import get_request_signature
+from .retry import has_idempotency_keys
 from .attachment import get_attachment_json
 from .logger import ss_logger
 
@@ -22,7 +22,12 @@ class Workflow:
         self.tenant_id = tenant_id
         self.brand_id = brand_id
 
-    def add_attachment(self, file_path: str, file_name: str = None, ignore_if_error: bool = False):
+    def add_attachment(self, file_path: str, file_name: str = None, ignore_if_error: bool = False,
+                       lazy: bool = False):
+        """
+        :param lazy: for local file, add only a reference to it (LazyAttachment). File is read and encoded
+            when the request is sent, instead of now.
+        """
         if self.body.get("data") is None:
             self.body["data"] = {}
         # if body["data"] is not a dict, not raising error while adding attachment.
@@ -31,7 +36,7 @@ class Workflow:
                                 "Workflow: %s", str(self.as_json()))
             return
         # ---
-        attachment = get_attachment_json(file_path, file_name, ignore_if_error)
+        attachment = get_attachment_json(file_path, file_name, ignore_if_error, lazy=lazy)
         if not attachment:
             return
         # --- add the attachment to body->data->$attachments
@@ -41,6 +46,14 @@ class Workflow:
         self.body["data"]["$attachments"].append(attachment)
 
     def get_final_json(self, config, is_part_of_bulk: bool = False):
+        body, apparent_size, _ = self.get_final_json_encoded(config, is_part_of_bulk)
+        return body, apparent_size
+
+    def get_final_json_encoded(self, config, is_part_of_bulk: bool = False):
+        """
+        same as get_final_json, additionally returns json-encoded body (bytes) produced while calculating size.
+        encoded body is None if size was calculated on a modified copy of the body.
+        """
         # add idempotency key in body if present
         if self.idempotency_key:
             self.body["$idempotency_key"] = self.idempotency_key
@@ -51,12 +64,13 @@ class Workflow:
         # --
         self.body = validate_workflow_body_schema(self.body)
         # ---- Check body size
-        apparent_size = get_apparent_workflow_body_size(self.body, is_part_of_bulk)
+        apparent_size, content = get_apparent_workflow_body_size_and_content(self.body, is_part_of_bulk,
+                                                                             config.json_codec)
         if apparent_size > BODY_MAX_APPARENT_SIZE_IN_BYTES:
             raise InputValueError(f"workflow body too big - {apparent_size} Bytes, "
                                   f"must not cross {BODY_MAX_APPARENT_SIZE_IN_BYTES_READABLE}")
         # ----
-        return self.body, apparent_size
+        return self.body, apparent_size, content
 
     def as_json(self):
         body_dict = {**self.body}
@@ -88,12 +102,13 @@ class _WorkflowTrigger:
             headers = self.config.default_headers()
             # Signature and Authorization-header
             content_txt, sig = get_request_signature(self.url, 'POST', workflow_body,
-                                                     headers, self.config.workspace_secret)
+                                                     headers, self.config.workspace_secret, self.config.json_codec)
             headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
             # -----
-            resp = requests.post(self.url,
+            resp = self.config.transport.post(self.url,
                                  data=content_txt.encode('utf-8'),
-                                 headers=headers)
+                                 headers=headers,
+                                 idempotent=has_idempotency_keys(workflow_body))
         except Exception as ex:
             error_str = ex.__str__()
             return {
@@ -1,60 +1,70 @@
-import requests
 from typing import Dict
 
 from .signature import get_request_signature
+from .retry import has_idempotency_keys
 from .workflow_request import WorkflowTriggerRequest
-from .workflow_trigger_bulk import BulkWorkflowTrigger
+from .workflow_trigger_bulk import BulkWorkflowTrigger, AsyncBulkWorkflowTrigger
 
 
 class WorkflowsApi:
     def __init__(self, config):
         self.config = config
         self.metadata = {"User-Agent": self.config.user_agent}
+        self.trigger_url = "{}trigger/".format(self.config.base_url)
 
     def trigger(self, workflow: WorkflowTriggerRequest) -> Dict:
         workflow_body, body_size = workflow.get_final_json(self.config, is_part_of_bulk=False)
         try:
             headers = self.config.default_headers()
-            url = "{}trigger/".format(self.config.base_url)
+            url = self.trigger_url
             # Signature and Authorization-header
             content_txt, sig = get_request_signature(url, 'POST', workflow_body,
-                                                     headers, self.config.workspace_secret)
+                                                     headers, self.config.workspace_secret, self.config.json_codec)
             headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
             # -----
-            resp = requests.post(url, data=content_txt.encode('utf-8'), headers=headers)
+            resp = self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers,
+                                              idempotent=has_idempotency_keys(workflow_body))
         except Exception as ex:
-            error_str = ex.__str__()
+            return self._error_response(ex)
+        else:
+            return self._parse_response(resp)
+
+    @staticmethod
+    def _error_response(ex: Exception) -> Dict:
+        error_str = ex.__str__()
+        return {
+            "success": False,
+            "status": "fail",
+            "status_code": 500,
+            "message": error_str,
+            "raw_response": None,
+        }
+
+    def _parse_response(self, resp) -> Dict:
+        ok_response = resp.status_code // 100 == 2
+        try:
+            resp_json = self.config.json_codec.loads(resp.content)
+        except ValueError:
+            resp_json = None
+        if ok_response:
+            return {
+                "success": True,
+                "status": "success",
+                "status_code": resp.status_code,
+                "message": resp_json.get("message_id") if resp_json else resp.text,
+                "raw_response": resp_json,
+            }
+        else:
             return {
                 "success": False,
                 "status": "fail",
-                "status_code": 500,
-                "message": error_str,
-                "raw_response": None,
+                "status_code": resp.status_code,
+                "message": resp_json.get("error", {}).get("message") if resp_json else resp.text,
+                "raw_response": resp_json,
             }
-        else:
-            ok_response = resp.status_code // 100 == 2
-            try:
-                resp_json = resp.json()
-            except ValueError:
-                resp_json = None
-            if ok_response:
-                return {
-                    "success": True,
-                    "status": "success",
-                    "status_code": resp.status_code,
-                    "message": resp_json.get("message_id") if resp_json else resp.text,
-                    "raw_response": resp_json,
-                }
-            else:
-                return {
-                    "success": False,
-                    "status": "fail",
-                    "status_code": resp.status_code,
-                    "message": resp_json.get("error", {}).get("message") if resp_json else resp.text,
-                    "raw_response": resp_json,
-                }
 
-    def bulk_trigger_instance(self):
+    def bulk_trigger_instance(self, attachment_workers: int = 0, attachment_use_processes: bool = False,
+                              compact_failed_records: bool = False, failed_record_tracebacks: bool = False):
         """
         USAGE:
         supr_client = Suprsend("__workspace_key__", "__workspace_secret__")
@@ -72,6 +82,45 @@ class WorkflowsApi:
         # call trigger
         response = bulk_ins.trigger()
 
+        :param attachment_workers: number of workers to read and encode lazy attachments of appended workflows
+            in parallel. 0: attachments are encoded one after another while chunk bodies are built.
+        :param attachment_use_processes: encode attachments in processes instead of threads (for large files)
+        :param compact_failed_records: keep index (in input) and error of invalid records, instead of their copy
+        :param failed_record_tracebacks: with compact_failed_records, keep lazily formatted traceback too
+        :return:
+        """
+        return BulkWorkflowTrigger(self.config, attachment_workers, attachment_use_processes,
+                                   compact_failed_records, failed_record_tracebacks)
+
+
+class AsyncWorkflowsApi(WorkflowsApi):
+    async def trigger(self, workflow: WorkflowTriggerRequest) -> Dict:
+        workflow_body, body_size = workflow.get_final_json(self.config, is_part_of_bulk=False)
+        try:
+            headers = self.config.default_headers()
+            url = self.trigger_url
+            # Signature and Authorization-header
+            content_txt, sig = get_request_signature(url, 'POST', workflow_body,
+                                                     headers, self.config.workspace_secret, self.config.json_codec)
+            headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
+            # -----
+            resp = await self.config.transport.post(url, data=content_txt.encode('utf-8'), headers=headers,
+                                                    idempotent=has_idempotency_keys(workflow_body))
+        except Exception as ex:
+            return self._error_response(ex)
+        else:
+            return self._parse_response(resp)
+
+    def bulk_trigger_instance(self, attachment_workers: int = 0, attachment_use_processes: bool = False,
+                              compact_failed_records: bool = False, failed_record_tracebacks: bool = False):
+        """
+        USAGE:
+        supr_client = AsyncSuprsend("__workspace_key__", "__workspace_secret__")
+        bulk_ins = supr_client.workflows.bulk_trigger_instance()
+        bulk_ins.append(*all_workflows)
+        response = await bulk_ins.trigger()
+
         :return:
         """
-        return BulkWorkflowTrigger(self.config)
+        return AsyncBulkWorkflowTrigger(self.config, attachment_workers, attachment_use_processes,
+                                        compact_failed_records, failed_record_tracebacks)
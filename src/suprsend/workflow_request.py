@@ -3,7 +3,7 @@ from .constants import (
 )
 from .exception import InputValueError
 from .attachment import get_attachment_json
-from .utils import (get_apparent_workflow_body_size, validate_workflow_trigger_body_schema)
+from .utils import (get_apparent_workflow_body_size_and_content, validate_workflow_trigger_body_schema)
 from .logger import ss_logger
 
 
@@ -16,7 +16,12 @@ class WorkflowTriggerRequest:
         self.tenant_id = tenant_id
         self.cancellation_key = cancellation_key
 
-    def add_attachment(self, file_path: str, file_name: str = None, ignore_if_error: bool = False):
+    def add_attachment(self, file_path: str, file_name: str = None, ignore_if_error: bool = False,
+                       lazy: bool = False):
+        """
+        :param lazy: for local file, add only a reference to it (LazyAttachment). File is read and encoded
+            when the request is sent (or written to spool), instead of now.
+        """
         if self.body.get("data") is None:
             self.body["data"] = {}
         # if body["data"] is not a dict, not raising error while adding attachment.
@@ -25,7 +30,7 @@ class WorkflowTriggerRequest:
                                 "WorkflowTriggerRequest: %s", str(self.as_json()))
             return
         # ---
-        attachment = get_attachment_json(file_path, file_name, ignore_if_error)
+        attachment = get_attachment_json(file_path, file_name, ignore_if_error, lazy=lazy)
         if not attachment:
             return
         # --- add the attachment to body->data->$attachments
@@ -35,6 +40,14 @@ class WorkflowTriggerRequest:
         self.body["data"]["$attachments"].append(attachment)
 
     def get_final_json(self, config, is_part_of_bulk: bool = False):
+        body, apparent_size, _ = self.get_final_json_encoded(config, is_part_of_bulk)
+        return body, apparent_size
+
+    def get_final_json_encoded(self, config, is_part_of_bulk: bool = False):
+        """
+        same as get_final_json, additionally returns json-encoded body (bytes) produced while calculating size.
+        encoded body is None if size was calculated on a modified copy of the body.
+        """
         # add idempotency key in body if present
         if self.idempotency_key:
             self.body["$idempotency_key"] = self.idempotency_key
@@ -45,12 +58,13 @@ class WorkflowTriggerRequest:
         # --
         self.body = validate_workflow_trigger_body_schema(self.body)
         # ---- Check body size
-        apparent_size = get_apparent_workflow_body_size(self.body, is_part_of_bulk)
+        apparent_size, content = get_apparent_workflow_body_size_and_content(self.body, is_part_of_bulk,
+                                                                             config.json_codec)
         if apparent_size > BODY_MAX_APPARENT_SIZE_IN_BYTES:
             raise InputValueError(f"workflow body too big - {apparent_size} Bytes, "
                                   f"must not cross {BODY_MAX_APPARENT_SIZE_IN_BYTES_READABLE}")
         # ----
-        return self.body, apparent_size
+        return self.body, apparent_size, content
 
     def as_json(self):
         body_dict = {**self.body}
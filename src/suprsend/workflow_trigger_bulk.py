@@ -1,6 +1,5 @@
-import requests
-import copy
-from typing import List, Dict
+import asyncio
+from typing import Callable, List, Dict, Iterable, Iterator, Tuple
 
 from .constants import (
     BODY_MAX_APPARENT_SIZE_IN_BYTES,
@@ -9,11 +8,16 @@ from .constants import (
     ALLOW_ATTACHMENTS_IN_BULK_API,
 )
 from .exception import InputValueError
-from .signature import get_request_signature
-from .utils import invalid_record_json, safe_get
+from .attachment import AttachmentEncoder
+from .signature import get_request_signature_for_md5, join_json_array
+from .retry import has_idempotency_keys
+from .utils import (invalid_record_json, compact_invalid_record_json, safe_get, trigger_chunks,
+                    async_trigger_chunks, iter_chunks, trigger_chunks_stream, async_trigger_chunks_stream,
+                    failed_records_to_retry, sized_records_as_sent, drain, record_content, has_lazy_content,
+                    get_apparent_workflow_body_size_and_content)
 from .bulk_response import BulkResponse
+from .spool import SPOOL_KIND_WORKFLOW_TRIGGER
 from .workflow_request import WorkflowTriggerRequest
-from .logger import ss_logger
 
 
 class _BulkWorkflowTriggerChunk:
@@ -25,17 +29,35 @@ class _BulkWorkflowTriggerChunk:
         self.config = config
         self.__url = self.url = "{}trigger/".format(self.config.base_url)
         self.__chunk = []
+        self.__chunk_content = []
+        self.__chunk_sizes = []
         #
         self.__running_size = 0
         self.__running_length = 0
         self.response = None
 
-    def __add_body_to_chunk(self, body, body_size):
+    @property
+    def records(self) -> List[Dict]:
+        return self.__chunk
+
+    def __add_body_to_chunk(self, body, body_size, body_content):
         # First add size, then body to reduce effects of race condition
         self.__running_size += body_size
         self.__chunk.append(body)
+        self.__chunk_content.append(body_content)
+        self.__chunk_sizes.append(body_size)
         self.__running_length += 1
 
+    def __iter_chunk_content(self):
+        for record, content in zip(self.__chunk, self.__chunk_content):
+            yield record_content(record, content, self.config.json_codec)
+
+    def sized_records(self) -> Iterator[Tuple]:
+        """
+        (record, size, content) of records as they were added, to send them again exactly as they were sent
+        """
+        return zip(self.__chunk, self.__chunk_sizes, self.__chunk_content)
+
     def __check_limit_reached(self):
         if self.__running_length >= self._max_records_in_chunk or \
                 self.__running_size >= self._chunk_apparent_size_in_bytes:
@@ -43,12 +65,13 @@ class _BulkWorkflowTriggerChunk:
         else:
             return False
 
-    def try_to_add_into_chunk(self, body: Dict, body_size: int) -> bool:
+    def try_to_add_into_chunk(self, body: Dict, body_size: int, body_content: bytes = None) -> bool:
         """
         returns whether passed body was able to get added to this chunk or not,
         if true, body gets added to chunk
         :param body:
         :param body_size:
+        :param body_content: json-encoded body (if already available). if None, body is encoded here.
         :return:
         :raises: InputValueError
         """
@@ -65,125 +88,358 @@ class _BulkWorkflowTriggerChunk:
             return False
 
         if not ALLOW_ATTACHMENTS_IN_BULK_API:
-            body["data"].pop("$attachments", None)
+            if body["data"].pop("$attachments", None) is not None:
+                body_content = None
 
         # Add workflow to chunk
-        self.__add_body_to_chunk(body, body_size)
+        self.__add_body_to_chunk(body, body_size, body_content)
         return True
 
-    def trigger(self):
+    def __signed_request(self):
         headers = self.config.default_headers()
+        # records were json-encoded once while calculating their size, join them to build body.
+        # lazy attachments are read and spliced in now
+        data, content_md5 = join_json_array(self.__iter_chunk_content(), self.config.json_codec)
+        data, content_md5 = self.config._encode_bulk_body(data, content_md5, headers)
         # Signature and Authorization-header
-        content_txt, sig = get_request_signature(self.__url, 'POST', self.__chunk, headers,
-                                                 self.config.workspace_secret)
+        sig = get_request_signature_for_md5(self.__url, 'POST', content_md5, headers, self.config.workspace_secret)
         headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
-        # -----
+        return data, headers
+
+    def trigger(self):
+        try:
+            data, headers = self.__signed_request()
+            resp = self.config.transport.post(self.__url, data=data, headers=headers,
+                                              idempotent=has_idempotency_keys(*self.__chunk),
+                                              timeout=self.config.transport.bulk_timeout)
+        except Exception as ex:
+            self.__set_error_response(ex)
+        else:
+            self.__set_api_response(resp)
+
+    async def async_trigger(self):
         try:
-            resp = requests.post(self.__url,
-                                 data=content_txt.encode('utf-8'),
-                                 headers=headers)
+            if has_lazy_content(self.__chunk_content):
+                # reading and encoding files of lazy attachments would block the event loop
+                data, headers = await asyncio.get_running_loop().run_in_executor(None, self.__signed_request)
+            else:
+                data, headers = self.__signed_request()
+            resp = await self.config.transport.post(self.__url, data=data, headers=headers,
+                                                    idempotent=has_idempotency_keys(*self.__chunk),
+                                                    timeout=self.config.transport.bulk_timeout)
         except Exception as ex:
-            error_str = ex.__str__()
+            self.__set_error_response(ex)
+        else:
+            self.__set_api_response(resp)
+
+    def __set_error_response(self, ex: Exception):
+        self.response = BulkResponse.error_chunk_response(self.__chunk, ex)
+
+    def __set_api_response(self, resp):
+        # if every record carries $idempotency_key, 429/5xx are retried by transport (as per its retry_policy)
+        # and this is response of the last attempt. Otherwise chunk is sent only once.
+        ok_response = resp.status_code // 100 == 2
+        try:
+            resp_json = self.config.json_codec.loads(resp.content)
+        except ValueError:
+            resp_json = None
+        if ok_response and not BulkResponse.is_bulk_api_v2_response(resp_json):
+            self.response = BulkResponse.unexpected_response_chunk_response(self.__chunk, resp.status_code, resp.text)
+        elif ok_response:
+            parsed_resp = BulkResponse.parse_bulk_api_v2_response(resp_json)
+            self.response = {
+                "status": parsed_resp["status"],
+                "status_code": resp.status_code,
+                "total": parsed_resp["total"],
+                "success": parsed_resp["success"],
+                "failure": parsed_resp["failure"],
+                "failed_records": [
+                    {"record": safe_get(self.__chunk, idx), "error": record["error"]["message"], "code": record["status_code"]}
+                    for idx, record in enumerate(parsed_resp["records"]) if record["status"] == "error"],
+                "raw_response": resp_json
+            }
+        else:
             self.response = {
                 "status": "fail",
-                "status_code": 500,
+                "status_code": resp.status_code,
                 "total": len(self.__chunk),
                 "success": 0,
                 "failure": len(self.__chunk),
-                "failed_records": [{"record": c, "error": error_str, "code": 500} for c in self.__chunk],
-                "raw_response": None,
+                "failed_records": [
+                    {"record": c, "error": (resp_json.get("error", {}).get("message") if isinstance(resp_json, dict) else resp.text), "code": resp.status_code}
+                    for c in self.__chunk],
+                "raw_response": resp_json
             }
-        else:
-            # TODO: handle 500/503 errors
-            ok_response = resp.status_code // 100 == 2
-            try:
-                resp_json = resp.json()
-            except ValueError:
-                resp_json = None
-            if ok_response:
-                parsed_resp = BulkResponse.parse_bulk_api_v2_response(resp_json)
-                self.response = {
-                    "status": parsed_resp["status"],
-                    "status_code": resp.status_code,
-                    "total": parsed_resp["total"],
-                    "success": parsed_resp["success"],
-                    "failure": parsed_resp["failure"],
-                    "failed_records": [
-                        {"record": safe_get(self.__chunk, idx), "error": record["error"]["message"], "code": record["status_code"]}
-                        for idx, record in enumerate(parsed_resp["records"]) if record["status"] == "error"],
-                    "raw_response": resp_json
-                }
-            else:
-                self.response = {
-                    "status": "fail",
-                    "status_code": resp.status_code,
-                    "total": len(self.__chunk),
-                    "success": 0,
-                    "failure": len(self.__chunk),
-                    "failed_records": [
-                        {"record": c, "error": (resp_json.get("error", {}).get("message") if resp_json else resp.text), "code": resp.status_code}
-                        for c in self.__chunk],
-                    "raw_response": resp_json
-                }
 
 
 class BulkWorkflowTrigger:
-    def __init__(self, config):
+    def __init__(self, config, attachment_workers: int = 0, attachment_use_processes: bool = False,
+                 compact_failed_records: bool = False, failed_record_tracebacks: bool = False):
+        """
+        :param attachment_workers: if > 0, lazy attachments (add_attachment(..., lazy=True)) of appended workflows
+            are read and encoded on these many workers, in parallel with validation of workflows appended later.
+        :param attachment_use_processes: use processes instead of threads for encoding. Suitable for large files.
+        :param compact_failed_records: invalid records (failing validation) are kept in failed_records as
+            {"index": index-in-input, "error": interned error message, "code": 500, "error_type": "invalid_record"}
+            instead of a copy of the record with its formatted traceback. index counts every item passed to
+            append/trigger_stream of this instance, in order.
+        :param failed_record_tracebacks: with compact_failed_records, also keep traceback of the error under
+            "traceback" key, formatted only when str() is called on it.
+        """
         self.config = config
-        self.__workflows = []
+        self.compact_failed_records = compact_failed_records
+        self.failed_record_tracebacks = failed_record_tracebacks
+        self.__attachment_encoder = None
+        if attachment_workers > 0 and ALLOW_ATTACHMENTS_IN_BULK_API:
+            self.__attachment_encoder = AttachmentEncoder(attachment_workers, attachment_use_processes)
         self.__pending_records = []
+        # records are written to spool (if configured) when appended, till they are delivered
+        self.__spooled = config._spooled_records(SPOOL_KIND_WORKFLOW_TRIGGER)
         self.chunks = []
+        # chunks made by retry_failed, to retry their records again as they were sent
+        self.__retry_chunks = []
         self.response = BulkResponse()
+        # streaming mode: result of each chunk is reported to this callback, response keeps counters only
+        self.__on_chunk_complete = None
         # invalid_record json: {"record": workflow-json, "error": error_str, "code": 500}
         self.__invalid_records = []
+        # index (in input) of next record passed to append/trigger_stream
+        self.__input_index = 0
 
-    def __validate_workflows(self):
-        for wf in self.__workflows:
-            try:
-                wf_body, body_size = wf.get_final_json(self.config, is_part_of_bulk=True)
-                self.__pending_records.append((wf_body, body_size))
-            except Exception as ex:
+    def __validate_workflow(self, wf, index: int):
+        """
+        returns (workflow-body, size, encoded-body) if workflow is valid, else adds it to invalid records.
+        """
+        try:
+            rec = wf.get_final_json_encoded(self.config, is_part_of_bulk=True)
+        except Exception as ex:
+            if self.compact_failed_records:
+                inv_rec = compact_invalid_record_json(index, ex, self.failed_record_tracebacks)
+            else:
                 inv_rec = invalid_record_json(wf.as_json(), ex)
-                self.__invalid_records.append(inv_rec)
-
-    def __chunkify(self, start_idx=0):
-        curr_chunk = _BulkWorkflowTriggerChunk(self.config)
-        self.chunks.append(curr_chunk)
-        for rel_idx, rec in enumerate(self.__pending_records[start_idx:]):
-            is_added = curr_chunk.try_to_add_into_chunk(rec[0], rec[1])
-            if not is_added:
-                # create chunks from remaining records
-                self.__chunkify(start_idx=(start_idx + rel_idx))
-                # Don't forget to break. As current loop must not continue further
-                break
+            self.__invalid_records.append(inv_rec)
+        else:
+            if self.__attachment_encoder is not None:
+                self.__attachment_encoder.submit_all(rec[0]["data"].get("$attachments"))
+            return rec
+
+    def __iter_valid_records(self, workflows: Iterable[WorkflowTriggerRequest]):
+        """
+        validates workflows one by one, yields (payload, size, encoded-payload) of valid ones
+        """
+        for wf in workflows:
+            index = self.__input_index
+            self.__input_index += 1
+            if wf and isinstance(wf, WorkflowTriggerRequest):
+                rec = self.__validate_workflow(wf, index)
+                if rec:
+                    yield rec
+
+    def _shutdown_attachment_encoder(self):
+        # all attachments have been materialized by now (chunk bodies are built)
+        if self.__attachment_encoder is not None:
+            self.__attachment_encoder.shutdown()
+
+    def __chunkify(self):
+        self.chunks.extend(iter_chunks(self.__pending_records, lambda: _BulkWorkflowTriggerChunk(self.config)))
 
     def append(self, *workflows):
+        """
+        workflows are validated and serialized when appended (instead of keeping a deep-copy till trigger),
+        so changes made to a workflow after appending it are not sent (not even by retry_failed). Only files of
+        lazy attachments are read later, when the workflow is sent (or written to spool).
+        """
         if not workflows:
             return
-        for wf in workflows:
-            if wf and isinstance(wf, WorkflowTriggerRequest):
-                wf_copy = copy.deepcopy(wf)
-                self.__workflows.append(wf_copy)
+        valid_records = list(self.__iter_valid_records(workflows))
+        if self.__spooled is not None:
+            valid_records = self.__spooled.add(valid_records)
+        self.__pending_records.extend(valid_records)
 
-    def trigger(self):
-        self.__validate_workflows()
-        # --------
+    def _prepare_for_trigger(self):
+        """
+        creates callable-chunks out of valid appended workflows
+        """
         if len(self.__invalid_records) > 0:
             ch_response = BulkResponse.invalid_records_chunk_response(self.__invalid_records)
             self.response.merge_chunk_response(ch_response)
         # --------
         if len(self.__pending_records):
             self.__chunkify()
-            for c_idx, ch in enumerate(self.chunks):
-                ss_logger.debug("triggering api call for chunk: %d", c_idx)
-                # do api call
-                ch.trigger()
-                # merge response
-                self.response.merge_chunk_response(ch.response)
         else:
             # if no records. i.e. len(invalid_records) and len(pending_records) both are 0
             # then add empty success response
             if len(self.__invalid_records) == 0:
                 self.response.merge_chunk_response(BulkResponse.empty_chunk_success_response())
+        # merged in response, not to be reported again by a later trigger_stream of this instance
+        self.__invalid_records = []
+
+    def _iter_stream_chunks(self, workflows: Iterable[WorkflowTriggerRequest]):
+        """
+        validates workflows lazily (as chunks are pulled) and yields filled chunks
+        """
+        return iter_chunks(self.__iter_valid_records(workflows), lambda: _BulkWorkflowTriggerChunk(self.config))
+
+    def _iter_pending_chunks(self):
+        """
+        chunks of appended records, each record is released (by this instance) as it is put into a chunk
+        """
+        return iter_chunks(drain(self.__pending_records), lambda: _BulkWorkflowTriggerChunk(self.config))
+
+    def _start_streaming(self, on_chunk_complete: Callable):
+        self.__on_chunk_complete = on_chunk_complete
+        self.response.keep_failed_records = False
+
+    def _settle_spooled(self):
+        # delivered records are removed from spool, the ones failed with a retryable error are kept for replay
+        if self.__spooled is not None:
+            self.__spooled.settle(self.response.failed_records)
+
+    def _release_unsettled(self):
+        # records of chunks not sent (or not reported) e.g. when on_chunk_complete raised, are left for replay
+        if self.__spooled is not None:
+            self.__spooled.release_unsettled()
+
+    def _retry_chunks(self, response: BulkResponse, only_codes: Iterable[int] = None) -> List:
+        records = failed_records_to_retry(response, only_codes)
+        if self.__spooled is not None:
+            # records are in spool (released on failure), claim them back
+            records = self.__spooled.reclaim(records)
+        # records are sent as they were encoded when appended (changes made to them since are not sent)
+        codec = self.config.json_codec
+        sized_records = sized_records_as_sent(records, self.chunks + self.__retry_chunks,
+                                              lambda rec: get_apparent_workflow_body_size_and_content(rec, True, codec))
+        chunks = list(iter_chunks(sized_records, lambda: _BulkWorkflowTriggerChunk(self.config)))
+        self.__retry_chunks.extend(chunks)
+        return chunks
+
+    def _retry_response(self, chunks: List) -> BulkResponse:
+        retry_response = BulkResponse()
+        for ch in chunks:
+            retry_response.merge_chunk_response(ch.response)
+        if retry_response.status is None:
+            retry_response.merge_chunk_response(BulkResponse.empty_chunk_success_response())
+        if self.__spooled is not None:
+            self.__spooled.settle(retry_response.failed_records)
+        return retry_response
+
+    def _merge_chunk(self, chunk):
+        if self.__on_chunk_complete is not None and self.__spooled is not None:
+            # streaming mode: failed_records are not kept till the end, so records are settled chunk by chunk
+            self.__spooled.settle(chunk.response["failed_records"], chunk.records)
+        self._merge_chunk_response(chunk.response)
+
+    def _merge_chunk_response(self, ch_response):
+        self.response.merge_chunk_response(ch_response)
+        if self.__on_chunk_complete is not None:
+            self.__on_chunk_complete(ch_response)
+
+    def _finish_stream(self):
+        if len(self.__invalid_records) > 0:
+            ch_response = BulkResponse.invalid_records_chunk_response(self.__invalid_records)
+            self._merge_chunk_response(ch_response)
+            self.__invalid_records = []
+        # if no records at all, add empty success response
+        if self.response.status is None:
+            self.response.merge_chunk_response(BulkResponse.empty_chunk_success_response())
+
+    def trigger_stream(self, workflows: Iterable[WorkflowTriggerRequest], max_concurrency: int = 1,
+                       on_chunk_complete: Callable = None):
+        """
+        Validates, chunks and triggers workflows as they are read from the iterable (e.g. a generator or
+        db-cursor) instead of holding all of them in memory. A chunk is sent as soon as it is full, so at most
+        max_concurrency + 2 chunks are held in memory at a time.
+        - workflows are not copied. Don't modify them after passing.
+        - workflows added using append() are not part of this call, and chunks are not kept in self.chunks.
+        - records are not written to spool.
+        - response of invalid workflows is merged at the end.
+        :param workflows: iterable of suprsend.WorkflowTriggerRequest
+        :param max_concurrency: number of chunks (api calls) sent in parallel.
+        :param on_chunk_complete: if passed, called with result (response dict) of each chunk, in chunk order.
+            response keeps only counters (no failed_records) then.
+        """
+        if on_chunk_complete is not None:
+            self._start_streaming(on_chunk_complete)
+        trigger_chunks_stream(self._iter_stream_chunks(workflows), self._merge_chunk, max_concurrency)
+        self._shutdown_attachment_encoder()
+        self._finish_stream()
+        return self.response
+
+    def trigger(self, max_concurrency: int = 1, on_chunk_complete: Callable = None):
+        """
+        :param max_concurrency: number of chunks (api calls) in-flight at a time. default 1 i.e. one after another.
+            failed_records in response are ordered by chunk, irrespective of the order in which the calls complete.
+        :param on_chunk_complete: streaming mode, for very large batches. If passed, called with result
+            (response dict) of each chunk in chunk order, after which the chunk (and its records) is released.
+            response keeps only counters (no failed_records), chunks are not kept in self.chunks.
+        """
+        if on_chunk_complete is not None:
+            self._start_streaming(on_chunk_complete)
+            try:
+                trigger_chunks_stream(self._iter_pending_chunks(), self._merge_chunk, max_concurrency)
+            finally:
+                self._release_unsettled()
+            self._shutdown_attachment_encoder()
+            self._finish_stream()
+            return self.response
+        self._prepare_for_trigger()
+        # do api call
+        trigger_chunks(self.chunks, max_concurrency)
+        self._shutdown_attachment_encoder()
+        # merge response
+        for ch in self.chunks:
+            self.response.merge_chunk_response(ch.response)
+        self._settle_spooled()
         # -----
         return self.response
+
+    def retry_failed(self, response: BulkResponse, only_codes: Iterable[int] = None,
+                     max_concurrency: int = 1) -> BulkResponse:
+        """
+        sends failed records of response (returned by trigger of this instance) again, as they were sent i.e.
+        with same $insert_id/$idempotency_key, without validating them again.
+        :param only_codes: retry records failed with these codes. None: 429/5xx/timeouts.
+            records which failed validation are never retried.
+        :return: new BulkResponse, of retried records only
+        """
+        chunks = self._retry_chunks(response, only_codes)
+        trigger_chunks(chunks, max_concurrency)
+        return self._retry_response(chunks)
+
+
+class AsyncBulkWorkflowTrigger(BulkWorkflowTrigger):
+    async def trigger_stream(self, workflows: Iterable[WorkflowTriggerRequest], max_concurrency: int = 1,
+                             on_chunk_complete: Callable = None):
+        if on_chunk_complete is not None:
+            self._start_streaming(on_chunk_complete)
+        await async_trigger_chunks_stream(self._iter_stream_chunks(workflows), self._merge_chunk, max_concurrency)
+        self._shutdown_attachment_encoder()
+        self._finish_stream()
+        return self.response
+
+    async def trigger(self, max_concurrency: int = 1, on_chunk_complete: Callable = None):
+        if on_chunk_complete is not None:
+            self._start_streaming(on_chunk_complete)
+            try:
+                await async_trigger_chunks_stream(self._iter_pending_chunks(), self._merge_chunk, max_concurrency)
+            finally:
+                self._release_unsettled()
+            self._shutdown_attachment_encoder()
+            self._finish_stream()
+            return self.response
+        self._prepare_for_trigger()
+        # do api call
+        await async_trigger_chunks(self.chunks, max_concurrency)
+        self._shutdown_attachment_encoder()
+        # merge response
+        for ch in self.chunks:
+            self.response.merge_chunk_response(ch.response)
+        self._settle_spooled()
+        # -----
+        return self.response
+
+    async def retry_failed(self, response: BulkResponse, only_codes: Iterable[int] = None,
+                           max_concurrency: int = 1) -> BulkResponse:
+        chunks = self._retry_chunks(response, only_codes)
+        await async_trigger_chunks(chunks, max_concurrency)
+        return self._retry_response(chunks)
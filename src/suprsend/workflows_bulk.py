@@ -1,5 +1,3 @@
-import requests
-import copy
 from typing import List, Dict
 
 from .constants import (
@@ -9,8 +7,9 @@ from .constants import (
     ALLOW_ATTACHMENTS_IN_BULK_API,
 )
 from .exception import InputValueError
-from .signature import get_request_signature
-from .utils import invalid_record_json
+from .signature import get_request_signature_for_md5, join_json_array
+from .retry import has_idempotency_keys
+from .utils import invalid_record_json, iter_chunks, record_content
 from .bulk_response import BulkResponse
 from .workflow import Workflow
 from .logger import ss_logger
@@ -52,6 +51,7 @@ class _BulkWorkflowsChunk:
     def __init__(self, config):
         self.config = config
         self.__chunk = []
+        self.__chunk_content = []
         self.__url = self.__get_url()
         #
         self.__running_size = 0
@@ -62,12 +62,17 @@ class _BulkWorkflowsChunk:
         url_formatted = "{}{}/trigger/".format(self.config.base_url, self.config.workspace_key)
         return url_formatted
 
-    def __add_body_to_chunk(self, body, body_size):
+    def __add_body_to_chunk(self, body, body_size, body_content):
         # First add size, then body to reduce effects of race condition
         self.__running_size += body_size
         self.__chunk.append(body)
+        self.__chunk_content.append(body_content)
         self.__running_length += 1
 
+    def __iter_chunk_content(self):
+        for record, content in zip(self.__chunk, self.__chunk_content):
+            yield record_content(record, content, self.config.json_codec)
+
     def __check_limit_reached(self):
         if self.__running_length >= self._max_records_in_chunk or \
                 self.__running_size >= self._chunk_apparent_size_in_bytes:
@@ -75,12 +80,13 @@ class _BulkWorkflowsChunk:
         else:
             return False
 
-    def try_to_add_into_chunk(self, body: Dict, body_size: int) -> bool:
+    def try_to_add_into_chunk(self, body: Dict, body_size: int, body_content: bytes = None) -> bool:
         """
         returns whether passed body was able to get added to this chunk or not,
         if true, body gets added to chunk
         :param body:
         :param body_size:
+        :param body_content: json-encoded body (if already available). if None, body is encoded here.
         :return:
         :raises: InputValueError
         """
@@ -97,35 +103,33 @@ class _BulkWorkflowsChunk:
             return False
 
         if not ALLOW_ATTACHMENTS_IN_BULK_API:
-            body["data"].pop("$attachments", None)
+            if body["data"].pop("$attachments", None) is not None:
+                body_content = None
 
         # Add workflow to chunk
-        self.__add_body_to_chunk(body, body_size)
+        self.__add_body_to_chunk(body, body_size, body_content)
         return True
 
     def trigger(self):
         headers = self.config.default_headers()
-        # Signature and Authorization-header
-        content_txt, sig = get_request_signature(self.__url, 'POST', self.__chunk, headers,
-                                                 self.config.workspace_secret)
-        headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
-        # -----
         try:
-            resp = requests.post(self.__url,
-                                 data=content_txt.encode('utf-8'),
-                                 headers=headers)
+            # records were json-encoded once while calculating their size, join them to build body.
+            # lazy attachments are read and spliced in now
+            data, content_md5 = join_json_array(self.__iter_chunk_content(), self.config.json_codec)
+            data, content_md5 = self.config._encode_bulk_body(data, content_md5, headers)
+            # Signature and Authorization-header
+            sig = get_request_signature_for_md5(self.__url, 'POST', content_md5, headers,
+                                                self.config.workspace_secret)
+            headers["Authorization"] = "{}:{}".format(self.config.workspace_key, sig)
+            # -----
+            resp = self.config.transport.post(self.__url, data=data, headers=headers,
+                                              idempotent=has_idempotency_keys(*self.__chunk),
+                                              timeout=self.config.transport.bulk_timeout)
         except Exception as ex:
-            error_str = ex.__str__()
-            self.response = {
-                "status": "fail",
-                "status_code": 500,
-                "total": len(self.__chunk),
-                "success": 0,
-                "failure": len(self.__chunk),
-                "failed_records": [{"record": c, "error": error_str, "code": 500} for c in self.__chunk]
-            }
+            self.response = BulkResponse.error_chunk_response(self.__chunk, ex)
         else:
-            # TODO: handle 500/503 errors
+            # if every record carries $idempotency_key, 429/5xx are retried by transport (as per its retry_policy)
+            # and this is response of the last attempt. Otherwise chunk is sent only once.
             ok_response = resp.status_code // 100 == 2
             if ok_response:
                 self.response = {
@@ -152,44 +156,39 @@ class _BulkWorkflowsChunk:
 class BulkWorkflows:
     def __init__(self, config):
         self.config = config
-        self.__workflows = []
         self.__pending_records = []
         self.chunks = []
         self.response = BulkResponse()
         # invalid_record json: {"record": workflow-json, "error": error_str, "code": 500}
         self.__invalid_records = []
 
-    def __validate_workflows(self):
-        for wf in self.__workflows:
-            try:
-                wf_body, body_size = wf.get_final_json(self.config, is_part_of_bulk=True)
-                self.__pending_records.append((wf_body, body_size))
-            except Exception as ex:
-                inv_rec = invalid_record_json(wf.as_json(), ex)
-                self.__invalid_records.append(inv_rec)
-
-    def __chunkify(self, start_idx=0):
-        curr_chunk = _BulkWorkflowsChunk(self.config)
-        self.chunks.append(curr_chunk)
-        for rel_idx, rec in enumerate(self.__pending_records[start_idx:]):
-            is_added = curr_chunk.try_to_add_into_chunk(rec[0], rec[1])
-            if not is_added:
-                # create chunks from remaining records
-                self.__chunkify(start_idx=(start_idx + rel_idx))
-                # Don't forget to break. As current loop must not continue further
-                break
+    def __validate_workflow(self, wf):
+        """
+        returns (workflow-body, size, encoded-body) if workflow is valid, else adds it to invalid records.
+        """
+        try:
+            return wf.get_final_json_encoded(self.config, is_part_of_bulk=True)
+        except Exception as ex:
+            inv_rec = invalid_record_json(wf.as_json(), ex)
+            self.__invalid_records.append(inv_rec)
+
+    def __chunkify(self):
+        self.chunks.extend(iter_chunks(self.__pending_records, lambda: _BulkWorkflowsChunk(self.config)))
 
     def append(self, *workflows):
+        """
+        workflows are validated and serialized when appended (instead of keeping a deep-copy till trigger),
+        so changes made to a workflow after appending it are not sent.
+        """
         if not workflows:
             return
         for wf in workflows:
             if wf and isinstance(wf, Workflow):
-                wf_copy = copy.deepcopy(wf)
-                self.__workflows.append(wf_copy)
+                rec = self.__validate_workflow(wf)
+                if rec:
+                    self.__pending_records.append(rec)
 
     def trigger(self):
-        self.__validate_workflows()
-        # --------
         if len(self.__invalid_records) > 0:
             ch_response = BulkResponse.invalid_records_chunk_response(self.__invalid_records)
             self.response.merge_chunk_response(ch_response)
@@ -0,0 +1,178 @@
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from suprsend import Suprsend, RetryPolicy  # noqa: E402
+
+WORKSPACE_KEY = "k" * 20
+WORKSPACE_SECRET = "s" * 20
+
+
+class HubRequest:
+    def __init__(self, method, path, headers, wire_body, body, client_port=None):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        # body as sent on wire (i.e. compressed, if Content-Encoding is set) and decoded body
+        self.wire_body = wire_body
+        self.body = body
+        # port of client side of the connection: same port, same (kept-alive) connection
+        self.client_port = client_port
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+class FakeHub:
+    """
+    Local http server standing in for SuprSend api. Records requests, checks their signature and replies with
+    scripted responses (respond()), or by default: 202 with success status of every record of a bulk body.
+    """
+    def __init__(self):
+        self.requests = []
+        self.bad_signatures = 0
+        self.delay = 0.0
+        # callable(HubRequest) -> (status, headers, body) or None (default response)
+        self.handler = None
+        self.__responses = deque()
+        self.__lock = threading.Lock()
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), self.__handler_class())
+        self.__server.daemon_threads = True
+        self.url = "http://127.0.0.1:%d/" % self.__server.server_address[1]
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+
+    def respond(self, status: int, body=None, headers=None, times: int = 1):
+        """
+        next `times` requests get this response. body: dict/list (json-encoded), bytes or str.
+        """
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        elif isinstance(body, str):
+            body = body.encode()
+        headers = dict(headers or {})
+        headers.setdefault("Content-Type", "application/json")
+        with self.__lock:
+            for _ in range(times):
+                self.__responses.append((status, headers, body or b""))
+
+    def bulk_records(self, path_part: str = ""):
+        """
+        records of all bulk (json-array) bodies received, in order
+        """
+        records = []
+        for req in self.requests:
+            if path_part in req.path:
+                body = req.json()
+                if isinstance(body, list):
+                    records.extend(body)
+        return records
+
+    def close(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def _handle(self, req: HubRequest):
+        with self.__lock:
+            self.requests.append(req)
+            if not self.__valid_signature(req):
+                self.bad_signatures += 1
+            scripted = self.__responses.popleft() if self.__responses else None
+        if self.delay:
+            time.sleep(self.delay)
+        if scripted is None and self.handler is not None:
+            scripted = self.handler(req)
+        if scripted is not None:
+            return scripted
+        body = req.json() if req.body else None
+        if isinstance(body, list):
+            resp = {"records": [{"status": "success", "status_code": 202} for _ in body]}
+        else:
+            resp = {"success": True}
+        return 202, {"Content-Type": "application/json"}, json.dumps(resp).encode()
+
+    @staticmethod
+    def __valid_signature(req: HubRequest) -> bool:
+        md5 = hashlib.md5(req.wire_body).hexdigest() if req.wire_body else ""
+        string_to_sign = "{}\n{}\n{}\n{}\n{}".format(req.method, md5, req.headers.get("Content-Type"),
+                                                     req.headers.get("Date"), req.path)
+        sig = base64.b64encode(hmac.new(WORKSPACE_SECRET.encode(), string_to_sign.encode(),
+                                        hashlib.sha256).digest()).decode()
+        return (req.headers.get("Authorization") or "") == "{}:{}".format(WORKSPACE_KEY, sig)
+
+    def __handler_class(self):
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                wire_body = self.rfile.read(length) if length else b""
+                body = wire_body
+                encoding = self.headers.get("Content-Encoding")
+                if encoding == "gzip":
+                    body = gzip.decompress(wire_body)
+                elif encoding == "deflate":
+                    body = zlib.decompress(wire_body)
+                req = HubRequest(self.command, self.path, dict(self.headers), wire_body, body, self.client_address[1])
+                status, headers, resp_body = hub._handle(req)
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(resp_body)))
+                self.end_headers()
+                self.wfile.write(resp_body)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _serve
+
+        return Handler
+
+
+@pytest.fixture
+def hub():
+    fake_hub = FakeHub()
+    yield fake_hub
+    fake_hub.close()
+
+
+@pytest.fixture
+def make_client(hub):
+    """
+    factory of Suprsend clients pointing to hub. Retries are made without waiting.
+    """
+    clients = []
+
+    def make(**kwargs):
+        kwargs.setdefault("retry_policy", RetryPolicy(backoff_base=0, backoff_max=0))
+        client = Suprsend(WORKSPACE_KEY, WORKSPACE_SECRET, base_url=hub.url, **kwargs)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        if client.background_events is not None:
+            client.background_events.shutdown(timeout=5)
+        client.close()
+        if client.spool is not None:
+            client.spool.close()
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client()
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+from suprsend import AsyncSuprsend, Event, RetryPolicy, SuprsendAPIException, WorkflowTriggerRequest
+
+from conftest import WORKSPACE_KEY, WORKSPACE_SECRET
+
+pytest.importorskip("httpx")
+
+
+def _run(hub, coro_fn, **kwargs):
+    async def main():
+        kwargs.setdefault("retry_policy", RetryPolicy(backoff_base=0, backoff_max=0))
+        async with AsyncSuprsend(WORKSPACE_KEY, WORKSPACE_SECRET, base_url=hub.url, **kwargs) as client:
+            return await coro_fn(client)
+    return asyncio.run(main())
+
+
+def test_track_event_and_workflow_trigger(hub):
+    async def calls(client):
+        event_resp = await client.track_event(Event("u1", "ev", {"a": 1}))
+        wf_resp = await client.workflows.trigger(WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u1"]}))
+        return event_resp, wf_resp
+
+    event_resp, wf_resp = _run(hub, calls)
+    assert event_resp["success"] and wf_resp["success"]
+    assert [req.path for req in hub.requests] == ["/v2/event/", "/trigger/"]
+    assert hub.requests[0].json()["properties"]["a"] == 1
+    assert hub.bad_signatures == 0
+
+
+def test_calls_run_concurrently(hub):
+    hub.delay = 0.3
+
+    async def calls(client):
+        return await asyncio.gather(*(client.track_event(Event("u{}".format(i), "ev")) for i in range(10)))
+
+    started = time.monotonic()
+    responses = _run(hub, calls)
+    assert all(resp["success"] for resp in responses)
+    # one after another would take 3s
+    assert time.monotonic() - started < 2
+
+
+def test_bulk_calls(hub):
+    async def calls(client):
+        events = client.bulk_events.new_instance()
+        events.append(*(Event("u{}".format(i), "ev") for i in range(150)))
+        workflows = client.workflows.bulk_trigger_instance()
+        workflows.append(WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u1"]}))
+        users = client.users.get_bulk_edit_instance()
+        user = client.users.get_edit_instance("u1")
+        user.set("k", "v")
+        users.append(user)
+        return await events.trigger(max_concurrency=2), await workflows.trigger(), await users.save()
+
+    events_resp, workflows_resp, users_resp = _run(hub, calls)
+    assert (events_resp.status, events_resp.total) == ("success", 150)
+    assert workflows_resp.status == "success" and users_resp.status == "success"
+    assert len(hub.bulk_records("v2/bulk/event/")) == 150
+    assert hub.bad_signatures == 0
+
+
+def test_api_error_response(hub):
+    hub.respond(404, {"error": {"message": "not found"}})
+
+    async def calls(client):
+        return await client.users.get("u1")
+
+    with pytest.raises(SuprsendAPIException):
+        _run(hub, calls, retry_policy=RetryPolicy.no_retry())
+    assert hub.requests[0].method == "GET"
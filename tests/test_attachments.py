@@ -0,0 +1,169 @@
+import base64
+import copy
+import os
+
+import pytest
+
+from suprsend import attachment, utils
+from suprsend.attachment import AttachmentCache, attachment_cache, get_attachment_json, get_base64_encoded_file
+from suprsend.constants import (
+    ATTACHMENT_READ_BLOCK_SIZE_IN_BYTES, ATTACHMENT_URL_POTENTIAL_SIZE_IN_BYTES, BODY_MAX_APPARENT_SIZE_IN_BYTES,
+    WORKFLOW_RUNTIME_KEYS_POTENTIAL_SIZE_IN_BYTES,
+)
+from suprsend.exception import InputValueError
+from suprsend.json_codec import get_json_codec
+from suprsend.signature import json_encode
+from suprsend.utils import get_apparent_workflow_body_size_and_content
+
+
+@pytest.fixture
+def enabled_cache():
+    attachment_cache.clear()
+    attachment_cache.resize(1024 * 1024)
+    yield attachment_cache
+    attachment_cache.resize(0)
+    attachment_cache.clear()
+
+
+def _write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_cache_is_disabled_by_default(tmp_path):
+    assert attachment_cache.stats()["max_size_in_bytes"] == 0
+    file_path = _write(tmp_path / "a.txt", b"hello")
+    get_attachment_json(file_path)
+    get_attachment_json(file_path)
+    stats = attachment_cache.stats()
+    assert stats["entries"] == 0 and stats["hits"] == 0
+
+
+def test_cached_content_is_reused(tmp_path, enabled_cache):
+    file_path = _write(tmp_path / "a.txt", b"hello")
+    first = get_attachment_json(file_path)
+    second = get_attachment_json(file_path)
+    assert first["data"] == second["data"] == base64.b64encode(b"hello").decode()
+    stats = enabled_cache.stats()
+    assert stats["entries"] == 1 and stats["hits"] == 1
+
+
+def test_modified_file_is_read_again(tmp_path, enabled_cache):
+    path = tmp_path / "a.txt"
+    file_path = _write(path, b"hello")
+    get_attachment_json(file_path)
+    _write(path, b"changed content")
+    st = os.stat(file_path)
+    os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert base64.b64decode(get_attachment_json(file_path)["data"]) == b"changed content"
+
+
+def test_lru_eviction_by_size():
+    cache = AttachmentCache(10)
+    cache.put(("a",), "text/plain", "x" * 4)
+    cache.put(("b",), "text/plain", "x" * 4)
+    assert cache.get(("a",)) is not None
+    # "b" is least recently used
+    cache.put(("c",), "text/plain", "x" * 4)
+    assert cache.get(("b",)) is None
+    assert cache.stats()["evictions"] == 1
+    # bigger than whole cache: not cached
+    cache.put(("d",), "text/plain", "x" * 11)
+    assert cache.get(("d",)) is None
+    cache.resize(0)
+    assert cache.stats()["entries"] == 0
+
+
+def _body_with_attachments(tmp_path):
+    body = {"workflow": "wf", "recipients": ["u1"], "data": {"k": "v", "$attachments": []}}
+    for i, content in enumerate([b"first file", b"\x00\x01" * 100]):
+        body["data"]["$attachments"].append(get_attachment_json(_write(tmp_path / "f{}.bin".format(i), content)))
+    return body
+
+
+@pytest.mark.parametrize("codec_name", ["json", "orjson"])
+def test_size_with_attachments_is_calculated_without_copy(tmp_path, monkeypatch, codec_name):
+    codec = get_json_codec(codec_name)
+    body = _body_with_attachments(tmp_path)
+    monkeypatch.setattr(copy, "deepcopy", None)
+    size, content = get_apparent_workflow_body_size_and_content(body, True, codec)
+    assert content == json_encode(body, codec)
+    assert size == len(content) + WORKFLOW_RUNTIME_KEYS_POTENTIAL_SIZE_IN_BYTES
+
+
+@pytest.mark.parametrize("codec_name", ["json", "orjson"])
+def test_size_with_attachment_upload_counts_url_instead_of_data(tmp_path, monkeypatch, codec_name):
+    codec = get_json_codec(codec_name)
+    body = _body_with_attachments(tmp_path)
+    monkeypatch.setattr(utils, "ATTACHMENT_UPLOAD_ENABLED", True)
+    size, _ = get_apparent_workflow_body_size_and_content(body, True, codec)
+    without_data = copy.deepcopy(body)
+    for attach_data in without_data["data"]["$attachments"]:
+        del attach_data["data"]
+    expected = len(json_encode(without_data, codec)) + 2 * ATTACHMENT_URL_POTENTIAL_SIZE_IN_BYTES + \
+        WORKFLOW_RUNTIME_KEYS_POTENTIAL_SIZE_IN_BYTES
+    assert size == expected
+    # body is not modified
+    assert all("data" in a for a in body["data"]["$attachments"])
+
+
+def test_size_when_attachments_are_not_allowed_in_bulk(tmp_path, monkeypatch):
+    body = _body_with_attachments(tmp_path)
+    monkeypatch.setattr(utils, "ALLOW_ATTACHMENTS_IN_BULK_API", False)
+    size, content = get_apparent_workflow_body_size_and_content(body, True)
+    without_attachments = {**body, "data": {"k": "v"}}
+    assert content is None
+    assert size == len(json_encode(without_attachments)) + WORKFLOW_RUNTIME_KEYS_POTENTIAL_SIZE_IN_BYTES
+    assert len(body["data"]["$attachments"]) == 2
+
+
+class ShortReads:
+    """
+    file reading at most 1000 bytes per call, like a pipe or network filesystem
+    """
+    def __init__(self, f):
+        self.__f = f
+
+    def readinto(self, buf):
+        return self.__f.readinto(buf[:1000])
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+@pytest.mark.parametrize("size", [1, 2, 3, 4] + [
+    blocks * ATTACHMENT_READ_BLOCK_SIZE_IN_BYTES + delta for blocks in (1, 2) for delta in (-1, 0, 1, 2)])
+def test_block_encoding_matches_b64encode(tmp_path, use_mmap, size):
+    content = os.urandom(size)
+    file_path = _write(tmp_path / "a.bin", content)
+    with open(file_path, "rb") as f:
+        encoded = get_base64_encoded_file(f, size, use_mmap)
+    assert encoded == base64.b64encode(content).decode()
+
+
+def test_block_encoding_with_short_reads(tmp_path):
+    size = ATTACHMENT_READ_BLOCK_SIZE_IN_BYTES + 5
+    content = os.urandom(size)
+    file_path = _write(tmp_path / "a.bin", content)
+    with open(file_path, "rb") as f:
+        encoded = get_base64_encoded_file(ShortReads(f), size, use_mmap=False)
+    assert encoded == base64.b64encode(content).decode()
+
+
+def test_empty_file(tmp_path):
+    file_path = _write(tmp_path / "empty.txt", b"")
+    assert get_attachment_json(file_path)["data"] == ""
+
+
+def test_too_big_file_is_rejected_without_reading(tmp_path, monkeypatch):
+    path = tmp_path / "big.bin"
+    with open(str(path), "wb") as f:
+        f.truncate(BODY_MAX_APPARENT_SIZE_IN_BYTES)
+    monkeypatch.setattr(attachment, "_encode_file", None)
+    with pytest.raises(InputValueError, match="too big"):
+        get_attachment_json(str(path))
+    assert get_attachment_json(str(path), ignore_if_error=True) is None
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(OSError):
+        get_attachment_json(str(tmp_path / "missing.txt"))
+    assert get_attachment_json(str(tmp_path / "missing.txt"), ignore_if_error=True) is None
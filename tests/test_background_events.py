@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+
+import pytest
+
+from suprsend import BackgroundEventCollector, Event, Spool, SuprsendConfigError, SuprsendError
+from suprsend.events_bulk import _BulkEventsChunk
+
+
+def _event(i=0):
+    return Event("u{}".format(i), "ev", {"i": i})
+
+
+def test_invalid_options(client):
+    with pytest.raises(SuprsendConfigError):
+        client.start_background_events(on_queue_full="ignore")
+    with pytest.raises(SuprsendConfigError):
+        client.start_background_events(flush_at=0)
+
+
+def test_events_are_sent_in_batches(client, hub):
+    batches = []
+    collector = client.start_background_events(flush_at=10, flush_interval=60, on_batch_done=batches.append)
+    for i in range(25):
+        resp = client.track_event(_event(i))
+        assert resp["status"] == "queued"
+    assert collector.flush(timeout=10)
+    assert [b["total"] for b in batches] == [10, 10, 5]
+    assert len(hub.bulk_records("v2/bulk/event/")) == 25
+    assert collector.stats()["sent"] == 25
+    assert hub.bad_signatures == 0
+
+
+def test_validation_error_is_raised_on_caller_thread(client):
+    client.start_background_events()
+    with pytest.raises(Exception):
+        client.track_event(Event("u", "$reserved"))
+
+
+def test_shutdown_sends_queued_events(client, hub):
+    collector = client.start_background_events(flush_at=100, flush_interval=60)
+    for i in range(7):
+        client.track_event(_event(i))
+    collector.shutdown(timeout=10)
+    assert len(hub.bulk_records()) == 7
+    # track_event sends events inline again
+    assert client.background_events is None
+    assert client.track_event(_event())["status"] == "success"
+    with pytest.raises(SuprsendError):
+        collector.collect(_event())
+
+
+def test_event_collected_while_shutting_down_is_not_lost(client, hub, monkeypatch):
+    collector = client.start_background_events(flush_at=100, flush_interval=60)
+    client.track_event(_event(1))
+    get_final_json_encoded = Event.get_final_json_encoded
+
+    def shut_down_meanwhile(self, *args, **kwargs):
+        # collector is shut down after collect() has checked it, while event is being validated
+        collector.shutdown(timeout=10)
+        return get_final_json_encoded(self, *args, **kwargs)
+
+    monkeypatch.setattr(Event, "get_final_json_encoded", shut_down_meanwhile)
+    with pytest.raises(SuprsendError):
+        collector.collect(_event(2))
+    assert [r["distinct_id"] for r in hub.bulk_records()] == ["u1"]
+    assert collector.stats()["queued"] == 1 and collector.stats()["queue_size"] == 0
+
+
+def test_event_collected_while_shutting_down_stays_in_spool(make_client, hub, tmp_path, monkeypatch):
+    client = make_client(spool=Spool(str(tmp_path)))
+    collector = client.start_background_events(flush_interval=60)
+    get_final_json_encoded = Event.get_final_json_encoded
+
+    def shut_down_meanwhile(self, *args, **kwargs):
+        collector.shutdown(timeout=10)
+        return get_final_json_encoded(self, *args, **kwargs)
+
+    monkeypatch.setattr(Event, "get_final_json_encoded", shut_down_meanwhile)
+    assert collector.collect(_event(1))["status"] == "spooled"
+    assert client.spool.pending_count() == 1
+    assert client.replay_spool().total == 1
+    assert [r["distinct_id"] for r in hub.bulk_records()] == ["u1"]
+
+
+def test_flush_racing_with_shutdown(client, hub):
+    release = threading.Event()
+    hub.handler = lambda req: release.wait(10) and None
+    collector = client.start_background_events(flush_at=1)
+    client.track_event(_event(1))
+    while not hub.requests:
+        time.sleep(0.01)
+    # worker is busy sending: shutdown's stop marker and then a flush request wait in queue
+    shutdown = threading.Thread(target=collector.shutdown, kwargs={"timeout": 10})
+    shutdown.start()
+    while collector.stats()["queue_size"] < 1:
+        time.sleep(0.01)
+    flushed = []
+    flush = threading.Thread(target=lambda: flushed.append(collector.flush(timeout=10)))
+    flush.start()
+    while collector.stats()["queue_size"] < 2:
+        time.sleep(0.01)
+    release.set()
+    flush.join(10)
+    shutdown.join(10)
+    assert flushed == [True]
+def test_drop_when_queue_is_full(client, hub):
+    release = threading.Event()
+    hub.handler = lambda req: release.wait(10) and None
+    collector = client.start_background_events(flush_at=1, max_queue_size=1, on_queue_full="drop")
+    statuses = [client.track_event(_event(i))["status"] for i in range(5)]
+    release.set()
+    assert "fail" in statuses
+    assert collector.flush(timeout=10)
+    assert collector.stats()["dropped"] == statuses.count("fail")
+
+
+def test_unexpected_response_doesnt_stop_worker(client, hub):
+    batches = []
+    collector = client.start_background_events(flush_at=1, on_batch_done=batches.append)
+    # 200 with an html body (e.g. from a proxy)
+    hub.respond(200, "<html>oops</html>", headers={"Content-Type": "text/html"})
+    client.track_event(_event(1))
+    assert collector.flush(timeout=10)
+    client.track_event(_event(2))
+    assert collector.flush(timeout=10)
+    stats = collector.stats()
+    assert stats["failed"] == 1 and stats["sent"] == 1
+    assert [b["status"] for b in batches] == ["fail", "success"]
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_worker_is_reported(client, hub, monkeypatch):
+    def die(self):
+        raise SystemExit()
+
+    monkeypatch.setattr(_BulkEventsChunk, "trigger", die)
+    collector = client.start_background_events(flush_at=1)
+    client.track_event(_event(1))
+    for _ in range(100):
+        if not collector.flush(timeout=0.1):
+            break
+    # events can't be queued anymore, and flush tells they are not sent
+    assert not collector.flush(timeout=1)
+    resp = client.track_event(_event(2))
+    assert resp["success"] is False and resp["status"] == "fail"
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_worker_with_spool_keeps_events_in_spool(make_client, hub, tmp_path, monkeypatch):
+    def die(self):
+        raise SystemExit()
+
+    client = make_client(spool=Spool(str(tmp_path)))
+    monkeypatch.setattr(_BulkEventsChunk, "trigger", die)
+    collector = client.start_background_events(flush_at=1)
+    client.track_event(_event(1))
+    for _ in range(100):
+        if not collector.flush(timeout=0.1):
+            break
+    assert client.track_event(_event(2))["status"] == "spooled"
+    monkeypatch.undo()
+    # both events (the one in flight when worker died, and the one not queued) are sent by replay
+    assert client.replay_spool().total == 2
+    assert client.spool.pending_count() == 0
+
+
+def test_flush_before_start_reports_failure(client):
+    collector = BackgroundEventCollector(client)
+    assert collector.flush(timeout=1) is False
+
+
+def test_default_spill_path_is_per_process(client):
+    collector = BackgroundEventCollector(client)
+    assert str(os.getpid()) in os.path.basename(collector.spill_path)
+
+
+def test_events_spilled_by_earlier_process_are_sent_on_start(client, hub, tmp_path):
+    spill_path = str(tmp_path / "events.spill")
+    # left by a process which died before sending its spilled events
+    event, _, content = _event(7).get_final_json_encoded(client, is_part_of_bulk=True)
+    with open(spill_path, "wb") as f:
+        f.write(content + b"\n")
+    collector = client.start_background_events(on_queue_full="spill", spill_path=spill_path)
+    assert collector.flush(timeout=10)
+    assert [r["$insert_id"] for r in hub.bulk_records()] == [event["$insert_id"]]
+    assert not os.path.exists(spill_path)
+
+
+def test_spill_when_queue_is_full(client, hub, tmp_path):
+    release = threading.Event()
+    hub.handler = lambda req: release.wait(10) and None
+    collector = client.start_background_events(flush_at=1, max_queue_size=1, on_queue_full="spill",
+                                               spill_path=str(tmp_path / "events.spill"))
+    statuses = [client.track_event(_event(i))["status"] for i in range(6)]
+    release.set()
+    assert statuses == ["queued"] * 6
+    assert collector.flush(timeout=10)
+    assert collector.stats()["spilled"] > 0
+    assert len({r["$insert_id"] for r in hub.bulk_records()}) == 6
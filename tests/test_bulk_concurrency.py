@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from suprsend import AsyncSuprsend, Event, RetryPolicy, WorkflowTriggerRequest
+
+from conftest import WORKSPACE_KEY, WORKSPACE_SECRET
+
+
+class InFlightCounter:
+    """
+    hub handler counting concurrent requests. When reject is set, records are rejected (400) and the delay
+    decreases with chunk order, so that later chunks complete first.
+    """
+    def __init__(self, delay=0.2, reject=False):
+        self.delay = delay
+        self.reject = reject
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.__lock = threading.Lock()
+
+    def __call__(self, req):
+        records = req.json()
+        with self.__lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            first_index = records[0]["properties"]["i"] if "properties" in records[0] else records[0]["data"]["i"]
+            time.sleep(max(self.delay - first_index / 2000, 0) if self.reject else self.delay)
+        finally:
+            with self.__lock:
+                self.in_flight -= 1
+        if not self.reject:
+            return None
+        body = {"records": [{"status": "error", "status_code": 400, "error": {"message": "rejected"}}
+                            for _ in records]}
+        return 202, {"Content-Type": "application/json"}, json.dumps(body).encode()
+
+
+def _events(n):
+    return [Event("u{}".format(i), "ev", {"i": i}) for i in range(n)]
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 3])
+def test_events_in_flight_calls_are_bounded(client, hub, max_concurrency):
+    hub.handler = counter = InFlightCounter(delay=0.1)
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(600))
+    response = bulk_ins.trigger(max_concurrency=max_concurrency)
+    assert (response.status, response.total, response.success) == ("success", 600, 600)
+    assert counter.max_in_flight == max_concurrency
+    assert len(hub.bulk_records()) == 600
+
+
+def test_events_concurrent_calls_are_faster(client, hub):
+    hub.handler = InFlightCounter(delay=0.3)
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(500))
+    started = time.monotonic()
+    bulk_ins.trigger(max_concurrency=5)
+    # 5 chunks one after another would take 1.5s
+    assert time.monotonic() - started < 1.2
+
+
+def test_events_response_is_merged_in_chunk_order(client, hub):
+    hub.handler = InFlightCounter(delay=0.2, reject=True)
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(400))
+    response = bulk_ins.trigger(max_concurrency=4)
+    assert response.status == "fail" and response.failure == 400
+    assert [fr["record"]["properties"]["i"] for fr in response.failed_records] == list(range(400))
+
+
+def _workflows(n):
+    return [WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u{}".format(i)], "data": {"i": i}})
+            for i in range(n)]
+
+
+def test_workflows_in_flight_calls_are_bounded(client, hub):
+    hub.handler = counter = InFlightCounter(delay=0.1)
+    bulk_ins = client.workflows.bulk_trigger_instance()
+    bulk_ins.append(*_workflows(500))
+    response = bulk_ins.trigger(max_concurrency=2)
+    assert (response.status, response.total) == ("success", 500)
+    assert counter.max_in_flight == 2
+
+
+def test_workflows_response_is_merged_in_chunk_order(client, hub):
+    hub.handler = InFlightCounter(delay=0.2, reject=True)
+    bulk_ins = client.workflows.bulk_trigger_instance()
+    bulk_ins.append(*_workflows(300))
+    response = bulk_ins.trigger(max_concurrency=3)
+    assert response.failure == 300
+    assert [fr["record"]["data"]["i"] for fr in response.failed_records] == list(range(300))
+
+
+def test_async_workflows_in_flight_calls_are_bounded(hub):
+    pytest.importorskip("httpx")
+    hub.handler = counter = InFlightCounter(delay=0.2, reject=True)
+
+    async def main():
+        async with AsyncSuprsend(WORKSPACE_KEY, WORKSPACE_SECRET, base_url=hub.url,
+                                 retry_policy=RetryPolicy.no_retry()) as client:
+            bulk_ins = client.workflows.bulk_trigger_instance()
+            bulk_ins.append(*_workflows(400))
+            return await bulk_ins.trigger(max_concurrency=3)
+
+    response = asyncio.run(main())
+    assert counter.max_in_flight == 3
+    assert [fr["record"]["data"]["i"] for fr in response.failed_records] == list(range(400))
@@ -0,0 +1,99 @@
+import hashlib
+import tracemalloc
+
+import pytest
+
+from suprsend import Event, WorkflowTriggerRequest
+from suprsend.json_codec import StdlibJsonCodec, get_json_codec
+from suprsend.signature import join_json_array, json_encode
+
+
+class CountingCodec(StdlibJsonCodec):
+    def __init__(self):
+        self.encoded = 0
+
+    def dumps(self, obj, default=None) -> bytes:
+        self.encoded += 1
+        return super().dumps(obj, default)
+
+
+@pytest.mark.parametrize("codec_name", ["json", "orjson"])
+@pytest.mark.parametrize("items", [[], [{"a": 1}], [{"a": 1}, {"b": "é", "c": [1, 2]}, "x"]])
+def test_joined_array_is_same_as_encoded_list(codec_name, items):
+    codec = get_json_codec(codec_name)
+    data, content_md5 = join_json_array((json_encode(item, codec) for item in items), codec)
+    assert data == json_encode(items, codec)
+    assert content_md5 == hashlib.md5(data).hexdigest()
+
+
+def test_joined_array_is_built_without_intermediate_copy():
+    def items():
+        # items are produced as body is built (e.g. rendered lazy attachments)
+        for i in range(50):
+            yield b'"' + b"x" * 100000 + b'"'
+
+    tracemalloc.start()
+    try:
+        data, _ = join_json_array(items())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < len(data) * 1.5
+
+
+def test_events_are_encoded_once(make_client, hub):
+    codec = CountingCodec()
+    client = make_client(json_codec=codec)
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*(Event("u{}".format(i), "ev", {"i": i}) for i in range(150)))
+    bulk_ins.trigger()
+    assert codec.encoded == 150
+    # body is the json-array of records, correctly signed
+    assert [r["properties"]["i"] for r in hub.bulk_records()] == list(range(150))
+    assert hub.requests[0].body == json_encode(hub.requests[0].json(), codec)
+    assert hub.bad_signatures == 0
+
+
+def test_workflows_are_encoded_once(make_client, hub):
+    codec = CountingCodec()
+    client = make_client(json_codec=codec)
+    bulk_ins = client.workflows.bulk_trigger_instance()
+    bulk_ins.append(*(WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u1"], "data": {"i": i}})
+                      for i in range(10)))
+    bulk_ins.trigger()
+    assert codec.encoded == 10
+    assert hub.bad_signatures == 0
+
+
+def test_user_edits_are_encoded_once(make_client, hub):
+    codec = CountingCodec()
+    client = make_client(json_codec=codec)
+    bulk_ins = client.users.get_bulk_edit_instance()
+    for i in range(10):
+        user = client.users.get_edit_instance("u{}".format(i))
+        user.set("i", i)
+        bulk_ins.append(user)
+    # encoded when appended, body is built out of those bytes
+    assert codec.encoded == 10
+    codec.encoded = 0
+    assert bulk_ins.save().status == "success"
+    assert codec.encoded == 0
+    assert len(hub.bulk_records()) == 10
+    assert hub.bad_signatures == 0
+
+
+def test_subscribers_are_encoded_once(make_client, hub):
+    codec = CountingCodec()
+    client = make_client(json_codec=codec)
+    bulk_ins = client.bulk_users.new_instance()
+    for i in range(10):
+        user = client.user.get_instance("u{}".format(i))
+        user.set("i", i)
+        bulk_ins.append(user)
+    # encoded when appended, body is built out of those bytes
+    assert codec.encoded == 10
+    codec.encoded = 0
+    assert bulk_ins.save().status == "success"
+    assert codec.encoded == 0
+    assert len(hub.bulk_records()) == 10
+    assert hub.bad_signatures == 0
@@ -0,0 +1,41 @@
+import pytest
+
+from suprsend import Event, RetryPolicy, WorkflowTriggerRequest
+
+
+def _workflow(i=0):
+    return WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u{}".format(i)], "data": {"i": i}})
+
+
+@pytest.mark.parametrize("body", ["<html>bad gateway</html>", "", "[1, 2]", '{"message": "ok"}'])
+def test_unexpected_2xx_response_is_failed_chunk(client, hub, body):
+    hub.respond(200, body, headers={"Content-Type": "text/html"})
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(Event("u1", "ev"), Event("u2", "ev"))
+    response = bulk_ins.trigger()
+    assert response.status == "fail"
+    assert response.total == 2 and response.failure == 2
+    assert [fr["code"] for fr in response.failed_records] == [502, 502]
+    assert response.failed_records[0]["error_type"] == "unexpected_response"
+    # whether records were processed is unknown: they can be retried
+    assert bulk_ins.retry_failed(response).status == "success"
+
+
+def test_unexpected_2xx_response_of_workflows_bulk(client, hub):
+    hub.respond(200, "<html>oops</html>", headers={"Content-Type": "text/html"})
+    bulk_ins = client.workflows.bulk_trigger_instance()
+    bulk_ins.append(_workflow(1), _workflow(2))
+    response = bulk_ins.trigger()
+    assert response.status == "fail" and response.failure == 2
+    assert "<html>oops</html>" in response.failed_records[0]["error"]
+
+
+def test_non_json_error_response(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    hub.respond(503, "<html>unavailable</html>", headers={"Content-Type": "text/html"})
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(Event("u1", "ev"))
+    response = bulk_ins.trigger()
+    assert response.status == "fail"
+    assert response.failed_records[0]["code"] == 503
+    assert response.failed_records[0]["error"] == "<html>unavailable</html>"
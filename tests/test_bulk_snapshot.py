@@ -0,0 +1,63 @@
+from suprsend import Event, RetryPolicy, WorkflowTriggerRequest
+
+
+def _unavailable(hub, times=1):
+    hub.respond(503, {"error": {"message": "unavailable"}}, times=times)
+
+
+def test_event_changes_after_append_are_not_sent(client, hub):
+    props = {"nested": {"v": 1}}
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(Event("u1", "ev", props))
+    props["nested"]["v"] = 2
+    props["added"] = True
+    bulk_ins.trigger()
+    assert hub.bulk_records()[0]["properties"]["nested"] == {"v": 1}
+    assert "added" not in hub.bulk_records()[0]["properties"]
+
+
+def test_retry_failed_sends_records_as_they_were_sent(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    props = {"nested": {"v": 1}}
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(Event("u1", "ev", props), Event("u2", "ev"))
+    _unavailable(hub, times=2)
+    response = bulk_ins.trigger()
+    assert response.status == "fail"
+    first_body = hub.requests[0].body
+    # nested dicts are shared with the caller, and the failed record dict itself can be modified
+    props["nested"]["v"] = 2
+    response.failed_records[0]["record"]["distinct_id"] = "changed"
+    retry_response = bulk_ins.retry_failed(response)
+    assert retry_response.status == "fail"
+    assert hub.requests[1].body == first_body
+    # retry of a retry too
+    assert bulk_ins.retry_failed(retry_response).status == "success"
+    assert hub.requests[2].body == first_body
+
+
+def test_workflow_retry_failed_sends_records_as_they_were_sent(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    wf = WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u1"], "data": {"v": 1}})
+    bulk_ins = client.workflows.bulk_trigger_instance()
+    bulk_ins.append(wf)
+    wf.body["data"]["v"] = 2
+    _unavailable(hub)
+    response = bulk_ins.trigger()
+    assert bulk_ins.retry_failed(response).status == "success"
+    assert [r["data"]["v"] for r in hub.bulk_records()] == [1, 1]
+    assert hub.requests[0].body == hub.requests[1].body
+
+
+def test_user_edit_retry_failed_sends_records_as_they_were_sent(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    user = client.users.get_edit_instance("u1")
+    user.set("k", {"v": 1})
+    bulk_ins = client.users.get_bulk_edit_instance()
+    bulk_ins.append(user)
+    _unavailable(hub)
+    response = bulk_ins.save()
+    assert response.status == "fail"
+    response.failed_records[0]["record"]["changed"] = True
+    assert bulk_ins.retry_failed(response).status == "success"
+    assert hub.requests[0].body == hub.requests[1].body
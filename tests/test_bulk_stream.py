@@ -0,0 +1,94 @@
+from suprsend import Event, WorkflowTriggerRequest
+
+
+class Source:
+    """
+    generator of records which tracks how many were pulled, hub.handler notes it at every request
+    """
+    def __init__(self, make_record, count, invalid_at=()):
+        self.make_record = make_record
+        self.count = count
+        self.invalid_at = set(invalid_at)
+        self.pulled = 0
+        self.pulled_at_request = []
+
+    def __iter__(self):
+        for i in range(self.count):
+            self.pulled += 1
+            yield self.make_record(i, i in self.invalid_at)
+
+    def on_request(self, req):
+        self.pulled_at_request.append(self.pulled)
+
+
+def _event(i, invalid):
+    return Event("u{}".format(i), "$invalid" if invalid else "ev", {"i": i})
+
+
+def test_events_are_sent_as_they_are_read(client, hub):
+    source = Source(_event, 1000)
+    hub.handler = source.on_request
+    response = client.bulk_events.new_instance().trigger_stream(source)
+    assert (response.status, response.total) == ("success", 1000)
+    # n-th chunk is sent once it is full: only a chunk (and the record which didn't fit) read ahead
+    assert source.pulled_at_request == [100 * n + 1 for n in range(1, 10)] + [1000]
+    assert [r["properties"]["i"] for r in hub.bulk_records()] == list(range(1000))
+
+
+def test_in_memory_chunks_are_bounded_with_concurrency(client, hub):
+    source = Source(_event, 2000)
+    hub.handler = source.on_request
+    client.bulk_events.new_instance().trigger_stream(source, max_concurrency=3)
+    requests_sent = 0
+    for pulled in source.pulled_at_request:
+        requests_sent += 1
+        # in-flight chunks + the one being filled
+        assert pulled - 100 * requests_sent <= 100 * 3 + 1
+    assert len(hub.bulk_records()) == 2000
+
+
+def test_invalid_events_are_reported_at_the_end(client, hub):
+    source = Source(_event, 250, invalid_at=(3, 120))
+    response = client.bulk_events.new_instance().trigger_stream(source)
+    assert (response.status, response.total, response.failure) == ("partial", 250, 2)
+    assert [fr["record"]["properties"]["i"] for fr in response.failed_records] == [3, 120]
+    assert len(hub.bulk_records()) == 248
+
+
+def test_workflows_stream(client, hub):
+    def _workflow(i, invalid):
+        return WorkflowTriggerRequest({"workflow": "wf", "recipients": [] if invalid else ["u1"], "data": {"i": i}})
+
+    response = client.workflows.bulk_trigger_instance().trigger_stream(Source(_workflow, 150, invalid_at=(7,)),
+                                                                       max_concurrency=2)
+    assert (response.total, response.failure) == (150, 1)
+    assert len(hub.bulk_records("trigger/")) == 149
+
+
+def test_user_edits_stream(client, hub):
+    def _user(i, invalid):
+        user = client.users.get_edit_instance("u{}".format(i))
+        user.set("i", i)
+        return user
+
+    response = client.users.get_bulk_edit_instance().save_stream(Source(_user, 120))
+    assert (response.status, response.total) == ("success", 120)
+    assert len(hub.bulk_records()) == 120
+
+
+def test_appended_records_are_not_part_of_stream(client, hub):
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(_event(999, False))
+    response = bulk_ins.trigger_stream(Source(_event, 3))
+    assert response.total == 3
+    assert [r["properties"]["i"] for r in hub.bulk_records()] == [0, 1, 2]
+
+
+def test_invalid_records_of_trigger_are_not_reported_again_by_stream(client, hub):
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(_event(0, False), _event(1, True))
+    assert bulk_ins.trigger().failure == 1
+    response = bulk_ins.trigger_stream(iter([_event(2, False), _event(3, True)]))
+    # response is cumulative: one invalid record of each call
+    assert response.failure == 2
+    assert [r["record"]["properties"]["i"] for r in response.failed_records] == [1, 3]
@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import pytest
+
+from suprsend import AsyncSuprsend, Event, RetryPolicy, WorkflowTriggerRequest
+
+from conftest import WORKSPACE_KEY, WORKSPACE_SECRET
+
+
+def _events(n):
+    return [Event("u{}".format(i), "ev", {"i": i}) for i in range(n)]
+
+
+def _first_chunk_is_slowest(req):
+    # chunks complete out of order when sent concurrently
+    body = req.json()
+    if isinstance(body, list) and body and body[0].get("distinct_id") == "u0":
+        time.sleep(0.3)
+    return None
+
+
+def test_each_chunk_is_reported_in_order(client, hub):
+    hub.handler = _first_chunk_is_slowest
+    results = []
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(250))
+    response = bulk_ins.trigger(max_concurrency=3, on_chunk_complete=results.append)
+    assert [r["total"] for r in results] == [100, 100, 50]
+    assert all(r["status"] == "success" for r in results)
+    assert response.status == "success" and response.total == 250 and response.success == 250
+    # chunks are released once reported
+    assert bulk_ins.chunks == []
+
+
+def test_failed_records_are_reported_to_callback_only(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    results = []
+    hub.respond(202, {"records": [{"status": "success", "status_code": 202}] * 100})
+    hub.respond(400, {"error": {"message": "bad request"}})
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(150))
+    response = bulk_ins.trigger(on_chunk_complete=results.append)
+    assert [r["status"] for r in results] == ["success", "fail"]
+    assert len(results[1]["failed_records"]) == 50
+    assert results[1]["failed_records"][0]["error"] == "bad request"
+    assert response.status == "partial" and response.failure == 50
+    assert response.failed_records == []
+
+
+def test_invalid_records_are_reported_last(client, hub):
+    results = []
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(Event("u1", "ev"), Event("u2", "$reserved"), Event("u3", "ev"))
+    response = bulk_ins.trigger(on_chunk_complete=results.append)
+    assert [(r["status"], r["total"]) for r in results] == [("success", 2), ("fail", 1)]
+    assert response.status == "partial" and response.failure == 1
+    assert response.failed_records == []
+
+
+def test_nothing_to_send(client, hub):
+    results = []
+    response = client.bulk_events.new_instance().trigger(on_chunk_complete=results.append)
+    assert results == []
+    assert response.status == "success" and response.total == 0
+    assert hub.requests == []
+
+
+def test_trigger_stream_of_workflows(client, hub):
+    results = []
+    workflows = (WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u{}".format(i)]}) for i in range(120))
+    bulk_ins = client.workflows.bulk_trigger_instance()
+    response = bulk_ins.trigger_stream(workflows, max_concurrency=2, on_chunk_complete=results.append)
+    assert sum(r["total"] for r in results) == 120 and len(results) > 1
+    assert response.success == 120 and response.failed_records == []
+    assert bulk_ins.chunks == []
+
+
+def test_user_edits_save(client, hub):
+    results = []
+    bulk_ins = client.users.get_bulk_edit_instance()
+    for i in range(3):
+        user = client.users.get_edit_instance("u{}".format(i))
+        user.set("k", i)
+        bulk_ins.append(user)
+    response = bulk_ins.save(on_chunk_complete=results.append)
+    assert [r["total"] for r in results] == [3]
+    assert response.success == 3
+    assert bulk_ins.chunks == []
+
+
+def test_retry_failed_is_not_possible_without_failed_records(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    hub.respond(503, {"error": {"message": "unavailable"}})
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(3))
+    response = bulk_ins.trigger(on_chunk_complete=lambda r: None)
+    assert response.failure == 3
+    assert bulk_ins.retry_failed(response).total == 0
+    assert len(hub.requests) == 1
+
+
+def test_async_trigger(hub):
+    pytest.importorskip("httpx")
+    hub.handler = _first_chunk_is_slowest
+    results = []
+
+    async def main():
+        async with AsyncSuprsend(WORKSPACE_KEY, WORKSPACE_SECRET, base_url=hub.url) as client:
+            bulk_ins = client.bulk_events.new_instance()
+            bulk_ins.append(*_events(250))
+            return await bulk_ins.trigger(max_concurrency=3, on_chunk_complete=results.append)
+
+    response = asyncio.run(main())
+    assert [r["total"] for r in results] == [100, 100, 50]
+    assert response.success == 250 and response.failed_records == []
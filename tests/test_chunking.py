@@ -0,0 +1,61 @@
+import sys
+
+import pytest
+
+from suprsend import Event, InputValueError
+from suprsend.utils import drain, iter_chunks
+
+
+class FakeChunk:
+    max_records = 10
+    max_size = 100
+
+    def __init__(self):
+        self.records = []
+        self.size = 0
+
+    def try_to_add_into_chunk(self, record, size):
+        if size > self.max_size:
+            raise InputValueError("record too big")
+        if len(self.records) >= self.max_records or self.size + size > self.max_size:
+            return False
+        self.records.append(record)
+        self.size += size
+        return True
+
+
+def test_many_chunks_without_recursion():
+    count = 20 * sys.getrecursionlimit()
+    chunks = list(iter_chunks(((i, 1) for i in range(count)), FakeChunk))
+    assert len(chunks) == count // FakeChunk.max_records
+    assert [rec for ch in chunks for rec in ch.records] == list(range(count))
+
+
+def test_chunks_are_bounded_by_size():
+    sizes = [60, 30, 20, 100, 5]
+    chunks = list(iter_chunks(((i, size) for i, size in enumerate(sizes)), FakeChunk))
+    assert [ch.records for ch in chunks] == [[0, 1], [2], [3], [4]]
+
+
+def test_no_records_no_chunk():
+    assert list(iter_chunks([], FakeChunk)) == []
+
+
+def test_too_big_record_raises():
+    with pytest.raises(InputValueError):
+        list(iter_chunks([(0, 1), (1, 101)], FakeChunk))
+
+
+def test_drain_releases_items():
+    items = [1, 2, 3]
+    assert list(drain(items)) == [1, 2, 3]
+    assert items == []
+
+
+def test_bulk_events_are_chunked_in_order(client, hub):
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*(Event("u{}".format(i), "ev", {"i": i}) for i in range(1050)))
+    response = bulk_ins.trigger()
+    assert response.total == 1050
+    assert [len(ch.records) for ch in bulk_ins.chunks] == [100] * 10 + [50]
+    assert [r["properties"]["i"] for r in hub.bulk_records()] == list(range(1050))
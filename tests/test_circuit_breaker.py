@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pytest
+
+from suprsend import CircuitBreaker, Event, RetryPolicy, SuprsendCircuitOpenError, SuprsendConfigError, \
+    WorkflowTriggerRequest
+from suprsend.circuit_breaker import endpoint_of
+
+BASE_URL = "https://hub.suprsend.com/"
+
+
+def _failing(hub, times):
+    hub.respond(500, {"error": {"message": "internal error"}}, times=times)
+
+
+def _client(make_client, **kwargs):
+    breaker = CircuitBreaker(**kwargs)
+    return make_client(retry_policy=RetryPolicy.no_retry(), circuit_breaker=breaker), breaker
+
+
+def test_invalid_config():
+    with pytest.raises(SuprsendConfigError):
+        CircuitBreaker(failure_threshold=0)
+    with pytest.raises(SuprsendConfigError):
+        CircuitBreaker(half_open_max_calls=0)
+
+
+@pytest.mark.parametrize("url,endpoint", [
+    (BASE_URL + "v2/event/", "v2/event/"),
+    (BASE_URL + "v2/bulk/event/", "v2/bulk/event/"),
+    (BASE_URL + "v1/user/u1/preference/", "v1/user/"),
+    (BASE_URL + "trigger/", "trigger/"),
+    (BASE_URL, "/"),
+])
+def test_endpoint_of(url, endpoint):
+    assert endpoint_of(url) == endpoint
+
+
+def test_endpoint_relative_to_base_path():
+    assert endpoint_of("https://proxy.example.com/suprsend/v1/user/u1/", "/suprsend/") == "v1/user/"
+
+
+def test_opens_after_consecutive_failures(make_client, hub):
+    client, breaker = _client(make_client, failure_threshold=3, recovery_timeout=60)
+    _failing(hub, 3)
+    for _ in range(3):
+        assert client.track_event(Event("u1", "ev"))["status_code"] == 500
+    resp = client.track_event(Event("u1", "ev"))
+    assert resp["success"] is False and "circuit open" in resp["message"]
+    # rejected call is not sent
+    assert len(hub.requests) == 3
+    state = breaker.state()["v2/event/"]
+    assert state["state"] == "open" and state["consecutive_failures"] == 3 and state["rejected"] == 1
+    assert not breaker.is_healthy()
+    # other endpoints are not affected
+    assert client.workflows.trigger(WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u1"]}))["success"]
+
+
+def test_success_resets_consecutive_failures(make_client, hub):
+    client, breaker = _client(make_client, failure_threshold=2)
+    _failing(hub, 1)
+    client.track_event(Event("u1", "ev"))
+    client.track_event(Event("u1", "ev"))
+    _failing(hub, 1)
+    client.track_event(Event("u1", "ev"))
+    state = breaker.state()["v2/event/"]
+    assert state["state"] == "closed" and state["consecutive_failures"] == 1 and state["total_failures"] == 2
+
+
+def test_client_errors_dont_count_as_failures(make_client, hub):
+    client, breaker = _client(make_client, failure_threshold=1)
+    hub.respond(400, {"error": {"message": "bad request"}}, times=2)
+    client.track_event(Event("u1", "ev"))
+    client.track_event(Event("u1", "ev"))
+    assert breaker.is_healthy()
+    assert len(hub.requests) == 2
+
+
+def test_connection_errors_count_as_failures(make_client):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    # nothing listens on port 9
+    client = make_client(retry_policy=RetryPolicy.no_retry(), circuit_breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(Exception):
+            client.transport.get("http://127.0.0.1:9/v1/user/u1/")
+    with pytest.raises(SuprsendCircuitOpenError):
+        client.transport.get("http://127.0.0.1:9/v1/user/u1/")
+
+
+def test_half_open_probe_closes_circuit(make_client, hub):
+    client, breaker = _client(make_client, failure_threshold=1, recovery_timeout=0.1)
+    _failing(hub, 1)
+    client.track_event(Event("u1", "ev"))
+    assert breaker.state()["v2/event/"]["state"] == "open"
+    time.sleep(0.15)
+    assert client.track_event(Event("u1", "ev"))["success"]
+    assert breaker.state()["v2/event/"]["state"] == "closed"
+    assert breaker.is_healthy()
+
+
+def test_failed_probe_opens_circuit_again(make_client, hub):
+    client, breaker = _client(make_client, failure_threshold=3, recovery_timeout=0.1)
+    _failing(hub, 4)
+    for _ in range(3):
+        client.track_event(Event("u1", "ev"))
+    time.sleep(0.15)
+    # a single failure of the probe opens it
+    client.track_event(Event("u1", "ev"))
+    assert breaker.state()["v2/event/"]["state"] == "open"
+    assert "circuit open" in client.track_event(Event("u1", "ev"))["message"]
+    assert len(hub.requests) == 4
+
+
+def test_half_open_allows_limited_probes(make_client, hub):
+    client, breaker = _client(make_client, failure_threshold=1, recovery_timeout=0.1)
+    _failing(hub, 1)
+    client.track_event(Event("u1", "ev"))
+    time.sleep(0.15)
+    release = threading.Event()
+    hub.handler = lambda req: release.wait(10) and None
+    probe = threading.Thread(target=client.track_event, args=(Event("u1", "ev"),))
+    probe.start()
+    while not len(hub.requests) == 2:
+        time.sleep(0.01)
+    # probe still in flight
+    assert "half-open" in client.track_event(Event("u1", "ev"))["message"]
+    release.set()
+    probe.join(10)
+    assert breaker.state()["v2/event/"]["state"] == "closed"
+
+
+def test_bulk_chunk_fails_fast_on_open_circuit(make_client, hub):
+    client, breaker = _client(make_client, failure_threshold=1, recovery_timeout=60)
+    _failing(hub, 1)
+    first = client.bulk_events.new_instance()
+    first.append(Event("u1", "ev"))
+    assert first.trigger().status == "fail"
+    second = client.bulk_events.new_instance()
+    second.append(Event("u1", "ev"), Event("u2", "ev"))
+    response = second.trigger()
+    assert response.status == "fail" and response.failure == 2
+    assert {(r["code"], r["error_type"]) for r in response.failed_records} == {(503, "circuit_open")}
+    assert len(hub.requests) == 1
+
+
+def test_retries_stop_once_circuit_opens(make_client, hub):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    client = make_client(circuit_breaker=breaker)
+    _failing(hub, 5)
+    resp = client.track_event(Event("u1", "ev", idempotency_key="k1"))
+    assert resp["success"] is False
+    assert len(hub.requests) == 2
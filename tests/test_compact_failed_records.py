@@ -0,0 +1,90 @@
+from suprsend import Event, Spool, WorkflowTriggerRequest
+from suprsend.constants import BODY_MAX_APPARENT_SIZE_IN_BYTES
+from suprsend.utils import LazyTraceback
+
+
+def test_spool_with_compact_invalid_record(make_client, hub, tmp_path):
+    client = make_client(spool=Spool(str(tmp_path / "spool")))
+    bulk_ins = client.bulk_events.new_instance(compact_failed_records=True)
+    bulk_ins.append(Event("u1", "ev"), Event("u2", "$reserved"), Event("u3", "ev"))
+    response = bulk_ins.trigger()
+    assert response.status == "partial"
+    assert response.failed_records[0]["index"] == 1
+    # delivered records are acknowledged, invalid one was never written to spool
+    assert client.spool.pending_count() == 0
+
+
+def test_invalid_record_shape_without_compact_mode(client, hub):
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(Event("u1", "ev"), Event("u2", "$reserved"))
+    response = bulk_ins.trigger()
+    failed = response.failed_records[0]
+    assert set(failed) == {"record", "error", "code", "error_type"}
+    assert failed["record"]["distinct_id"] == "u2"
+    assert failed["code"] == 500 and failed["error_type"] == "invalid_record"
+
+
+def _reserved(i):
+    return Event("u{}".format(i), "$reserved")
+
+
+def test_index_counts_every_item_passed(client, hub):
+    bulk_ins = client.bulk_events.new_instance(compact_failed_records=True)
+    bulk_ins.append(Event("u0", "ev"), _reserved(1), None)
+    bulk_ins.append(_reserved(3), Event("u4", "ev"))
+    response = bulk_ins.trigger()
+    assert [r["index"] for r in response.failed_records] == [1, 3]
+    assert all(set(r) == {"index", "error", "code", "error_type"} for r in response.failed_records)
+    assert response.failed_records[0]["error"] == "event_names starting with [$,ss_] are reserved by SuprSend"
+    assert len(hub.bulk_records()) == 2
+
+
+def test_index_continues_into_trigger_stream(client, hub):
+    bulk_ins = client.bulk_events.new_instance(compact_failed_records=True)
+    bulk_ins.append(Event("u0", "ev"), _reserved(1))
+    bulk_ins.trigger()
+    response = bulk_ins.trigger_stream(iter([Event("u2", "ev"), _reserved(3)]))
+    assert [r["index"] for r in response.failed_records] == [1, 3]
+
+
+def test_error_messages_are_shared(client, hub):
+    bulk_ins = client.bulk_events.new_instance(compact_failed_records=True)
+    bulk_ins.append(*(_reserved(i) for i in range(10)))
+    errors = [r["error"] for r in bulk_ins.trigger().failed_records]
+    assert len(errors) == 10
+    assert all(err is errors[0] for err in errors)
+
+
+def test_lazy_tracebacks(client, hub, monkeypatch):
+    bulk_ins = client.workflows.bulk_trigger_instance(compact_failed_records=True, failed_record_tracebacks=True)
+    bulk_ins.append(*(WorkflowTriggerRequest({"recipients": ["u{}".format(i)]}) for i in range(2)))
+    response = bulk_ins.trigger()
+    first, second = response.failed_records
+    assert first["error"] == "SuprsendValidationError: [code: 400] 'workflow' is a required property"
+    assert first["error"] is second["error"]
+    assert isinstance(first["traceback"], LazyTraceback)
+    assert "not formatted" in repr(first["traceback"])
+    formatted = str(first["traceback"])
+    assert formatted.startswith("Traceback") and "'workflow' is a required property" in formatted
+    assert str(first["traceback"]) is formatted
+
+
+def test_no_traceback_of_input_errors_or_by_default(client, hub):
+    bulk_ins = client.bulk_events.new_instance(compact_failed_records=True, failed_record_tracebacks=True)
+    bulk_ins.append(_reserved(0))
+    assert "traceback" not in bulk_ins.trigger().failed_records[0]
+    bulk_ins = client.workflows.bulk_trigger_instance(compact_failed_records=True)
+    bulk_ins.append(WorkflowTriggerRequest({"recipients": ["u1"]}))
+    assert "traceback" not in bulk_ins.trigger().failed_records[0]
+
+
+def test_user_edits_in_compact_mode(client, hub):
+    bulk_ins = client.users.get_bulk_edit_instance(compact_failed_records=True)
+    for i, value in enumerate(["small", "x" * BODY_MAX_APPARENT_SIZE_IN_BYTES, "small"]):
+        user = client.users.get_edit_instance("u{}".format(i))
+        user.set("k", value)
+        bulk_ins.append(user)
+    response = bulk_ins.save()
+    assert response.status == "partial" and response.success == 2
+    failed = response.failed_records[0]
+    assert failed["index"] == 1 and failed["error_type"] == "invalid_record" and "record" not in failed
@@ -0,0 +1,107 @@
+import gzip
+import os
+import zlib
+
+import pytest
+
+from suprsend import BodyCompression, Event, SuprsendConfigError, WorkflowTriggerRequest
+
+
+def _events(n):
+    return [Event("user-{}".format(i), "order_placed", {"order_id": i, "status": "confirmed"}) for i in range(n)]
+
+
+def test_invalid_config():
+    with pytest.raises(SuprsendConfigError):
+        BodyCompression("br")
+    with pytest.raises(SuprsendConfigError):
+        BodyCompression(level=0)
+    with pytest.raises(SuprsendConfigError):
+        BodyCompression(level=10)
+
+
+@pytest.mark.parametrize("encoding,decompress", [("gzip", gzip.decompress), ("deflate", zlib.decompress)])
+def test_compress(encoding, decompress):
+    data = b'{"key": "value"}, ' * 200
+    compressed = BodyCompression(encoding, level=9, min_size=100).compress(data)
+    assert len(compressed) < len(data)
+    assert decompress(compressed) == data
+
+
+def test_gzip_output_is_deterministic():
+    data = b'{"key": "value"}, ' * 200
+    compression = BodyCompression("gzip", min_size=0)
+    assert compression.compress(data) == compression.compress(data)
+
+
+def test_small_or_incompressible_data_is_not_compressed():
+    compression = BodyCompression(min_size=100)
+    assert compression.compress(b"") is None
+    assert compression.compress(b"x" * 99) is None
+    # random bytes don't shrink
+    assert compression.compress(os.urandom(1000)) is None
+
+
+def test_encode_body_sets_header_and_md5():
+    data = b'{"key": "value"}, ' * 200
+    headers = {}
+    body, md5 = BodyCompression(min_size=0).encode_body(data, "md5-of-data", headers)
+    assert headers == {"Content-Encoding": "gzip"}
+    assert md5 != "md5-of-data" and gzip.decompress(body) == data
+    # not compressed: body, md5 and headers are left as they are
+    headers = {}
+    assert BodyCompression(min_size=10 ** 6).encode_body(data, "md5-of-data", headers) == (data, "md5-of-data")
+    assert headers == {}
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "deflate"])
+def test_bulk_events_are_sent_compressed(make_client, hub, encoding):
+    client = make_client(bulk_compression=BodyCompression(encoding, min_size=1024))
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(50))
+    assert bulk_ins.trigger().status == "success"
+    req = hub.requests[0]
+    assert req.headers["Content-Encoding"] == encoding
+    assert len(req.wire_body) * 3 < len(req.body)
+    assert [r["distinct_id"] for r in hub.bulk_records()] == ["user-{}".format(i) for i in range(50)]
+    # signature covers compressed bytes sent on wire
+    assert hub.bad_signatures == 0
+
+
+def test_bulk_workflows_are_sent_compressed(make_client, hub):
+    client = make_client(bulk_compression=BodyCompression(min_size=0))
+    bulk_ins = client.workflows.bulk_trigger_instance()
+    bulk_ins.append(*(WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u{}".format(i)]}) for i in range(20)))
+    assert bulk_ins.trigger().status == "success"
+    assert hub.requests[0].headers["Content-Encoding"] == "gzip"
+    assert len(hub.bulk_records()) == 20
+    assert hub.bad_signatures == 0
+
+
+def test_body_below_min_size_is_sent_uncompressed(make_client, hub):
+    client = make_client(bulk_compression=BodyCompression(min_size=10 ** 6))
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(5))
+    assert bulk_ins.trigger().status == "success"
+    req = hub.requests[0]
+    assert "Content-Encoding" not in req.headers
+    assert req.wire_body == req.body
+    assert hub.bad_signatures == 0
+
+
+def test_single_calls_are_not_compressed(make_client, hub):
+    client = make_client(bulk_compression=BodyCompression(min_size=0))
+    client.track_event(_events(1)[0])
+    assert "Content-Encoding" not in hub.requests[0].headers
+
+
+def test_retried_chunk_is_compressed_and_signed_again(make_client, hub):
+    client = make_client(bulk_compression=BodyCompression(min_size=0))
+    hub.respond(503, {"error": {"message": "unavailable"}})
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*(Event("u{}".format(i), "ev", idempotency_key="k{}".format(i)) for i in range(10)))
+    assert bulk_ins.trigger().status == "success"
+    assert len(hub.requests) == 2
+    assert all(req.headers["Content-Encoding"] == "gzip" for req in hub.requests)
+    assert hub.requests[0].wire_body == hub.requests[1].wire_body
+    assert hub.bad_signatures == 0
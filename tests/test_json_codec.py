@@ -0,0 +1,82 @@
+import base64
+import json
+
+import pytest
+
+from suprsend import Event, SuprsendConfigError
+from suprsend import json_codec as json_codec_module
+from suprsend.attachment import get_attachment_json
+from suprsend.json_codec import OrjsonCodec, StdlibJsonCodec, get_json_codec
+from suprsend.utils import get_apparent_event_size_and_content, record_content
+
+CODEC_NAMES = ["json", "orjson"] + (["ujson"] if json_codec_module._has_ujson else [])
+
+
+def test_codec_selection():
+    assert isinstance(get_json_codec("json"), StdlibJsonCodec)
+    codec = StdlibJsonCodec()
+    assert get_json_codec(codec) is codec
+    with pytest.raises(SuprsendConfigError):
+        get_json_codec("simplejson")
+
+
+def test_auto_detection(monkeypatch):
+    if json_codec_module._has_orjson:
+        assert isinstance(get_json_codec(), OrjsonCodec)
+    monkeypatch.setattr(json_codec_module, "_has_orjson", False)
+    assert isinstance(get_json_codec(), StdlibJsonCodec)
+    with pytest.raises(SuprsendConfigError):
+        get_json_codec("orjson")
+
+
+@pytest.mark.parametrize("name", CODEC_NAMES)
+def test_separators_match_output(name):
+    codec = get_json_codec(name)
+    assert codec.dumps([1, 2]) == b"[1" + codec.item_separator + b"2]"
+    assert codec.dumps({"a": 1}) == b'{"a"' + codec.key_separator + b"1}"
+
+
+@pytest.mark.parametrize("name", CODEC_NAMES)
+def test_round_trip_keeps_unicode(name):
+    codec = get_json_codec(name)
+    obj = {"name": "Jöhn 😀", "n": [1, 2.5, None, True], "nested": {"k": "/path"}}
+    encoded = codec.dumps(obj)
+    assert "Jöhn 😀".encode() in encoded
+    assert codec.loads(encoded) == obj
+    assert json.loads(encoded) == obj
+
+
+def test_orjson_falls_back_for_unsupported_values():
+    pytest.importorskip("orjson")
+    codec = get_json_codec("orjson")
+    assert codec.dumps({"big": 2 ** 70}) == b'{"big":1180591620717411303424}'
+    with pytest.raises(TypeError):
+        codec.dumps({"x": object()})
+
+
+@pytest.mark.parametrize("name", CODEC_NAMES)
+def test_requests_are_signed_with_any_codec(make_client, hub, name):
+    client = make_client(json_codec=name)
+    assert client.track_event(Event("u1", "ev", {"name": "Jöhn"}))["success"]
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(Event("u2", "ev"), Event("u3", "ev"))
+    assert bulk_ins.trigger().status == "success"
+    assert hub.requests[0].json()["properties"]["name"] == "Jöhn"
+    assert hub.bad_signatures == 0
+
+
+def test_orjson_fallback_of_record_with_lazy_attachments(tmp_path):
+    pytest.importorskip("orjson")
+    codec = get_json_codec("orjson")
+    lazy = []
+    for i in range(2):
+        path = tmp_path / "f{}.txt".format(i)
+        path.write_bytes(b"content %d" % i)
+        lazy.append(get_attachment_json(str(path), lazy=True))
+    # orjson fails after it has seen first attachment, record is encoded again by stdlib json
+    event = {"event": "ev", "properties": {"$attachments": [lazy[0], 2 ** 70, lazy[1]]}}
+    _, content = get_apparent_event_size_and_content(event, True, codec)
+    assert content.attachments == lazy
+    sent = json.loads(record_content(event, content, codec))["properties"]["$attachments"]
+    assert [base64.b64decode(sent[0]["data"]), sent[1], base64.b64decode(sent[2]["data"])] == \
+        [b"content 0", 2 ** 70, b"content 1"]
@@ -0,0 +1,252 @@
+import asyncio
+import base64
+import threading
+
+import pytest
+
+from suprsend import AsyncSuprsend, Event, Spool, SubscriberListBroadcast, WorkflowTriggerRequest, attachment, workflow_trigger_bulk
+from suprsend.attachment import LazyAttachment
+from suprsend.constants import BODY_MAX_APPARENT_SIZE_IN_BYTES
+from suprsend.utils import LazyEncodedRecord, get_apparent_event_size_and_content, record_content
+from suprsend.signature import json_encode
+
+from conftest import WORKSPACE_KEY, WORKSPACE_SECRET
+
+
+def _file(tmp_path, content=b"hello attachment"):
+    path = tmp_path / "a.txt"
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_size_and_content_with_lazy_attachment(client, tmp_path):
+    ev = Event("u1", "ev", {"v": 1})
+    ev.add_attachment(_file(tmp_path), lazy=True)
+    event_dict, size, content = ev.get_final_json_encoded(client, is_part_of_bulk=True)
+    assert isinstance(content, LazyEncodedRecord)
+    assert isinstance(event_dict["properties"]["$attachments"][0], LazyAttachment)
+    rendered = record_content(event_dict, content, client.json_codec)
+    # size derived from file size is the size of rendered record
+    assert size == len(rendered)
+    assert rendered == json_encode(event_dict, client.json_codec)
+    assert get_apparent_event_size_and_content(event_dict, True, client.json_codec)[0] == size
+
+
+def test_changes_after_append_are_not_sent(client, hub, tmp_path):
+    ev = Event("u1", "ev", {"v": 1})
+    ev.add_attachment(_file(tmp_path), lazy=True)
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(ev)
+    ev.properties["v"] = 2
+    bulk_ins.trigger()
+    sent = hub.bulk_records()[0]["properties"]
+    assert sent["v"] == 1
+    assert base64.b64decode(sent["$attachments"][0]["data"]) == b"hello attachment"
+
+
+def test_workflow_changes_after_append_are_not_sent(client, hub, tmp_path):
+    wf = WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u1"], "data": {"v": 1}})
+    wf.add_attachment(_file(tmp_path), lazy=True)
+    bulk_ins = client.workflows.bulk_trigger_instance()
+    bulk_ins.append(wf)
+    wf.body["data"]["v"] = 2
+    assert bulk_ins.trigger().status == "success"
+    assert hub.bulk_records()[0]["data"]["v"] == 1
+
+
+def test_file_is_read_once_with_spool(make_client, hub, tmp_path, monkeypatch):
+    client = make_client(spool=Spool(str(tmp_path / "spool")))
+    reads = []
+    materialize = LazyAttachment.materialize
+
+    def counting_materialize(self):
+        reads.append(self.abs_path)
+        return materialize(self)
+
+    monkeypatch.setattr(LazyAttachment, "materialize", counting_materialize)
+    ev = Event("u1", "ev", {"v": 1})
+    ev.add_attachment(_file(tmp_path), lazy=True)
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(ev)
+    assert len(reads) == 1
+    assert bulk_ins.trigger().status == "success"
+    assert len(reads) == 1
+    assert client.spool.pending_count() == 0
+
+
+def _workflows_sharing_file(tmp_path, n):
+    shared = _file(tmp_path, b"shared content")
+    workflows = []
+    for i in range(n):
+        wf = WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u{}".format(i)], "data": {"i": i}})
+        wf.add_attachment(shared, lazy=True)
+        own = tmp_path / "own{}.txt".format(i)
+        own.write_bytes("own content {}".format(i).encode())
+        wf.add_attachment(str(own), lazy=True)
+        workflows.append(wf)
+    return workflows
+
+
+def _assert_attachments_sent(hub, n):
+    records = sorted(hub.bulk_records("trigger"), key=lambda r: r["data"]["i"])
+    assert len(records) == n
+    for i, record in enumerate(records):
+        shared, own = record["data"]["$attachments"]
+        assert base64.b64decode(shared["data"]) == b"shared content"
+        assert base64.b64decode(own["data"]) == "own content {}".format(i).encode()
+
+
+def test_encoder_encodes_shared_file_once(client, hub, tmp_path, monkeypatch):
+    encoded = []
+    encode_file = attachment._encode_file
+
+    def counting_encode_file(abs_path, use_mmap=None):
+        encoded.append(abs_path)
+        return encode_file(abs_path, use_mmap)
+
+    monkeypatch.setattr(attachment, "_encode_file", counting_encode_file)
+    bulk_ins = client.workflows.bulk_trigger_instance(attachment_workers=2)
+    bulk_ins.append(*_workflows_sharing_file(tmp_path, 20))
+    assert bulk_ins.trigger().status == "success"
+    _assert_attachments_sent(hub, 20)
+    # 1 shared + 20 own files
+    assert len(encoded) == 21 and len(set(encoded)) == 21
+    # workers are stopped once chunk bodies are built
+    assert not [t for t in threading.enumerate() if t.name.startswith("suprsend-attachment")]
+
+
+def test_encoder_with_processes(client, hub, tmp_path):
+    bulk_ins = client.workflows.bulk_trigger_instance(attachment_workers=2, attachment_use_processes=True)
+    bulk_ins.append(*_workflows_sharing_file(tmp_path, 5))
+    assert bulk_ins.trigger().status == "success"
+    _assert_attachments_sent(hub, 5)
+
+
+def test_encoder_error_of_ignored_attachment_sends_null_data(client, hub, tmp_path, monkeypatch):
+    wf = WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u1"], "data": {}})
+    path = _file(tmp_path)
+    wf.add_attachment(path, ignore_if_error=True, lazy=True)
+    # file grows too big to be sent after it was attached: encoding on worker fails
+    with open(path, "wb") as f:
+        f.truncate(BODY_MAX_APPARENT_SIZE_IN_BYTES)
+    bulk_ins = client.workflows.bulk_trigger_instance(attachment_workers=2)
+    bulk_ins.append(wf)
+    assert bulk_ins.trigger().status == "success"
+    sent = hub.bulk_records()[0]["data"]["$attachments"][0]
+    assert sent["data"] is None and sent["filename"] == "a.txt"
+
+
+def test_encoder_error_fails_chunk(client, hub, tmp_path):
+    wf = WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u1"], "data": {}})
+    path = _file(tmp_path)
+    wf.add_attachment(path, lazy=True)
+    with open(path, "wb") as f:
+        f.truncate(BODY_MAX_APPARENT_SIZE_IN_BYTES)
+    bulk_ins = client.workflows.bulk_trigger_instance(attachment_workers=2)
+    bulk_ins.append(wf)
+    response = bulk_ins.trigger()
+    assert response.status == "fail" and response.failure == 1
+    assert "too big" in response.failed_records[0]["error"]
+    assert hub.requests == []
+
+
+def test_encoded_content_is_released_once_rendered(client, hub, tmp_path, monkeypatch):
+    encoders = []
+
+    class TrackedEncoder(attachment.AttachmentEncoder):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            encoders.append(self)
+
+    monkeypatch.setattr(workflow_trigger_bulk, "AttachmentEncoder", TrackedEncoder)
+    pending_at_request = []
+    hub.handler = lambda req: pending_at_request.append(encoders[0].pending_count())
+
+    def workflows(n):
+        for i in range(n):
+            path = tmp_path / "f{}.txt".format(i)
+            path.write_bytes(b"content %d" % i)
+            wf = WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u{}".format(i)], "data": {"i": i}})
+            wf.add_attachment(str(path), lazy=True)
+            yield wf
+
+    bulk_ins = client.workflows.bulk_trigger_instance(attachment_workers=2)
+    response = bulk_ins.trigger_stream(workflows(1000))
+    assert response.success == 1000
+    assert len(pending_at_request) == 10
+    # files of records already sent are not held: only those of the chunk being filled (streaming pulls ahead)
+    assert max(pending_at_request) <= 100
+    assert encoders[0].pending_count() == 0
+
+
+def test_shared_file_is_released_after_last_record(client, hub, tmp_path):
+    encoder = attachment.AttachmentEncoder(2)
+    path = _file(tmp_path)
+    lazy = [attachment.get_attachment_json(path, lazy=True) for _ in range(3)]
+    encoder.submit_all(lazy)
+    assert encoder.pending_count() == 1
+    lazy[0].materialize()
+    lazy[1].materialize()
+    assert encoder.pending_count() == 1
+    assert base64.b64decode(lazy[2].materialize()["data"]) == b"hello attachment"
+    assert encoder.pending_count() == 0
+    assert lazy[2]._encoding is None
+    # rendered again (e.g. retry): file is read again
+    assert base64.b64decode(lazy[2].materialize()["data"]) == b"hello attachment"
+    encoder.shutdown()
+
+
+def test_async_trigger_reads_files_off_event_loop(hub, tmp_path, monkeypatch):
+    pytest.importorskip("httpx")
+    materialized_on = []
+    materialize = LazyAttachment.materialize
+
+    def recording_materialize(self):
+        materialized_on.append(threading.current_thread())
+        return materialize(self)
+
+    monkeypatch.setattr(LazyAttachment, "materialize", recording_materialize)
+
+    async def main():
+        async with AsyncSuprsend(WORKSPACE_KEY, WORKSPACE_SECRET, base_url=hub.url) as client:
+            ev = Event("u1", "ev", {"v": 1})
+            event_file = tmp_path / "event.txt"
+            event_file.write_bytes(b"event file")
+            ev.add_attachment(str(event_file), lazy=True)
+            bulk_events = client.bulk_events.new_instance()
+            bulk_events.append(ev)
+            bulk_workflows = client.workflows.bulk_trigger_instance(attachment_workers=2)
+            bulk_workflows.append(*_workflows_sharing_file(tmp_path, 3))
+            return (threading.current_thread(), await bulk_events.trigger(), await bulk_workflows.trigger())
+
+    loop_thread, events_response, workflows_response = asyncio.run(main())
+    assert events_response.status == "success" and workflows_response.status == "success"
+    assert base64.b64decode(hub.bulk_records("event")[0]["properties"]["$attachments"][0]["data"]) == b"event file"
+    _assert_attachments_sent(hub, 3)
+    assert len(materialized_on) == 7
+    assert loop_thread not in materialized_on
+
+
+def test_broadcast_file_is_read_only_when_sent(client, hub, tmp_path, monkeypatch):
+    encoded = []
+    encode_file = attachment._encode_file
+
+    def counting_encode_file(abs_path, use_mmap=None):
+        encoded.append(abs_path)
+        return encode_file(abs_path, use_mmap)
+
+    monkeypatch.setattr(attachment, "_encode_file", counting_encode_file)
+    broadcast = SubscriberListBroadcast({"list_id": "l1", "template": "t1", "notification_category": "transactional",
+                                         "data": {"v": 1}})
+    broadcast.add_attachment(_file(tmp_path), lazy=True)
+    body, size = broadcast.get_final_json(client.json_codec)
+    assert encoded == []
+    # size derived from file size is the size of body as sent
+    assert size == len(json_encode(body, client.json_codec))
+    assert len(encoded) == 1
+    # ---
+    encoded.clear()
+    assert client.subscriber_lists.broadcast(broadcast)["success"]
+    assert len(encoded) == 1
+    sent = hub.requests[0].json()["data"]["$attachments"][0]
+    assert base64.b64decode(sent["data"]) == b"hello attachment"
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+from suprsend import AsyncSuprsend, Event, RateLimiter, RetryPolicy, SuprsendConfigError
+from suprsend.rate_limiter import TokenBucket
+
+from conftest import WORKSPACE_KEY, WORKSPACE_SECRET
+
+
+def test_invalid_rate():
+    with pytest.raises(SuprsendConfigError):
+        TokenBucket(0)
+    with pytest.raises(SuprsendConfigError):
+        RateLimiter({"v2/event/": -1}, "https://hub.suprsend.com/")
+
+
+def test_burst_then_evenly_spaced_slots():
+    bucket = TokenBucket(10, 3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # tokens are reserved in advance: each caller waits one slot more than the previous one
+    waits = [bucket.reserve() for _ in range(3)]
+    assert waits == sorted(waits)
+    assert waits[0] == pytest.approx(0.1, abs=0.01)
+    assert waits[2] == pytest.approx(0.3, abs=0.01)
+    assert bucket.available < 0
+
+
+def test_default_burst():
+    assert TokenBucket(0.5).capacity == 1
+    assert TokenBucket(20).capacity == 20
+
+
+def test_family_is_longest_matching_prefix():
+    limiter = RateLimiter({"v2/": 100, "/v2/bulk/event/": (5, 10), "*": 50}, "https://example.com/api/")
+    assert limiter.family("https://example.com/api/v2/bulk/event/") == "v2/bulk/event/"
+    assert limiter.family("https://example.com/api/v2/event/") == "v2/"
+    assert limiter.family("https://example.com/api/trigger/") == "*"
+    assert limiter.state()["v2/bulk/event/"] == {"rate": 5.0, "burst": 10.0, "available": 10.0}
+
+
+def test_calls_not_matching_any_family_are_not_limited():
+    limiter = RateLimiter({"trigger/": (1, 1)}, "https://example.com/")
+    assert [limiter.reserve("https://example.com/v2/event/") for _ in range(5)] == [0.0] * 5
+    limiter.reserve("https://example.com/trigger/")
+    assert limiter.reserve("https://example.com/trigger/") > 0
+
+
+def test_client_calls_are_spaced(make_client, hub):
+    client = make_client(rate_limits={"v2/event/": (10, 1)})
+    started = time.monotonic()
+    for i in range(4):
+        assert client.track_event(Event("u{}".format(i), "ev"))["success"]
+    assert time.monotonic() - started >= 0.25
+    assert len(hub.requests) == 4
+    # requests are signed again after waiting for their slot
+    assert hub.bad_signatures == 0
+
+
+def test_other_families_are_not_slowed_down(make_client, hub):
+    client = make_client(rate_limits={"trigger/": (0.1, 1)})
+    started = time.monotonic()
+    for i in range(5):
+        client.track_event(Event("u{}".format(i), "ev"))
+    assert time.monotonic() - started < 5
+
+
+def test_each_retry_attempt_takes_a_token(make_client, hub):
+    client = make_client(rate_limits={"*": (5, 1)})
+    hub.respond(503, {"error": {"message": "unavailable"}}, times=2)
+    started = time.monotonic()
+    assert client.track_event(Event("u1", "ev", idempotency_key="k1"))["success"]
+    assert len(hub.requests) == 3
+    assert time.monotonic() - started >= 0.35
+    assert hub.bad_signatures == 0
+
+
+def test_async_client_calls_are_spaced(hub):
+    pytest.importorskip("httpx")
+
+    async def main():
+        async with AsyncSuprsend(WORKSPACE_KEY, WORKSPACE_SECRET, base_url=hub.url,
+                                 retry_policy=RetryPolicy(backoff_base=0, backoff_max=0),
+                                 rate_limits={"v2/event/": (10, 1)}) as client:
+            await asyncio.gather(*(client.track_event(Event("u{}".format(i), "ev")) for i in range(4)))
+
+    started = time.monotonic()
+    asyncio.run(main())
+    assert time.monotonic() - started >= 0.25
+    assert len(hub.requests) == 4
+    assert hub.bad_signatures == 0
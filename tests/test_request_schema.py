@@ -0,0 +1,72 @@
+import json
+import os
+
+import jsonschema
+import pytest
+
+from suprsend import request_schema
+from suprsend.exception import SuprsendValidationError
+from suprsend.request_schema import _CompiledSchemaValidator, _get_schema_validator
+from suprsend.utils import validate_workflow_trigger_body_schema
+
+fastjsonschema = pytest.importorskip("fastjsonschema")
+
+INVALID_BODIES = [
+    {"workflow": "", "recipients": ["d1"], "data": {}},
+    {"workflow": "w", "recipients": [], "data": {}},
+    {"workflow": "w", "recipients": "d1", "data": {}},
+    {"workflow": "w", "recipients": ["d1"], "data": {}, "unknown": 1},
+    {"workflow": "w", "recipients": [{"distinct_id": "d1", "$androidpush": [{"token": "t"}]}], "data": {}},
+]
+
+
+def _schema(name):
+    path = os.path.join(os.path.dirname(request_schema.__file__), "request_json", "{}.json".format(name))
+    with open(path) as f:
+        return json.load(f)
+
+
+def _message(validator, body):
+    try:
+        validator.validate(body)
+    except jsonschema.exceptions.ValidationError as ve:
+        return ve.message
+
+
+def test_compiled_validator_is_used():
+    assert isinstance(_get_schema_validator("workflow_trigger"), _CompiledSchemaValidator)
+
+
+@pytest.mark.parametrize("body", INVALID_BODIES)
+def test_same_error_as_jsonschema(body):
+    interpreted = jsonschema.Draft7Validator(_schema("workflow_trigger"))
+    compiled = _CompiledSchemaValidator(_schema("workflow_trigger"), interpreted)
+    expected = _message(interpreted, body)
+    assert expected is not None
+    assert _message(compiled, body) == expected
+    with pytest.raises(SuprsendValidationError) as exc_info:
+        validate_workflow_trigger_body_schema(dict(body))
+    assert exc_info.value.message == expected
+
+
+def test_valid_body_is_not_modified():
+    body = {"workflow": "w", "recipients": ["d1"], "data": {"a": 1}}
+    assert _message(_get_schema_validator("workflow_trigger"), body) is None
+    assert body == {"workflow": "w", "recipients": ["d1"], "data": {"a": 1}}
+
+
+def test_unsupported_schema_falls_back_to_jsonschema(monkeypatch):
+    def unsupported(*args, **kwargs):
+        raise fastjsonschema.JsonSchemaDefinitionException("unsupported")
+
+    monkeypatch.setattr(fastjsonschema, "compile", unsupported)
+    load_json_schema = getattr(request_schema, "__load_json_schema")
+    validator = load_json_schema("event")
+    assert isinstance(validator, jsonschema.Draft7Validator)
+    assert _message(validator, {"event": "$reserved", "distinct_id": "d", "env": "e"}) is not None
+
+
+def test_jsonschema_only_without_fastjsonschema(monkeypatch):
+    monkeypatch.setattr(request_schema, "_has_fastjsonschema", False)
+    load_json_schema = getattr(request_schema, "__load_json_schema")
+    assert isinstance(load_json_schema("workflow_trigger"), jsonschema.Draft7Validator)
@@ -0,0 +1,136 @@
+import base64
+import hashlib
+import hmac
+
+import pytest
+
+from suprsend import Event, RetryBudget, RetryPolicy, SuprsendConfigError
+from suprsend.retry import has_idempotency_keys, is_retryable_failed_record
+
+from conftest import WORKSPACE_KEY, WORKSPACE_SECRET
+
+
+def _events(n, with_key=True):
+    return [Event("u{}".format(i), "ev", {"i": i}, idempotency_key="key-{}".format(i) if with_key else None)
+            for i in range(n)]
+
+
+def test_invalid_max_attempts():
+    with pytest.raises(SuprsendConfigError):
+        RetryPolicy(max_attempts=0)
+
+
+def test_backoff_is_exponential_and_capped():
+    policy = RetryPolicy(backoff_base=0.5, backoff_max=3, jitter=False)
+    assert [policy.backoff(attempt) for attempt in range(1, 6)] == [0.5, 1, 2, 3, 3]
+    jittered = RetryPolicy(backoff_base=0.5, backoff_max=3)
+    assert all(0 <= jittered.backoff(4) <= 3 for _ in range(50))
+
+
+def test_delay_for_response():
+    policy = RetryPolicy(max_attempts=3, backoff_base=1, jitter=False, retry_after_max=30)
+    assert policy.delay_for_response(503, {}, 1) == 1
+    assert policy.delay_for_response(503, {}, 2) == 2
+    # attempts exhausted
+    assert policy.delay_for_response(503, {}, 3) is None
+    # not a retryable status
+    assert policy.delay_for_response(400, {}, 1) is None
+    # Retry-After (seconds and http-date) is honoured, unless too long
+    assert policy.delay_for_response(429, {"Retry-After": "7"}, 1) == 7
+    assert policy.delay_for_response(429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}, 1) == 0
+    assert policy.delay_for_response(429, {"Retry-After": "120"}, 1) is None
+    # unparseable Retry-After falls back to backoff
+    assert policy.delay_for_response(429, {"Retry-After": "soon"}, 1) == 1
+
+
+def test_retryable_calls():
+    policy = RetryPolicy()
+    assert policy.is_retryable_call("GET", None)
+    assert not policy.is_retryable_call("POST", None)
+    assert policy.is_retryable_call("POST", True)
+    assert not RetryPolicy.no_retry().is_retryable_call("GET", None)
+    assert has_idempotency_keys({"$idempotency_key": "a"}, {"$idempotency_key": "b"})
+    assert not has_idempotency_keys({"$idempotency_key": "a"}, {})
+    assert not has_idempotency_keys()
+
+
+def test_retryable_failed_records():
+    assert is_retryable_failed_record({"record": {}, "code": 503})
+    assert is_retryable_failed_record({"record": {}, "code": 429})
+    assert not is_retryable_failed_record({"record": {}, "code": 400})
+    assert not is_retryable_failed_record({"record": {}, "code": 500, "error_type": "invalid_record"})
+    assert not is_retryable_failed_record({"index": 3, "code": 500})
+
+
+def test_budget_limits_retries():
+    budget = RetryBudget(ratio=0.5, min_retries=2)
+    assert budget.try_withdraw() and budget.try_withdraw()
+    assert not budget.try_withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.try_withdraw()
+    assert not budget.try_withdraw()
+
+
+def test_retryable_response_is_retried(client, hub):
+    hub.respond(503, {"error": {"message": "unavailable"}}, times=2)
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(3))
+    response = bulk_ins.trigger()
+    assert response.status == "success"
+    assert len(hub.requests) == 3
+    # every attempt is validly signed
+    assert hub.bad_signatures == 0
+
+
+def test_attempts_are_limited(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy(max_attempts=2, backoff_base=0, backoff_max=0))
+    hub.respond(503, {"error": {"message": "unavailable"}}, times=5)
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(1))
+    response = bulk_ins.trigger()
+    assert response.status == "fail" and response.failed_records[0]["code"] == 503
+    assert len(hub.requests) == 2
+
+
+def test_retries_stop_when_budget_is_exhausted(make_client, hub):
+    budget = RetryBudget(ratio=0, min_retries=1)
+    client = make_client(retry_policy=RetryPolicy(backoff_base=0, backoff_max=0, budget=budget))
+    hub.respond(503, {"error": {"message": "unavailable"}}, times=10)
+    for _ in range(3):
+        bulk_ins = client.bulk_events.new_instance()
+        bulk_ins.append(*_events(1))
+        assert bulk_ins.trigger().status == "fail"
+    # first call: 1 retry (the whole budget), others: no retry
+    assert len(hub.requests) == 4
+
+
+def test_records_without_idempotency_key_are_not_retried(client, hub):
+    hub.respond(503, {"error": {"message": "unavailable"}})
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(2, with_key=False))
+    assert bulk_ins.trigger().status == "fail"
+    assert len(hub.requests) == 1
+
+
+def test_bulk_user_edits_are_not_retried_without_idempotency_key(client, hub):
+    hub.respond(503, {"error": {"message": "unavailable"}})
+    user = client.users.get_edit_instance("u1")
+    user.set("k", "v")
+    bulk_ins = client.users.get_bulk_edit_instance()
+    bulk_ins.append(user)
+    assert bulk_ins.save().status == "fail"
+    assert len(hub.requests) == 1
+
+
+def test_resign_request_refreshes_date_and_signature(client):
+    url = client.base_url + "event/"
+    data = b'{"event": "ev"}'
+    headers = {"Content-Type": "application/json; charset=utf-8", "Date": "Thu, 01 Jan 1970 00:00:00 GMT",
+               "Authorization": "stale"}
+    client._resign_request("POST", url, data, headers)
+    assert headers["Date"] != "Thu, 01 Jan 1970 00:00:00 GMT"
+    string_to_sign = "POST\n{}\n{}\n{}\n/event/".format(hashlib.md5(data).hexdigest(), headers["Content-Type"],
+                                                        headers["Date"])
+    sig = base64.b64encode(hmac.new(WORKSPACE_SECRET.encode(), string_to_sign.encode(), hashlib.sha256).digest())
+    assert headers["Authorization"] == "{}:{}".format(WORKSPACE_KEY, sig.decode())
@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+import pytest
+
+from suprsend import AsyncSuprsend, Event, RetryPolicy, WorkflowTriggerRequest
+
+from conftest import WORKSPACE_KEY, WORKSPACE_SECRET
+
+
+def _per_record_status(codes):
+    """
+    hub handler replying to first bulk call with given status code per record (202: success)
+    """
+    calls = []
+
+    def handler(req):
+        calls.append(req)
+        if len(calls) > 1:
+            return None
+        records = [{"status": "success", "status_code": 202} if code == 202 else
+                   {"status": "error", "status_code": code, "error": {"message": "failed with {}".format(code)}}
+                   for code in codes]
+        return 202, {"Content-Type": "application/json"}, json.dumps({"records": records}).encode()
+    return handler
+
+
+def _events(n):
+    return [Event("u{}".format(i), "ev", {"i": i}) for i in range(n)]
+
+
+def test_only_retryable_records_are_sent_again(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    hub.handler = _per_record_status([202, 500, 400, 429])
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(4))
+    response = bulk_ins.trigger()
+    assert response.status == "partial" and response.failure == 3
+    first = hub.bulk_records()
+    # ---
+    retry_response = bulk_ins.retry_failed(response)
+    assert retry_response is not response
+    assert retry_response.status == "success" and retry_response.total == 2
+    retried = hub.requests[1].json()
+    assert [r["distinct_id"] for r in retried] == ["u1", "u3"]
+    # same $insert_id: hub can de-duplicate records which were processed in spite of the error
+    assert [r["$insert_id"] for r in retried] == [first[1]["$insert_id"], first[3]["$insert_id"]]
+    # response of trigger is left as it is
+    assert response.failure == 3 and len(response.failed_records) == 3
+
+
+def test_only_codes(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    hub.handler = _per_record_status([202, 500, 400, 429])
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(4))
+    response = bulk_ins.trigger()
+    assert bulk_ins.retry_failed(response, only_codes=[400]).total == 1
+    assert [r["distinct_id"] for r in hub.requests[1].json()] == ["u2"]
+
+
+def test_nothing_to_retry(client, hub):
+    hub.handler = _per_record_status([202, 400])
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(2))
+    response = bulk_ins.trigger()
+    retry_response = bulk_ins.retry_failed(response)
+    assert retry_response.status == "success" and retry_response.total == 0
+    assert len(hub.requests) == 1
+
+
+def test_records_are_not_validated_again(make_client, hub, monkeypatch):
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    hub.respond(503, {"error": {"message": "unavailable"}})
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(3))
+    response = bulk_ins.trigger()
+    assert response.status == "fail"
+
+    def fail_validation(*args, **kwargs):
+        raise AssertionError("validated again")
+
+    monkeypatch.setattr(Event, "get_final_json_encoded", fail_validation)
+    monkeypatch.setattr(Event, "get_final_json", fail_validation)
+    assert bulk_ins.retry_failed(response).status == "success"
+    assert hub.requests[0].body == hub.requests[1].body
+
+
+def test_failed_retry_can_be_retried(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    hub.respond(503, {"error": {"message": "unavailable"}}, times=2)
+    bulk_ins = client.workflows.bulk_trigger_instance()
+    bulk_ins.append(*(WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u{}".format(i)]}) for i in range(3)))
+    response = bulk_ins.trigger()
+    retry_response = bulk_ins.retry_failed(response)
+    assert retry_response.status == "fail" and retry_response.failure == 3
+    assert bulk_ins.retry_failed(retry_response).status == "success"
+    assert len({req.body for req in hub.requests}) == 1
+
+
+def test_retry_in_concurrent_chunks(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    hub.respond(503, {"error": {"message": "unavailable"}}, times=3)
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(250))
+    response = bulk_ins.trigger(max_concurrency=3)
+    assert response.failure == 250
+    retry_response = bulk_ins.retry_failed(response, max_concurrency=3)
+    assert retry_response.success == 250
+    retried = hub.bulk_records()[250:]
+    assert sorted(r["$insert_id"] for r in retried) == sorted(r["$insert_id"] for r in hub.bulk_records()[:250])
+
+
+def test_user_edit_retry_failed(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    hub.respond(500, {"error": {"message": "internal error"}})
+    bulk_ins = client.users.get_bulk_edit_instance()
+    for i in range(2):
+        user = client.users.get_edit_instance("u{}".format(i))
+        user.set("k", i)
+        bulk_ins.append(user)
+    response = bulk_ins.save()
+    assert response.status == "fail"
+    assert bulk_ins.retry_failed(response, only_codes=[400]).total == 0
+    assert len(hub.requests) == 1
+    assert bulk_ins.retry_failed(response).success == 2
+    assert hub.requests[0].body == hub.requests[1].body
+
+
+def test_async_retry_failed(hub):
+    pytest.importorskip("httpx")
+    hub.handler = _per_record_status([202, 500])
+
+    async def main():
+        async with AsyncSuprsend(WORKSPACE_KEY, WORKSPACE_SECRET, base_url=hub.url,
+                                 retry_policy=RetryPolicy.no_retry()) as client:
+            bulk_ins = client.bulk_events.new_instance()
+            bulk_ins.append(*_events(2))
+            response = await bulk_ins.trigger()
+            return response, await bulk_ins.retry_failed(response)
+
+    response, retry_response = asyncio.run(main())
+    assert response.status == "partial"
+    assert retry_response.status == "success" and retry_response.total == 1
+    assert hub.requests[1].json()[0]["$insert_id"] == hub.requests[0].json()[1]["$insert_id"]
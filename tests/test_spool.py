@@ -0,0 +1,206 @@
+import os
+
+import pytest
+
+from suprsend import Event, RetryPolicy, Spool, SuprsendConfigError
+from suprsend.spool import SpooledRecords, SPOOL_KIND_EVENT
+
+
+def _events(n, prefix="u"):
+    return [Event("{}{}".format(prefix, i), "ev", {"i": i}) for i in range(n)]
+
+
+def _segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("segment-"))
+
+
+def test_invalid_fsync_mode(tmp_path):
+    with pytest.raises(SuprsendConfigError):
+        Spool(str(tmp_path), fsync="sometimes")
+
+
+def test_append_ack_survive_reopen(tmp_path):
+    spool = Spool(str(tmp_path), fsync="always")
+    seqs = spool.append(SPOOL_KIND_EVENT, [b'{"a": 1}', b'{"a": 2}', b'{"a": 3}'])
+    spool.ack(seqs[:1])
+    spool.close()
+    # ---
+    reopened = Spool(str(tmp_path))
+    assert reopened.pending_count() == 2
+    claimed = reopened.claim_pending(SPOOL_KIND_EVENT)
+    assert [(seq, content) for seq, _, content in claimed] == [(seqs[1], b'{"a": 2}'), (seqs[2], b'{"a": 3}')]
+    # claimed records are not handed out again
+    assert reopened.claim_pending(SPOOL_KIND_EVENT) == []
+    # new records get seqs after the ones already used
+    assert reopened.append(SPOOL_KIND_EVENT, [b"{}"])[0] > seqs[-1]
+    reopened.close()
+
+
+def test_crash_between_append_and_send(make_client, hub, tmp_path):
+    """
+    process dies after records are written to spool, before bulk call is made
+    """
+    spool = Spool(str(tmp_path))
+    bulk_ins = make_client(spool=spool).bulk_events.new_instance()
+    bulk_ins.append(*_events(5))
+    spool.close()
+    assert hub.requests == []
+    # --- next run
+    client = make_client(spool=Spool(str(tmp_path)))
+    assert client.spool.pending_count() == 5
+    response = client.replay_spool()
+    assert response.status == "success" and response.total == 5
+    assert sorted(r["distinct_id"] for r in hub.bulk_records()) == ["u{}".format(i) for i in range(5)]
+    assert client.spool.pending_count() == 0
+    assert hub.bad_signatures == 0
+
+
+def test_crash_between_send_and_settle(make_client, hub, tmp_path, monkeypatch):
+    """
+    process dies after bulk call is made, before records are acknowledged: they are sent again (same $insert_id)
+    """
+    def crash(self, failed_records, records=None):
+        raise KeyboardInterrupt("crash")
+
+    spool = Spool(str(tmp_path))
+    bulk_ins = make_client(spool=spool).bulk_events.new_instance()
+    bulk_ins.append(*_events(3))
+    with monkeypatch.context() as m:
+        m.setattr(SpooledRecords, "settle", crash)
+        with pytest.raises(KeyboardInterrupt):
+            bulk_ins.trigger()
+    spool.close()
+    first_ids = [r["$insert_id"] for r in hub.bulk_records()]
+    assert len(first_ids) == 3
+    # --- next run
+    client = make_client(spool=Spool(str(tmp_path)))
+    assert client.spool.pending_count() == 3
+    client.replay_spool()
+    assert [r["$insert_id"] for r in hub.bulk_records()] == first_ids * 2
+    assert client.spool.pending_count() == 0
+
+
+def test_delivered_records_are_acknowledged(make_client, hub, tmp_path):
+    client = make_client(spool=Spool(str(tmp_path)))
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(3))
+    assert bulk_ins.trigger().status == "success"
+    assert client.spool.pending_count() == 0
+    # nothing left for next run
+    client.spool.close()
+    assert Spool(str(tmp_path)).pending_count() == 0
+
+
+def test_retryable_failure_is_kept_for_replay(make_client, hub, tmp_path):
+    client = make_client(spool=Spool(str(tmp_path)), retry_policy=RetryPolicy.no_retry())
+    hub.respond(503, {"error": {"message": "unavailable"}})
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(3))
+    assert bulk_ins.trigger().status == "fail"
+    assert client.spool.pending_count() == 3
+    # ---
+    assert client.replay_spool().status == "success"
+    assert client.spool.pending_count() == 0
+    assert len(hub.bulk_records()) == 6
+
+
+def test_non_retryable_failure_is_acknowledged(make_client, hub, tmp_path):
+    client = make_client(spool=Spool(str(tmp_path)))
+    hub.respond(400, {"error": {"message": "bad request"}})
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(2))
+    assert bulk_ins.trigger().status == "fail"
+    assert client.spool.pending_count() == 0
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_invalid_records_are_never_spooled_or_retried(make_client, hub, tmp_path, compact):
+    client = make_client(spool=Spool(str(tmp_path)))
+    bulk_ins = client.bulk_events.new_instance(compact_failed_records=compact)
+    bulk_ins.append(Event("u1", "ev"), Event("u2", "$reserved"))
+    response = bulk_ins.trigger()
+    assert response.status == "partial"
+    assert response.failed_records[0]["code"] == 500
+    assert client.spool.pending_count() == 0
+    assert client.replay_spool().total == 0
+    assert bulk_ins.retry_failed(response).total == 0
+
+
+def test_on_chunk_complete_raising_leaves_unsent_records_for_replay(make_client, hub, tmp_path):
+    client = make_client(spool=Spool(str(tmp_path)))
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(*_events(250))
+
+    def on_chunk_complete(ch_response):
+        raise RuntimeError("callback failed")
+
+    with pytest.raises(RuntimeError):
+        bulk_ins.trigger(on_chunk_complete=on_chunk_complete)
+    # first chunk (100 events) was delivered and settled before its callback raised
+    assert len(hub.bulk_records()) == 100
+    assert client.spool.pending_count() == 150
+    # rest are not claimed anymore, replay sends them
+    assert client.replay_spool().total == 150
+    assert client.spool.pending_count() == 0
+    assert len({r["$insert_id"] for r in hub.bulk_records()}) == 250
+
+
+def test_torn_and_corrupt_lines_are_skipped(tmp_path):
+    spool = Spool(str(tmp_path), fsync="always")
+    spool.append(SPOOL_KIND_EVENT, [b'{"a": 1}'])
+    spool.close()
+    segment = os.path.join(str(tmp_path), _segments(str(tmp_path))[-1])
+    with open(segment, "ab") as f:
+        # crc doesn't match content
+        f.write(b'P 2 event 00000000 {"a": 2}\n')
+        # torn write: crash midway through a line
+        f.write(b'P 3 event 1234')
+    reopened = Spool(str(tmp_path))
+    assert [content for _, _, content in reopened.claim_pending()] == [b'{"a": 1}']
+    reopened.close()
+
+
+def test_segments_roll_and_dead_ones_are_dropped(tmp_path):
+    spool = Spool(str(tmp_path), segment_max_size=200, compact_min_size=10 ** 9)
+    seqs = []
+    for i in range(10):
+        seqs.extend(spool.append(SPOOL_KIND_EVENT, [b'{"record": %d, "padding": "xxxxxxxxxxxxxxxxxxxx"}' % i]))
+    assert spool.stats()["segments"] > 3
+    spool.ack(seqs[:-1])
+    # segments having only acknowledged records are deleted (oldest first)
+    assert spool.stats()["segments"] <= 2
+    assert spool.pending_count() == 1
+    spool.close()
+    reopened = Spool(str(tmp_path))
+    assert [seq for seq, _, _ in reopened.claim_pending()] == seqs[-1:]
+    reopened.close()
+
+
+def test_compaction_keeps_live_records(tmp_path):
+    spool = Spool(str(tmp_path), compact_min_size=100)
+    seqs = spool.append(SPOOL_KIND_EVENT, [b'{"n": %d}' % i for i in range(50)])
+    size_before = spool.stats()["size_in_bytes"]
+    # acks take more space than live records: compacted
+    spool.ack(seqs[:45])
+    stats = spool.stats()
+    assert stats["pending"] == 5
+    assert stats["size_in_bytes"] < size_before
+    assert len(_segments(str(tmp_path))) <= 2
+    spool.close()
+    reopened = Spool(str(tmp_path))
+    assert [content for _, _, content in reopened.claim_pending()] == [b'{"n": %d}' % i for i in range(45, 50)]
+    reopened.close()
+
+
+def test_interrupted_compaction_is_discarded(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append(SPOOL_KIND_EVENT, [b'{"a": 1}'])
+    spool.close()
+    # compaction which crashed before renaming its output
+    tmp_file = os.path.join(str(tmp_path), "segment-0000000099.log.tmp")
+    with open(tmp_file, "wb") as f:
+        f.write(b'P 1 event')
+    reopened = Spool(str(tmp_path))
+    assert not os.path.exists(tmp_file)
+    assert reopened.pending_count() == 1
+    reopened.close()
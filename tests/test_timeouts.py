@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+
+import pytest
+import requests
+
+from suprsend import AsyncSuprsend, Event, RetryPolicy, SuprsendConfigError
+from suprsend.constants import (
+    DEFAULT_BULK_READ_TIMEOUT_SECS, DEFAULT_CONNECT_TIMEOUT_SECS, DEFAULT_READ_TIMEOUT_SECS,
+)
+from suprsend.transport import normalize_timeout, request_timeout
+
+from conftest import WORKSPACE_KEY, WORKSPACE_SECRET
+
+
+def test_normalize_timeout():
+    assert normalize_timeout(None, (1, 2)) == (1, 2)
+    assert normalize_timeout(3, (1, 2)) == (3, 3)
+    assert normalize_timeout((3, None), (1, 2)) == (3, None)
+    assert normalize_timeout([4, 5], None) == (4, 5)
+    with pytest.raises(SuprsendConfigError):
+        normalize_timeout((1, 2, 3), None)
+
+
+def test_default_timeouts(client):
+    assert client.transport.timeout == (DEFAULT_CONNECT_TIMEOUT_SECS, DEFAULT_READ_TIMEOUT_SECS)
+    assert client.transport.bulk_timeout == (DEFAULT_CONNECT_TIMEOUT_SECS, DEFAULT_BULK_READ_TIMEOUT_SECS)
+
+
+def test_invalid_timeout_fails_at_init(make_client):
+    with pytest.raises(SuprsendConfigError):
+        make_client(timeout=(1, 2, 3))
+
+
+def test_single_call_read_timeout(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry(), timeout=0.2)
+    hub.delay = 0.5
+    started = time.monotonic()
+    resp = client.track_event(Event("u1", "ev"))
+    assert resp["success"] is False and "timed out" in resp["message"]
+    assert time.monotonic() - started < 0.5
+
+
+def test_bulk_calls_use_bulk_timeout(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry(), timeout=0.2, bulk_timeout=5)
+    hub.delay = 0.5
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(Event("u1", "ev"))
+    assert bulk_ins.trigger().status == "success"
+
+
+def test_bulk_read_timeout_is_reported_in_response(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry(), bulk_timeout=(5, 0.2))
+    hub.delay = 0.5
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(Event("u1", "ev"), Event("u2", "ev"))
+    response = bulk_ins.trigger()
+    assert response.status == "fail" and response.failure == 2
+    assert {(r["code"], r["error_type"]) for r in response.failed_records} == {(504, "read_timeout")}
+
+
+def test_connect_timeout_is_classified(make_client, hub, monkeypatch):
+    def connect_timeout(*args, **kwargs):
+        raise requests.exceptions.ConnectTimeout("connect timed out")
+
+    client = make_client(retry_policy=RetryPolicy.no_retry())
+    monkeypatch.setattr(requests.Session, "request", connect_timeout)
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(Event("u1", "ev"))
+    response = bulk_ins.trigger()
+    assert {(r["code"], r["error_type"]) for r in response.failed_records} == {(504, "connect_timeout")}
+
+
+def test_request_timeout_overrides_single_and_bulk_timeouts(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry(), timeout=5, bulk_timeout=5)
+    hub.delay = 0.5
+    with client.request_timeout(0.2):
+        assert client.track_event(Event("u1", "ev"))["success"] is False
+        bulk_ins = client.bulk_events.new_instance()
+        bulk_ins.append(Event("u1", "ev"))
+        assert bulk_ins.trigger(max_concurrency=2).failed_records[0]["error_type"] == "read_timeout"
+    # not in effect after the block
+    assert client.track_event(Event("u1", "ev"))["success"]
+
+
+def test_request_timeout_applies_to_current_thread_only(make_client, hub):
+    client = make_client(retry_policy=RetryPolicy.no_retry(), timeout=5)
+    hub.delay = 0.5
+    results = []
+    with request_timeout(0.2):
+        other = threading.Thread(target=lambda: results.append(client.track_event(Event("u1", "ev"))))
+        other.start()
+        other.join(10)
+    assert results[0]["success"]
+
+
+def test_async_request_timeout(hub):
+    pytest.importorskip("httpx")
+    hub.delay = 0.5
+
+    async def main():
+        async with AsyncSuprsend(WORKSPACE_KEY, WORKSPACE_SECRET, base_url=hub.url,
+                                 retry_policy=RetryPolicy.no_retry()) as client:
+            with client.request_timeout(0.2):
+                timed_out = await client.track_event(Event("u1", "ev"))
+            return timed_out, await client.track_event(Event("u1", "ev"))
+
+    timed_out, resp = asyncio.run(main())
+    assert timed_out["success"] is False
+    assert resp["success"]
@@ -0,0 +1,56 @@
+import requests
+
+from suprsend import Event, WorkflowTriggerRequest
+from suprsend.transport import HttpTransport
+
+
+def test_calls_reuse_pooled_connection(client, hub):
+    for i in range(5):
+        assert client.track_event(Event("u{}".format(i), "ev"))["success"]
+    assert len(hub.requests) == 5
+    assert len({req.client_port for req in hub.requests}) == 1
+    assert hub.bad_signatures == 0
+
+
+def test_idle_connections_are_dropped(make_client, hub):
+    client = make_client(pool_idle_timeout=0)
+    client.track_event(Event("u1", "ev"))
+    client.track_event(Event("u2", "ev"))
+    assert len({req.client_port for req in hub.requests}) == 2
+
+
+def test_instance_is_usable_after_close(client, hub):
+    client.track_event(Event("u1", "ev"))
+    client.close()
+    assert client.track_event(Event("u2", "ev"))["success"]
+    assert len({req.client_port for req in hub.requests}) == 2
+
+
+def test_every_api_routes_through_transport(client, hub, monkeypatch):
+    def module_level_call(*args, **kwargs):
+        raise AssertionError("module level requests call")
+
+    for name in ("get", "post", "patch", "delete", "request"):
+        monkeypatch.setattr(requests, name, module_level_call)
+    client.track_event(Event("u1", "ev"))
+    client.workflows.trigger(WorkflowTriggerRequest({"workflow": "wf", "recipients": ["u1"]}))
+    client.users.get("u1")
+    client.tenants.get("t1")
+    client.brands.get("b1")
+    client.objects.get("teams", "o1")
+    client.messages.list()
+    client.subscriber_lists.get("l1")
+    bulk_ins = client.bulk_events.new_instance()
+    bulk_ins.append(Event("u2", "ev"))
+    bulk_ins.trigger()
+    assert len(hub.requests) == 9
+    assert len({req.client_port for req in hub.requests}) == 1
+    assert hub.bad_signatures == 0
+
+
+def test_pool_settings():
+    transport = HttpTransport(pool_connections=2, pool_maxsize=7, pool_block=True, pool_idle_timeout=None)
+    assert (transport.pool_connections, transport.pool_maxsize, transport.pool_block) == (2, 7, True)
+    assert transport.pool_idle_timeout is None
+    transport.close()
+